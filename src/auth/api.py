@@ -6,6 +6,7 @@ from ninja import Router
 from auth.dependencies import get_admin_auth, get_user_auth
 from auth.schemas import RefreshTokenSchema, TokenSchema, UserCreate, UserLogin, UserOut
 from auth.service import AuthService
+from core.ratelimit import RateLimit
 
 router = Router(tags=["auth"])
 auth_service = AuthService()
@@ -22,7 +23,7 @@ def register(request: HttpRequest, user_data: UserCreate):
     return 400, {"detail": message}
 
 
-@router.post("/login", response={200: TokenSchema, 401: Dict[str, str]})
+@router.post("/login", response={200: TokenSchema, 401: Dict[str, str]}, throttle=RateLimit("LOGIN"))
 def login(request: HttpRequest, login_data: UserLogin):
     """
     Login a user and generate access tokens.
@@ -61,4 +62,4 @@ def get_current_user(request: HttpRequest):
     """
     Get current authenticated user information.
     """
-    return UserOut.from_orm(request.user)
+    return UserOut.from_orm(request.user.model)
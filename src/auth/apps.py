@@ -5,3 +5,6 @@ class AuthConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "auth"
     label = "product_auth"
+
+    def ready(self) -> None:
+        import auth.signals  # noqa: F401
@@ -0,0 +1,76 @@
+from typing import Any, NamedTuple, Optional, Union
+from uuid import UUID
+
+from django.conf import settings
+
+from auth.models import User
+from core.cache import TwoTierCache
+
+user_cache = TwoTierCache(
+    "users",
+    max_size=settings.AUTH_USER_CACHE["MAX_SIZE"],
+    local_ttl=settings.AUTH_USER_CACHE["TTL"],
+    timeout=settings.AUTH_USER_CACHE["TIMEOUT"],
+)
+
+
+def user_cache_key(user_id: Union[str, UUID]) -> str:
+    return f"auth_user:{user_id}"
+
+
+class UserProjection(NamedTuple):
+    """
+    The fields authentication needs, cached instead of the full User
+    """
+
+    id: UUID
+    email: str
+    is_admin: bool
+
+
+class AuthenticatedUser:
+    """
+    request.user for authenticated requests.
+
+    ``id``, ``email`` and ``is_admin`` come from the cached projection. The
+    User model is only queried when a view reads ``model`` or any other field.
+    """
+
+    def __init__(self, projection: UserProjection) -> None:
+        self.id = projection.id
+        self.email = projection.email
+        self.is_admin = projection.is_admin
+        self._model: Optional[User] = None
+
+    @property
+    def model(self) -> User:
+        if self._model is None:
+            self._model = User.objects.get(id=self.id)
+        return self._model
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes missing from the projection
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __str__(self) -> str:
+        return self.email
+
+
+def get_user_projection(user_id: Union[str, UUID]) -> Optional[UserProjection]:
+    """
+    Return the cached projection of a user, or None if the user does not exist
+    """
+
+    def load_user() -> Optional[UserProjection]:
+        row = User.objects.filter(id=user_id).values_list("id", "email", "is_admin").first()
+        return UserProjection(*row) if row else None
+
+    return user_cache.get_or_load(
+        user_cache_key(user_id), load_user, negative_timeout=settings.AUTH_USER_CACHE["NEGATIVE_TIMEOUT"]
+    )
+
+
+def invalidate_user(user_id: Union[str, UUID]) -> None:
+    user_cache.delete(user_cache_key(user_id))
@@ -4,11 +4,12 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, Union
 from uuid import UUID
 
-import redis
 from django.conf import settings
 from jose import JWTError, jwt
 
 from auth.schemas import TokenPayload
+from auth.token_cache import verified_tokens
+from core.redis import get_redis
 
 logger = logging.getLogger("auth")
 
@@ -16,21 +17,12 @@ logger = logging.getLogger("auth")
 class JWTHandler:
     def __init__(self) -> None:
         logger.info("Inicializando JWTHandler")
-        self.redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=int(settings.REDIS_PORT),
-            db=int(settings.REDIS_DB),
-            decode_responses=True,
-        )
+        # Shared client; it connects on first use instead of pinging here
+        self.redis_client = get_redis(decode_responses=True)
         self.jwt_secret_key = settings.JWT_SECRET_KEY
         self.algorithm = settings.JWT_ALGORITHM
         self.access_token_expire_minutes = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
         self.refresh_token_expire_days = settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS
-        try:
-            ping_result = self.redis_client.ping()
-            logger.info(f"Conexión a Redis: {'Exitosa' if ping_result else 'Fallida'}")
-        except Exception as e:
-            logger.error(f"Error al conectar con Redis: {str(e)}")
 
     def create_access_token(self, user_id: Union[str, UUID], is_admin: bool) -> str:
         """
@@ -92,8 +84,16 @@ class JWTHandler:
     def verify_token(self, token: str) -> Optional[TokenPayload]:
         """
         Verify a JWT token.
+
+        Tokens verified against Redis are cached per worker until they
+        expire or their user is revoked, so repeat requests skip the decode
+        and the Redis round trips.
         """
+        cached = verified_tokens.get(token)
+        if cached is not None:
+            return cached
 
+        verified_at = time.monotonic()
         try:
             # Verificar firma JWT
             payload = jwt.decode(token, self.jwt_secret_key, algorithms=[self.algorithm])
@@ -109,6 +109,7 @@ class JWTHandler:
                     # Token válido en Redis
                     stored_data = self.redis_client.hgetall(token_key)
                     logger.info(f"Token validado en Redis: {token_key}")
+                    verified_tokens.add(token, token_data, verified_at)
                 else:
                     logger.warning(f"Token no encontrado en Redis: {token_key}")
                     if settings.STRICT_TOKEN_VALIDATION:
@@ -198,3 +199,17 @@ class JWTHandler:
         token_key = f"token:{user_id}"
         refresh_key = f"refresh_token:{user_id}"
         self.redis_client.delete(token_key, refresh_key)
+        verified_tokens.publish_revoke(user_id)
+
+
+_jwt_handler: Optional[JWTHandler] = None
+
+
+def get_jwt_handler() -> JWTHandler:
+    """
+    Return the process-wide JWTHandler
+    """
+    global _jwt_handler
+    if _jwt_handler is None:
+        _jwt_handler = JWTHandler()
+    return _jwt_handler
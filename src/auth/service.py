@@ -4,14 +4,14 @@ from typing import Optional, Tuple
 from django.contrib.auth.hashers import check_password
 from django.db import IntegrityError
 
-from auth.jwt import JWTHandler
+from auth.jwt import get_jwt_handler
 from auth.models import User
 from auth.schemas import TokenSchema, UserCreate
 
 
 class AuthService:
     def __init__(self) -> None:
-        self.jwt_handler = JWTHandler()
+        self.jwt_handler = get_jwt_handler()
 
     def register_user(self, user_data: UserCreate) -> Tuple[bool, str, Optional[User]]:
         """
@@ -0,0 +1,20 @@
+from typing import Any, Type
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from auth.cache import invalidate_user
+from auth.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender: Type[User], instance: User, **kwargs: Any) -> None:
+    """
+    Drop the cached projection so is_admin or email changes apply on the next request.
+
+    Waits for the commit, otherwise a concurrent request could cache the old row again.
+    """
+    user_id = instance.id
+    transaction.on_commit(lambda: invalidate_user(user_id))
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Optional, Union
+from uuid import UUID
+
+from django.conf import settings
+
+from auth.schemas import TokenPayload
+from core.cache import MISSING, LocalCache
+from core.redis import get_pubsub, get_redis
+
+logger = logging.getLogger("auth")
+
+
+class VerifiedTokenCache:
+    """
+    Per-worker cache of access tokens that already passed verification.
+
+    Entries are keyed by a digest of the token, so raw tokens never sit in
+    memory, and live for ``ttl`` seconds or until the token expires,
+    whichever comes first. A hit skips the JWT decode and the Redis lookups
+    of JWTHandler.verify_token.
+
+    Revoking a user (logout, invalidate_tokens) drops their entries locally
+    and publishes the user id on a Redis channel, so every worker drops its
+    copies as well. Tokens verified while a revocation was in flight are not
+    cached, and a disconnected listener clears the cache before resubscribing.
+    """
+
+    CHANNEL = "auth:revoked"
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.ttl = ttl
+        self._tokens = LocalCache(max_size, ttl)
+        # When each user was last revoked (monotonic), kept as long as a cached token may live
+        self._revoked = LocalCache(max_size, ttl)
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[TokenPayload]:
+        """
+        Return the payload of a previously verified token, or None
+        """
+        self._ensure_listener()
+        entry = self._tokens.get(self.digest(token))
+        return None if entry is MISSING else entry[1]
+
+    def add(self, token: str, payload: TokenPayload, verified_at: float) -> None:
+        """
+        Cache a token verified at ``verified_at`` (time.monotonic() before the Redis lookup)
+        """
+        revoked_at = self._revoked.get(payload.sub)
+        if revoked_at is not MISSING and revoked_at >= verified_at:
+            return
+        ttl = min(self.ttl, payload.exp - time.time())
+        if ttl > 0:
+            self._tokens.set(self.digest(token), (payload.sub, payload), ttl=ttl)
+
+    def revoke(self, user_id: Union[str, UUID]) -> None:
+        """
+        Drop the cached tokens of a user in this worker
+        """
+        user_id = str(user_id)
+        self._revoked.set(user_id, time.monotonic())
+        self._tokens.delete_where(lambda entry: entry[0] == user_id)
+
+    def publish_revoke(self, user_id: Union[str, UUID]) -> None:
+        """
+        Drop the cached tokens of a user in every worker
+        """
+        self.revoke(user_id)
+        try:
+            get_redis().publish(self.CHANNEL, str(user_id))
+        except Exception as e:
+            logger.error(f"Error publicando revocación de tokens: {str(e)}")
+
+    def clear(self) -> None:
+        self._tokens.clear()
+
+    def _listener_running(self) -> bool:
+        return self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid()
+
+    def _ensure_listener(self) -> None:
+        # Threads do not survive a fork, so pre-forking servers start one listener per worker
+        if self._listener_running():
+            return
+        with self._listener_lock:
+            if self._listener_running():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(target=self._listen, name="auth-token-revocation", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        retry_delay = 1.0
+        while True:
+            try:
+                pubsub = get_pubsub()
+                pubsub.subscribe(self.CHANNEL)
+                # Revocations may have been missed while disconnected
+                self.clear()
+                retry_delay = 1.0
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.revoke(message["data"].decode())
+            except Exception as e:
+                logger.error(f"Listener de revocación de tokens desconectado: {str(e)}")
+                self.clear()
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30.0)
+
+
+verified_tokens = VerifiedTokenCache(
+    max_size=settings.AUTH_TOKEN_CACHE["MAX_SIZE"],
+    ttl=settings.AUTH_TOKEN_CACHE["TTL"],
+)
@@ -1,8 +1,19 @@
 from ninja import Router
 
+from auth.dependencies import get_admin_auth
+from core.cache import get_cache_stats
+
 router = Router()
 
 
 @router.get("/")
 def health_check(request):
     return {"status": "ok"}
+
+
+@router.get("/cache/stats", auth=get_admin_auth())
+def cache_stats(request):
+    """
+    Hit and miss counters per cache tier for this worker (admin only).
+    """
+    return get_cache_stats()
@@ -0,0 +1,459 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from django.core.cache import cache
+
+from core.redis import get_async_redis, get_pubsub, get_redis
+
+logger = logging.getLogger("core")
+
+# Distinguishes a cached None from a miss
+MISSING = object()
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache whose entries expire after ``ttl`` seconds
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any], bool]) -> int:
+        """
+        Delete every entry whose value matches ``predicate``, returning how many
+        """
+        with self._lock:
+            stale = [key for key, (_, value) in self._entries.items() if predicate(value)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    expires_at: float  # Unix time
+    delta: float  # Seconds the loader took, scales the early refresh window
+
+
+class TwoTierCache:
+    """
+    Per-worker LocalCache in front of the shared Redis cache.
+
+    Reads try process memory first and fall back to Redis, filling the local
+    tier on the way back. Deletes are published on a Redis pub/sub channel
+    and every worker evicts its local copy when the message arrives, so
+    cross-worker staleness is bounded by the invalidation latency (and by the
+    local TTL if the subscriber is disconnected).
+
+    ``get_or_load`` adds stampede protection on top: one loader runs per key
+    (an in-process future plus a Redis lock across workers), ``None`` results
+    are cached for ``negative_timeout`` and hot keys are refreshed shortly
+    before they expire (probabilistic early expiration).
+    """
+
+    LOCK_TIMEOUT = 10  # seconds a loader may hold the per-key lock
+    LOCK_WAIT = 2.0  # seconds a waiter polls for the loader's result
+    POLL_INTERVAL = 0.05
+    EARLY_REFRESH_BETA = 1.0
+
+    def __init__(self, name: str, max_size: int, local_ttl: float, timeout: int) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.local = LocalCache(max_size, local_ttl)
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.loads = 0
+        self.early_refreshes = 0
+        self.channel = f"cache:invalidate:{name}"
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[str, asyncio.Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+        _caches[name] = self
+
+    def get(self, key: str) -> Any:
+        """
+        Return the cached value, or MISSING
+        """
+        entry = self._get_entry(key)
+        return entry if entry is MISSING else entry.value
+
+    async def aget(self, key: str) -> Any:
+        """
+        Async version of get, reading Redis through redis.asyncio
+        """
+        entry = await self._aget_entry(key)
+        return entry if entry is MISSING else entry.value
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None, delta: float = 0.0) -> None:
+        entry = self._make_entry(value, timeout, delta)
+        cache.set(key, entry, timeout=self._timeout(timeout))
+        self._set_local(key, entry)
+
+    async def aset(self, key: str, value: Any, timeout: Optional[int] = None, delta: float = 0.0) -> None:
+        entry = self._make_entry(value, timeout, delta)
+        await get_async_redis().set(cache.make_key(key), cache.client.encode(entry), ex=self._timeout(timeout))
+        self._set_local(key, entry)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Return the cached values of ``keys``, missing keys left out.
+
+        Keys not in the local tier are read from Redis with one MGET.
+        """
+        self._ensure_listener()
+        found: Dict[str, Any] = {}
+        remote_keys = []
+        for key in keys:
+            entry = self.local.get(key)
+            if entry is MISSING:
+                remote_keys.append(key)
+            else:
+                found[key] = entry.value
+
+        if remote_keys:
+            entries = cache.get_many(remote_keys)
+            self.redis_hits += len(entries)
+            self.redis_misses += len(remote_keys) - len(entries)
+            for key, entry in entries.items():
+                self._set_local(key, entry)
+                found[key] = entry.value
+        return found
+
+    def set_many(
+        self, values: Dict[str, Any], timeout: Optional[int] = None, negative_timeout: Optional[int] = None
+    ) -> None:
+        """
+        Store many values with one pipelined write.
+
+        ``None`` values expire after ``negative_timeout`` seconds when given,
+        like in ``get_or_load``, within the same pipeline.
+        """
+        entries: Dict[str, CacheEntry] = {}
+        pipe = get_redis().pipeline(transaction=False)
+        for key, value in values.items():
+            value_timeout = negative_timeout if value is None and negative_timeout is not None else timeout
+            entry = entries[key] = self._make_entry(value, value_timeout, 0.0)
+            pipe.set(cache.make_key(key), cache.client.encode(entry), ex=self._timeout(value_timeout))
+        pipe.execute()
+        for key, entry in entries.items():
+            self._set_local(key, entry)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], negative_timeout: Optional[int] = None) -> Any:
+        """
+        Return the cached value, running ``loader`` at most once per key on a miss.
+
+        A ``None`` result is cached for ``negative_timeout`` seconds, or not
+        cached when no negative timeout is given.
+        """
+        entry = self._get_entry(key)
+        if entry is not MISSING:
+            if not self._should_refresh_early(entry):
+                return entry.value
+            # Only the lock winner refreshes; everybody else keeps serving the current value
+            if not cache.add(self._lock_key(key), True, timeout=self.LOCK_TIMEOUT):
+                return entry.value
+            self.early_refreshes += 1
+            try:
+                return self._load(key, loader, negative_timeout)
+            finally:
+                cache.delete(self._lock_key(key))
+
+        # Threads of this worker share one in-flight load per key
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result(timeout=self.LOCK_TIMEOUT)
+
+        try:
+            value = self._load_once(key, loader, negative_timeout)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Any]], negative_timeout: Optional[int] = None
+    ) -> Any:
+        """
+        Async version of get_or_load
+        """
+        entry = await self._aget_entry(key)
+        redis_client = get_async_redis()
+        lock_key = cache.make_key(self._lock_key(key))
+        if entry is not MISSING:
+            if not self._should_refresh_early(entry):
+                return entry.value
+            if not await redis_client.set(lock_key, 1, nx=True, ex=self.LOCK_TIMEOUT):
+                return entry.value
+            self.early_refreshes += 1
+            try:
+                return await self._aload(key, loader, negative_timeout)
+            finally:
+                await redis_client.delete(lock_key)
+
+        # Coroutines on this event loop share one in-flight load per key
+        loop = asyncio.get_running_loop()
+        future = self._ainflight.get(key)
+        if future is not None and future.get_loop() is loop:
+            return await asyncio.shield(future)
+        future = self._ainflight[key] = loop.create_future()
+
+        try:
+            if await redis_client.set(lock_key, 1, nx=True, ex=self.LOCK_TIMEOUT):
+                try:
+                    value = await self._aload(key, loader, negative_timeout)
+                finally:
+                    await redis_client.delete(lock_key)
+            else:
+                value = await self._await_other_loader(key, loader, negative_timeout)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._ainflight.get(key) is future:
+                del self._ainflight[key]
+
+    def _load_once(self, key: str, loader: Callable[[], Any], negative_timeout: Optional[int]) -> Any:
+        # Another worker may hold the lock: wait for its result instead of loading too
+        if not cache.add(self._lock_key(key), True, timeout=self.LOCK_TIMEOUT):
+            deadline = time.monotonic() + self.LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(self.POLL_INTERVAL)
+                entry = cache.get(key, MISSING)
+                if entry is not MISSING:
+                    self._set_local(key, entry)
+                    return entry.value
+            logger.warning(f"Timed out waiting for {self.name} cache loader of {key}, loading it here")
+            return self._load(key, loader, negative_timeout)
+
+        try:
+            return self._load(key, loader, negative_timeout)
+        finally:
+            cache.delete(self._lock_key(key))
+
+    async def _await_other_loader(
+        self, key: str, loader: Callable[[], Awaitable[Any]], negative_timeout: Optional[int]
+    ) -> Any:
+        deadline = time.monotonic() + self.LOCK_WAIT
+        redis_key = cache.make_key(key)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            raw = await get_async_redis().get(redis_key)
+            if raw is not None:
+                entry = cache.client.decode(raw)
+                self._set_local(key, entry)
+                return entry.value
+        logger.warning(f"Timed out waiting for {self.name} cache loader of {key}, loading it here")
+        return await self._aload(key, loader, negative_timeout)
+
+    def _load(self, key: str, loader: Callable[[], Any], negative_timeout: Optional[int]) -> Any:
+        self.loads += 1
+        started = time.monotonic()
+        value = loader()
+        if value is not None or negative_timeout:
+            self.set(key, value, timeout=self._value_timeout(value, negative_timeout), delta=time.monotonic() - started)
+        return value
+
+    async def _aload(self, key: str, loader: Callable[[], Awaitable[Any]], negative_timeout: Optional[int]) -> Any:
+        self.loads += 1
+        started = time.monotonic()
+        value = await loader()
+        if value is not None or negative_timeout:
+            await self.aset(
+                key, value, timeout=self._value_timeout(value, negative_timeout), delta=time.monotonic() - started
+            )
+        return value
+
+    def _value_timeout(self, value: Any, negative_timeout: Optional[int]) -> int:
+        return self.timeout if value is not None else negative_timeout
+
+    def _should_refresh_early(self, entry: CacheEntry) -> bool:
+        # XFetch: the closer to expiry and the slower the loader, the likelier an early refresh
+        if not entry.delta:
+            return False
+        return time.time() - entry.delta * self.EARLY_REFRESH_BETA * math.log(random.random()) >= entry.expires_at
+
+    def _timeout(self, timeout: Optional[int]) -> int:
+        return self.timeout if timeout is None else timeout
+
+    def _make_entry(self, value: Any, timeout: Optional[int], delta: float) -> CacheEntry:
+        return CacheEntry(value, time.time() + self._timeout(timeout), delta)
+
+    def _set_local(self, key: str, entry: CacheEntry) -> None:
+        # Never keep a local copy past the shared entry's expiry
+        self.local.set(key, entry, ttl=min(self.local.ttl, entry.expires_at - time.time()))
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f"{key}:lock"
+
+    def _get_entry(self, key: str) -> Any:
+        self._ensure_listener()
+        entry = self.local.get(key)
+        if entry is not MISSING:
+            return entry
+
+        entry = cache.get(key, MISSING)
+        self._count_redis(entry)
+        if entry is not MISSING:
+            self._set_local(key, entry)
+        return entry
+
+    async def _aget_entry(self, key: str) -> Any:
+        self._ensure_listener()
+        entry = self.local.get(key)
+        if entry is not MISSING:
+            return entry
+
+        # Same entry as the sync path, encoded by the django-redis client
+        raw = await get_async_redis().get(cache.make_key(key))
+        entry = MISSING if raw is None else cache.client.decode(raw)
+        self._count_redis(entry)
+        if entry is not MISSING:
+            self._set_local(key, entry)
+        return entry
+
+    def delete(self, key: str) -> None:
+        """
+        Delete the key from Redis and from the local tier of every worker
+        """
+        cache.delete(key)
+        self.local.delete(key)
+        try:
+            get_redis().publish(self.channel, key)
+        except Exception as e:
+            logger.error(f"Error publishing {self.name} cache invalidation: {str(e)}")
+
+    def delete_many(self, keys: List[str], chunk_size: int = 1000) -> None:
+        """
+        Delete many keys at once, with one invalidation message per chunk
+        """
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start : start + chunk_size]
+            cache.delete_many(chunk)
+            for key in chunk:
+                self.local.delete(key)
+            try:
+                get_redis().publish(self.channel, "\n".join(chunk))
+            except Exception as e:
+                logger.error(f"Error publishing {self.name} cache invalidation: {str(e)}")
+
+    def clear_local(self) -> None:
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local.hits + self.local.misses
+        return {
+            "hit_ratio": round((self.local.hits + self.redis_hits) / lookups, 4) if lookups else None,
+            "local": {"hits": self.local.hits, "misses": self.local.misses, "size": len(self.local)},
+            "redis": {"hits": self.redis_hits, "misses": self.redis_misses},
+            "loader": {"loads": self.loads, "early_refreshes": self.early_refreshes},
+        }
+
+    def _count_redis(self, value: Any) -> None:
+        if value is MISSING:
+            self.redis_misses += 1
+        else:
+            self.redis_hits += 1
+
+    def _ensure_listener(self) -> None:
+        # Threads do not survive a fork, so pre-forking servers start one listener per worker
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(target=self._listen, name=f"{self.name}-cache-invalidation", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        retry_delay = 1.0
+        while True:
+            try:
+                pubsub = get_pubsub()
+                pubsub.subscribe(self.channel)
+                # Invalidations may have been missed while disconnected
+                self.local.clear()
+                retry_delay = 1.0
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        # delete_many sends several newline separated keys
+                        for key in message["data"].decode().split("\n"):
+                            self.local.delete(key)
+            except Exception as e:
+                logger.error(f"{self.name} cache invalidation listener disconnected: {str(e)}")
+                self.local.clear()
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30.0)
+
+
+_caches: Dict[str, TwoTierCache] = {}
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Hit and miss counters of every two-tier cache in this process
+    """
+    return {name: two_tier_cache.stats() for name, two_tier_cache in _caches.items()}
+
+
+def clear_local_caches() -> None:
+    for two_tier_cache in _caches.values():
+        two_tier_cache.clear_local()
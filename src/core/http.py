@@ -0,0 +1,47 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Strong ETag for a representation identified by ``parts``
+    """
+    raw = b"|".join(part if isinstance(part, bytes) else str(part).encode() for part in parts)
+    return f'"{hashlib.sha1(raw).hexdigest()}"'
+
+
+def not_modified(request: HttpRequest, etag: str, last_modified: Optional[datetime] = None) -> Optional[HttpResponse]:
+    """
+    A 304 response if the client's If-None-Match / If-Modified-Since validators still match.
+
+    Call it before loading the body, so unchanged resources are never serialized.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_cache_headers(
+    response: HttpResponse,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    surrogate_keys: Iterable[str] = (),
+) -> HttpResponse:
+    """
+    Add validators and the configured browser and CDN caching headers
+    """
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    response["Cache-Control"] = settings.HTTP_CACHE["CACHE_CONTROL"]
+    if settings.HTTP_CACHE["SURROGATE_CONTROL"]:
+        response["Surrogate-Control"] = settings.HTTP_CACHE["SURROGATE_CONTROL"]
+    keys = " ".join(surrogate_keys)
+    if keys:
+        response["Surrogate-Key"] = keys
+    return response
@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+
+Keyset = Tuple[datetime, UUID]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(keyset: Keyset) -> str:
+    """
+    Opaque cursor for a (datetime, id) keyset
+    """
+    value, pk = keyset
+    raw = json.dumps([value.isoformat(), str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Keyset:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return datetime.fromisoformat(value), UUID(pk)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid pagination cursor") from e
+
+
+def _keyset_page(queryset: QuerySet, fields: Tuple[str, str], cursor: Optional[str]) -> QuerySet:
+    # Newest first: rows strictly after the cursor in (field, id) descending order
+    field, pk_field = fields
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, f"{pk_field}__lt": pk}))
+    return queryset.order_by(f"-{field}", f"-{pk_field}")
+
+
+def _next_cursor(rows: List[Model], fields: Tuple[str, str], limit: int) -> Tuple[List[Model], Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor((getattr(last, fields[0]), getattr(last, fields[1])))
+
+
+def paginate_keyset(
+    queryset: QuerySet, fields: Tuple[str, str], cursor: Optional[str], limit: int, offset: int = 0
+) -> Tuple[List[Model], Optional[str]]:
+    """
+    One page of ``queryset`` ordered by the (datetime, id) ``fields``, newest first.
+
+    Fetches ``limit + 1`` rows past the cursor, so every page costs one index
+    range scan no matter how deep it is. Returns the rows and the cursor of
+    the next page (None on the last page).
+    """
+    rows = list(_keyset_page(queryset, fields, cursor)[offset : offset + limit + 1])
+    return _next_cursor(rows, fields, limit)
+
+
+async def apaginate_keyset(
+    queryset: QuerySet, fields: Tuple[str, str], cursor: Optional[str], limit: int, offset: int = 0
+) -> Tuple[List[Model], Optional[str]]:
+    """
+    Async version of paginate_keyset
+    """
+    rows = [row async for row in _keyset_page(queryset, fields, cursor)[offset : offset + limit + 1]]
+    return _next_cursor(rows, fields, limit)
+
+
+class RowCount(NamedTuple):
+    value: int
+    exact: bool  # False for planner estimates and cached counts
+
+
+COUNT_STRATEGIES = ("exact", "cached", "estimated")
+
+
+def _is_whole_table(queryset: QuerySet) -> bool:
+    query = queryset.query
+    return not query.where and not query.distinct and not query.is_sliced
+
+
+def table_row_estimate(queryset: QuerySet) -> Optional[int]:
+    """
+    Row count of the model's table from planner statistics (pg_class.reltuples).
+
+    None if the table has not been vacuumed or analyzed yet.
+    """
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimate_count(queryset: QuerySet) -> int:
+    """
+    Planner estimate of the number of rows in ``queryset``.
+
+    Reads reltuples for a whole table and costs an EXPLAIN for a filtered
+    one, instead of a scan. Exact counts are only used on databases without
+    a planner estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    if _is_whole_table(queryset):
+        estimate = table_row_estimate(queryset)
+        if estimate is not None:
+            return estimate
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan: Any = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(queryset: QuerySet, strategy: Optional[str] = None) -> RowCount:
+    """
+    Count ``queryset`` with one of the LISTING_COUNT strategies.
+
+    - exact: COUNT(*), a scan of every matching row
+    - cached: COUNT(*) kept in the cache for CACHE_TIMEOUT seconds
+    - estimated: planner estimate, or COUNT(*) when the estimate is below
+      EXACT_THRESHOLD and counting is cheap
+    """
+    config = settings.LISTING_COUNT
+    strategy = strategy or config["STRATEGY"]
+    if strategy not in COUNT_STRATEGIES:
+        raise ValueError(f"Unknown count strategy: {strategy}")
+
+    if strategy == "cached":
+        sql, params = queryset.order_by().query.sql_with_params()
+        cache_key = f"listing_count:{hashlib.sha1(f'{sql}|{params}'.encode()).hexdigest()}"
+        value = cache.get(cache_key)
+        if value is None:
+            value = queryset.count()
+            cache.set(cache_key, value, timeout=config["CACHE_TIMEOUT"])
+        return RowCount(value, exact=False)
+
+    if strategy == "estimated" and connections[queryset.db].vendor == "postgresql":
+        estimate = estimate_count(queryset)
+        if estimate >= config["EXACT_THRESHOLD"]:
+            return RowCount(estimate, exact=False)
+
+    return RowCount(queryset.count(), exact=True)
+
+
+acount_rows = sync_to_async(count_rows)
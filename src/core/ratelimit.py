@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpRequest
+from ninja.throttling import BaseThrottle
+from redis.commands.core import Script
+
+from core.redis import get_async_redis, get_redis
+
+logger = logging.getLogger("core")
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+# Generic cell rate algorithm: one key per client holding its theoretical
+# arrival time (TAT) in ms. Each request pushes the TAT one emission interval
+# forward; it is rejected if that would put the TAT more than one period
+# ahead of now. Up to ARGV[3] requests are granted at once (a lease), and
+# ARGV[4] unused requests of an earlier lease are given back first. The key
+# expires once the TAT is reached, so idle clients leave nothing behind.
+# Redis TIME keeps every worker on the same clock.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now) - refund * interval
+if tat < now then
+    tat = now
+end
+local granted = math.min(cost, math.floor((now + period - tat) / interval))
+if granted < 1 then
+    if refund > 0 then
+        redis.call('SET', KEYS[1], tat, 'PX', tat - now)
+    end
+    return {0, tat + interval - period - now, 0}
+end
+local new_tat = tat + granted * interval
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {granted, 0, math.floor((period - (new_tat - now)) / interval)}
+"""
+
+
+class RatePolicy(NamedTuple):
+    name: str
+    limit: int
+    period: int  # seconds
+
+    @property
+    def interval_ms(self) -> int:
+        return max(1, self.period * 1000 // self.limit)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float  # seconds until the next request is allowed
+    remaining: int  # requests still allowed right now
+    granted: int = 1  # requests granted by this call, more than one for a lease
+
+
+def parse_rate(name: str, rate: str) -> RatePolicy:
+    """
+    Parse "<requests>/<second|minute|hour|day>" (e.g. "100/hour", "5/minute")
+    """
+    try:
+        limit, period = rate.split("/")
+        return RatePolicy(name, int(limit), PERIODS[period.strip()[0].lower()])
+    except (ValueError, KeyError, IndexError):
+        raise ImproperlyConfigured(f"Invalid RATE_LIMIT['{name}']: {rate!r}") from None
+
+
+# Parsed once at startup, so bad rates fail fast instead of on a request
+RATE_POLICIES: Dict[str, RatePolicy] = {name: parse_rate(name, rate) for name, rate in settings.RATE_LIMIT.items()}
+
+
+def get_rate_policy(name: str) -> RatePolicy:
+    try:
+        return RATE_POLICIES[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown rate limit policy: {name}") from None
+
+
+class RateLimiter:
+    """
+    Redis rate limiter: one atomic EVALSHA per request
+    """
+
+    KEY_PREFIX = "ratelimit"
+
+    def __init__(self) -> None:
+        self._script: Optional[Script] = None
+
+    def hit(self, policy: RatePolicy, identity: str, cost: int = 1, refund: int = 0) -> RateLimitResult:
+        """
+        Count up to ``cost`` requests of ``identity`` against ``policy``.
+
+        Grants as many of them as the policy still allows, at least one or
+        none, after giving back ``refund`` unused requests of an earlier lease.
+        """
+        if self._script is None:
+            self._script = get_redis().register_script(GCRA_SCRIPT)
+        granted, retry_after_ms, remaining = self._script(
+            keys=[f"{self.KEY_PREFIX}:{policy.name}:{identity}"],
+            args=[policy.interval_ms, policy.period * 1000, cost, refund],
+        )
+        return RateLimitResult(granted > 0, retry_after_ms / 1000, remaining, granted)
+
+    async def ahit(self, policy: RatePolicy, identity: str, cost: int = 1, refund: int = 0) -> RateLimitResult:
+        """
+        Async version of hit, through redis.asyncio
+        """
+        script = get_async_redis().register_script(GCRA_SCRIPT)
+        granted, retry_after_ms, remaining = await script(
+            keys=[f"{self.KEY_PREFIX}:{policy.name}:{identity}"],
+            args=[policy.interval_ms, policy.period * 1000, cost, refund],
+        )
+        return RateLimitResult(granted > 0, retry_after_ms / 1000, remaining, granted)
+
+
+rate_limiter = RateLimiter()
+
+
+class _LocalBucket:
+    __slots__ = ("tokens", "refilled_at", "leased", "lease_expires", "blocked_until", "remaining", "pending")
+
+    def __init__(self, policy: RatePolicy, now: float) -> None:
+        self.tokens = float(policy.limit)
+        self.refilled_at = now
+        self.leased = 0
+        self.lease_expires = 0.0
+        self.blocked_until = 0.0
+        self.remaining = policy.limit
+        self.pending = False  # a background Redis check is in flight
+
+
+class LocalRateFilter:
+    """
+    Per-worker pre-filter in front of the Redis RateLimiter.
+
+    Each client gets a local token bucket with the policy's own rate and
+    burst. A worker that alone has seen more requests than the policy allows
+    knows the global check would fail too, so it rejects without asking
+    Redis. A client Redis rejected stays blocked locally until its
+    retry_after has passed.
+
+    Clients whose local bucket shows a burst (``lease_size`` requests more
+    than its refill) take a lease of several requests from Redis in one call
+    and spend it locally; everybody else pays one request per check. The
+    lease shrinks as the client nears its limit, and the unused part of an
+    expired lease is given back on the next check, so a client spread over
+    time or over workers still gets its whole budget. During a flood, Redis
+    sees about one call per abusive client per emission interval, whatever
+    their request rate. Buckets live in an LRU bounded to ``max_size``
+    clients.
+
+    ``hit_nowait`` is the variant for requests served on an event loop: the
+    Redis check runs in the background through redis.asyncio and its answer
+    (a lease or a block) applies to the client's following requests.
+    """
+
+    def __init__(self, limiter: RateLimiter, max_size: int, lease_size: int, lease_ttl: float) -> None:
+        self.limiter = limiter
+        self.max_size = max_size
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self.local_allows = 0
+        self.local_denies = 0
+        self.escalations = 0
+        self._buckets: "OrderedDict[str, _LocalBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, policy: RatePolicy, key: str, now: float) -> _LocalBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _LocalBucket(policy, now)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            rate = policy.limit / policy.period
+            bucket.tokens = min(float(policy.limit), bucket.tokens + (now - bucket.refilled_at) * rate)
+            bucket.refilled_at = now
+        return bucket
+
+    def _check_local(
+        self, policy: RatePolicy, bucket: _LocalBucket, now: float
+    ) -> Tuple[Optional[RateLimitResult], int]:
+        # The local verdict, or None and the cost to ask Redis for; called under the lock
+        if bucket.blocked_until > now:
+            self.local_denies += 1
+            return RateLimitResult(False, bucket.blocked_until - now, 0, 0), 0
+        if bucket.tokens < 1:
+            self.local_denies += 1
+            return RateLimitResult(False, (1 - bucket.tokens) * policy.period / policy.limit, 0, 0), 0
+        bucket.tokens -= 1
+        if bucket.leased > 0 and bucket.lease_expires > now:
+            bucket.leased -= 1
+            self.local_allows += 1
+            return RateLimitResult(True, 0.0, bucket.remaining + bucket.leased, 0), 0
+        # Only bursts lease, a quarter of what is left, down to a single request near the limit
+        bursting = policy.limit - bucket.tokens >= self.lease_size
+        return None, max(1, min(self.lease_size, bucket.remaining // 4)) if bursting else 1
+
+    def _apply(self, policy: RatePolicy, key: str, result: RateLimitResult) -> None:
+        bucket = self._bucket(policy, key, time.monotonic())
+        bucket.remaining = result.remaining
+        if result.allowed:
+            bucket.leased = result.granted - 1
+            bucket.lease_expires = time.monotonic() + self.lease_ttl
+        else:
+            bucket.leased = 0
+            bucket.blocked_until = time.monotonic() + result.retry_after
+
+    def hit(self, policy: RatePolicy, identity: str) -> RateLimitResult:
+        """
+        Count one request, asking Redis only when the local state cannot decide
+        """
+        key = f"{policy.name}:{identity}"
+        with self._lock:
+            bucket = self._bucket(policy, key, time.monotonic())
+            local, cost = self._check_local(policy, bucket, time.monotonic())
+            if local is not None:
+                return local
+            refund, bucket.leased = bucket.leased, 0
+            self.escalations += 1
+
+        result = self.limiter.hit(policy, identity, cost, refund)
+
+        with self._lock:
+            self._apply(policy, key, result)
+        return result
+
+    def hit_nowait(self, policy: RatePolicy, identity: str) -> RateLimitResult:
+        """
+        Count one request without waiting for Redis; must run on an event loop.
+
+        When the local state cannot decide, the request is let through on
+        the local bucket's word and Redis is asked in the background. The
+        local bucket still caps a client at the policy's rate per worker.
+        """
+        key = f"{policy.name}:{identity}"
+        with self._lock:
+            bucket = self._bucket(policy, key, time.monotonic())
+            local, cost = self._check_local(policy, bucket, time.monotonic())
+            if local is not None:
+                return local
+            self.local_allows += 1
+            if bucket.pending:
+                return RateLimitResult(True, 0.0, bucket.remaining, 0)
+            refund, bucket.leased = bucket.leased, 0
+            bucket.pending = True
+            self.escalations += 1
+
+        task = asyncio.get_running_loop().create_task(self._escalate(policy, identity, key, cost, refund))
+        # The loop only keeps weak references to its tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return RateLimitResult(True, 0.0, bucket.remaining, 0)
+
+    async def _escalate(self, policy: RatePolicy, identity: str, key: str, cost: int, refund: int) -> None:
+        try:
+            result: Optional[RateLimitResult] = await self.limiter.ahit(policy, identity, cost, refund)
+        except Exception as e:
+            logger.error(f"Error en rate limiting: {str(e)}")
+            result = None
+        with self._lock:
+            if result is not None:
+                self._apply(policy, key, result)
+            self._bucket(policy, key, time.monotonic()).pending = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+local_rate_filter = LocalRateFilter(
+    rate_limiter,
+    max_size=settings.RATE_LIMIT_LOCAL["MAX_SIZE"],
+    lease_size=settings.RATE_LIMIT_LOCAL["LEASE_SIZE"],
+    lease_ttl=settings.RATE_LIMIT_LOCAL["LEASE_TTL"],
+)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class RateLimit(BaseThrottle):
+    """
+    Throttle applying a RATE_LIMIT policy per client IP and route.
+
+    Requests are counted per route pattern (e.g. "api/products/<product_id>"),
+    not per path, so the number of keys is bounded by the routes of the API.
+    Pass ``scope`` to share one budget across several routes, and ``methods``
+    to only count requests with those HTTP methods. Requests go through the
+    worker's LocalRateFilter first. If Redis is unavailable requests are let
+    through.
+    """
+
+    def __init__(
+        self, policy: str = "DEFAULT", scope: Optional[str] = None, methods: Optional[Tuple[str, ...]] = None
+    ) -> None:
+        self.policy = get_rate_policy(policy)
+        self.scope = scope
+        self.methods = methods
+        # allow_request and wait run back to back for each request, with no await in between
+        self._last = threading.local()
+
+    def get_scope(self, request: HttpRequest) -> str:
+        if self.scope:
+            return self.scope
+        match = getattr(request, "resolver_match", None)
+        return match.route if match is not None else "global"
+
+    def allow_request(self, request: HttpRequest) -> bool:
+        if self.methods is not None and request.method not in self.methods:
+            self._last.retry_after = None
+            return True
+        identity = f"{self.get_scope(request)}:{self.get_ident(request)}"
+        try:
+            if _on_event_loop():
+                # Async operations run their throttles on the loop, where EVALSHA would block it
+                result = local_rate_filter.hit_nowait(self.policy, identity)
+            else:
+                result = local_rate_filter.hit(self.policy, identity)
+        except Exception as e:
+            logger.error(f"Error en rate limiting: {str(e)}")
+            return True
+
+        self._last.retry_after = result.retry_after
+        if not result.allowed:
+            logger.warning(f"Rate limit {self.policy.name} excedido: {identity}")
+        return result.allowed
+
+    def wait(self) -> Optional[float]:
+        return getattr(self._last, "retry_after", None)
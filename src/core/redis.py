@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.client import PubSub
+
+# redis.asyncio connections belong to the event loop that opened them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+_text_client: Optional[redis.Redis] = None
+_text_client_lock = threading.Lock()
+
+
+def redis_pool_kwargs() -> Dict[str, Any]:
+    """
+    Connection pool options shared by every Redis client of the process (see REDIS_POOL)
+    """
+    config = settings.REDIS_POOL
+    return {
+        "max_connections": config["MAX_CONNECTIONS"],
+        "timeout": config["POOL_TIMEOUT"],
+        "socket_connect_timeout": config["SOCKET_CONNECT_TIMEOUT"],
+        "socket_timeout": config["SOCKET_TIMEOUT"],
+        "health_check_interval": config["HEALTH_CHECK_INTERVAL"],
+    }
+
+
+def get_redis(decode_responses: bool = False) -> redis.Redis:
+    """
+    Return the process-wide Redis client.
+
+    Binary clients are the Django cache's own client, so the cache, the
+    leaderboard and pub/sub publishing share one pool. Clients that decode
+    responses to str (auth) get a second pool with the same bounds. Nothing
+    connects until the first command, and pools reset themselves after a fork.
+    """
+    global _text_client
+    if not decode_responses:
+        return get_redis_connection("default")
+
+    if _text_client is None:
+        with _text_client_lock:
+            if _text_client is None:
+                pool = redis.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL, decode_responses=True, **redis_pool_kwargs()
+                )
+                _text_client = redis.Redis(connection_pool=pool)
+    return _text_client
+
+
+def get_pubsub() -> PubSub:
+    """
+    A pub/sub subscription on its own connection.
+
+    Subscribers block on reads for as long as no message arrives, so they
+    skip the pool's read timeout.
+    """
+    config = settings.REDIS_POOL
+    client = redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=config["SOCKET_CONNECT_TIMEOUT"],
+        health_check_interval=config["HEALTH_CHECK_INTERVAL"],
+    )
+    return client.pubsub(ignore_subscribe_messages=True)
+
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Return the asyncio Redis client for the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool = aioredis.BlockingConnectionPool.from_url(settings.REDIS_URL, **redis_pool_kwargs())
+        client = aioredis.Redis(connection_pool=pool)
+        _async_clients[loop] = client
+    return client
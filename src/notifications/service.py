@@ -1,10 +1,13 @@
-from typing import Dict, Union
+from typing import Dict, List, Optional, Union
 from uuid import UUID
 
+from django.conf import settings
+
 from notifications.tasks import (
     generate_daily_report,
     notify_product_created,
     notify_product_updated,
+    notify_products_bulk_changed,
 )
 
 
@@ -29,6 +32,22 @@ class NotificationService:
 
         return {"success": True, "task_id": task.id, "message": "Notification queued"}
 
+    @staticmethod
+    def notify_products_bulk_changed(
+        action: str, product_ids: List[UUID], changed_by_id: Optional[UUID] = None
+    ) -> Dict[str, Union[bool, str]]:
+        """
+        Queue a single notification for a bulk create, update or delete.
+
+        Only the first NOTIFICATION_BULK_SAMPLE_SIZE products are listed in the email.
+        """
+        sample_ids = [str(product_id) for product_id in product_ids[: settings.NOTIFICATION_BULK_SAMPLE_SIZE]]
+        task = notify_products_bulk_changed.delay(
+            action, len(product_ids), sample_ids, str(changed_by_id) if changed_by_id else None
+        )
+
+        return {"success": True, "task_id": task.id, "message": "Notification queued"}
+
     @staticmethod
     def generate_daily_report() -> Dict[str, Union[bool, str]]:
         """
@@ -148,6 +148,46 @@ def notify_product_updated(product_id: str, updated_by_id: str) -> Dict[str, Uni
         return {"success": False, "message": str(e)}
 
 
+@shared_task(name="notify_products_bulk_changed")
+def notify_products_bulk_changed(
+    action: str, count: int, sample_product_ids: List[str], changed_by_id: Optional[str] = None
+) -> Dict[str, Union[bool, str]]:
+    """
+    Notify admin users once about a bulk create, update or delete
+    """
+    try:
+        admin_users = User.objects.filter(is_admin=True)
+        if changed_by_id:
+            admin_users = admin_users.exclude(id=changed_by_id)
+
+        if not admin_users:
+            return {"success": False, "message": "No admin users found to notify"}
+
+        # Deleted products are gone, so only their ids can be listed
+        products = Product.objects.filter(id__in=sample_product_ids) if action != "deleted" else []
+
+        subject = f"{count} Products {action.capitalize()}"
+        html_content = render_to_string(
+            "emails/products_bulk_changed.html",
+            {
+                "action": action,
+                "count": count,
+                "products": products,
+                "sample_product_ids": sample_product_ids,
+                "more": count - len(sample_product_ids),
+            },
+        )
+
+        to_emails = [user.email for user in admin_users]
+        send_email_notification.delay(to_emails, subject, html_content)
+
+        return {"success": True, "message": f"Notification sent to {len(to_emails)} admin users"}
+
+    except Exception as e:
+        logger.error(f"Failed to notify bulk product change: {str(e)}")
+        return {"success": False, "message": str(e)}
+
+
 @shared_task(name="generate_daily_report")
 def generate_daily_report() -> Dict[str, Union[bool, str]]:
     """
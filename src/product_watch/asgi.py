@@ -9,3 +9,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_watch.settings")
 
 application = get_asgi_application()
+
+# Imported after setup, the suggest index needs the app registry
+from products.suggest import warm_product_name_index  # noqa: E402
+
+warm_product_name_index()
@@ -81,12 +81,35 @@ REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 REDIS_DB = os.getenv("REDIS_DB", "0")
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 
+# Bounds of every Redis connection pool (cache, auth, Celery), per worker process
+REDIS_POOL = {
+    "MAX_CONNECTIONS": int(os.getenv("REDIS_MAX_CONNECTIONS", "20")),
+    "POOL_TIMEOUT": float(os.getenv("REDIS_POOL_TIMEOUT", "2")),  # seconds to wait for a free connection
+    "SOCKET_CONNECT_TIMEOUT": float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "1")),
+    "SOCKET_TIMEOUT": float(os.getenv("REDIS_SOCKET_TIMEOUT", "2")),
+    "HEALTH_CHECK_INTERVAL": int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30")),
+}
+
 # JWT Settings
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 JWT_REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+# Per-worker cache of verified access tokens, revoked over pub/sub on logout
+AUTH_TOKEN_CACHE = {
+    "MAX_SIZE": int(os.getenv("AUTH_TOKEN_CACHE_MAX_SIZE", "10000")),
+    "TTL": float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60")),  # seconds, capped by the token's exp
+}
+
+# Cached (id, email, is_admin) projection of authenticated users, invalidated when a User is saved or deleted
+AUTH_USER_CACHE = {
+    "MAX_SIZE": int(os.getenv("AUTH_USER_CACHE_MAX_SIZE", "10000")),
+    "TTL": float(os.getenv("AUTH_USER_CACHE_TTL", "30")),  # seconds in the per-worker tier
+    "TIMEOUT": int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "300")),  # seconds in Redis
+    "NEGATIVE_TIMEOUT": int(os.getenv("AUTH_USER_CACHE_NEGATIVE_TIMEOUT", "30")),  # unknown user ids
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -103,16 +126,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-# Rate limiting
+# Rate limiting policies ("<requests>/<second|minute|hour|day>"), parsed at startup by core.ratelimit
 RATE_LIMIT = {
-    "DEFAULT": "100/hour",
+    "DEFAULT": "100/hour",  # writes, per client and route
+    "READ": "600/minute",  # reads, one budget per client across every route
+    "SUGGEST": "1200/minute",  # typeahead, one request per keystroke
     "LOGIN": "5/minute",
     "PRODUCT_CREATE": "20/hour",
 }
 
+# Reverse proxies in front of the app whose X-Forwarded-For entries are trusted to identify
+# clients. 0 keys rate limits on REMOTE_ADDR; never leave it unset, X-Forwarded-For is client input
+NINJA_NUM_PROXIES = int(os.getenv("NINJA_NUM_PROXIES", "0"))
+
+# Per-worker pre-filter in front of the Redis limiter: local token buckets, local blocks and leased batches
+RATE_LIMIT_LOCAL = {
+    "MAX_SIZE": int(os.getenv("RATE_LIMIT_LOCAL_MAX_SIZE", "10000")),  # clients tracked per worker (LRU)
+    "LEASE_SIZE": int(os.getenv("RATE_LIMIT_LOCAL_LEASE_SIZE", "10")),  # requests taken from Redis at once
+    "LEASE_TTL": float(os.getenv("RATE_LIMIT_LOCAL_LEASE_TTL", "5")),  # seconds an unused lease stays valid
+}
+
 # SendGrid settings
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 NOTIFICATION_FROM_EMAIL = os.getenv("NOTIFICATION_FROM_EMAIL")
+# Products listed in the single email sent for a bulk change
+NOTIFICATION_BULK_SAMPLE_SIZE = int(os.getenv("NOTIFICATION_BULK_SAMPLE_SIZE", "20"))
 
 # Internationalization
 LANGUAGE_CODE = "en-us"
@@ -132,11 +170,69 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_BROKER_POOL_LIMIT = REDIS_POOL["MAX_CONNECTIONS"]
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "max_connections": REDIS_POOL["MAX_CONNECTIONS"],
+    "socket_connect_timeout": REDIS_POOL["SOCKET_CONNECT_TIMEOUT"],
+    "socket_timeout": REDIS_POOL["SOCKET_TIMEOUT"],
+    "health_check_interval": REDIS_POOL["HEALTH_CHECK_INTERVAL"],
+}
+CELERY_REDIS_MAX_CONNECTIONS = REDIS_POOL["MAX_CONNECTIONS"]
+CELERY_REDIS_SOCKET_CONNECT_TIMEOUT = REDIS_POOL["SOCKET_CONNECT_TIMEOUT"]
+CELERY_REDIS_SOCKET_TIMEOUT = REDIS_POOL["SOCKET_TIMEOUT"]
+CELERY_REDIS_BACKEND_HEALTH_CHECK_INTERVAL = REDIS_POOL["HEALTH_CHECK_INTERVAL"]
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
+# Visit tracking ingestion
+# MODE "sync" writes each visit inside the request; "buffered" only queues a compact
+# event and a flusher writes batches with bulk_create (BUFFER_BACKEND "memory" or "redis")
+VISIT_TRACKING = {
+    "MODE": os.getenv("VISIT_TRACKING_MODE", "sync"),
+    "BUFFER_BACKEND": os.getenv("VISIT_BUFFER_BACKEND", "memory"),
+    "BUFFER_MAX_SIZE": int(os.getenv("VISIT_BUFFER_MAX_SIZE", "10000")),
+    "BATCH_SIZE": int(os.getenv("VISIT_BUFFER_BATCH_SIZE", "500")),
+    "FLUSH_INTERVAL": float(os.getenv("VISIT_BUFFER_FLUSH_INTERVAL", "2.0")),  # seconds
+    "STREAM_KEY": "visits:stream",
+    "STREAM_GROUP": "visit-flushers",
+    # ms a stream entry may stay unacknowledged before another flusher claims it
+    "STREAM_CLAIM_IDLE": int(os.getenv("VISIT_BUFFER_STREAM_CLAIM_IDLE", "60000")),
+}
+
+# Daily HyperLogLog sketches of unique visitors are kept this many days
+UNIQUE_VISITOR_SKETCH_RETENTION_DAYS = int(os.getenv("UNIQUE_VISITOR_SKETCH_RETENTION_DAYS", "400"))
+
+# Finished days are closed in VisitDailyRollup once they ended this long ago
+VISIT_ROLLUP_GRACE_MINUTES = int(os.getenv("VISIT_ROLLUP_GRACE_MINUTES", "60"))
+
+# Stored ProductAnalytics snapshots older than this are served stale and refreshed in the background
+VISIT_ANALYTICS_MAX_AGE = int(os.getenv("VISIT_ANALYTICS_MAX_AGE", "300"))  # seconds
+
+# Visits are stored in monthly partitions; future partitions are created ahead of time
+# and partitions older than the retention window are dropped (daily rollups are kept)
+VISIT_PARTITIONS = {
+    "PREMAKE_MONTHS": int(os.getenv("VISIT_PARTITION_PREMAKE_MONTHS", "3")),
+    "RETENTION_MONTHS": int(os.getenv("VISIT_RETENTION_MONTHS", "13")),
+    "DETACH_ONLY": os.getenv("VISIT_RETENTION_DETACH_ONLY", "False") == "True",
+}
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-visit-buffer": {
+        "task": "flush_visit_buffer",
+        "schedule": VISIT_TRACKING["FLUSH_INTERVAL"],
+    },
+    "rollup-visits": {
+        "task": "rollup_visits",
+        "schedule": 5 * 60,  # seconds
+    },
+    "manage-visit-partitions": {
+        "task": "manage_visit_partitions",
+        "schedule": 24 * 60 * 60,  # seconds
+    },
+}
+
 # Cache configuration
 CACHES = {
     "default": {
@@ -144,9 +240,59 @@ CACHES = {
         "LOCATION": REDIS_URL,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # Shared with core.redis.get_redis(), so the cache and other binary clients use one pool
+            "CONNECTION_POOL_CLASS": "redis.BlockingConnectionPool",
+            "CONNECTION_POOL_KWARGS": {
+                "max_connections": REDIS_POOL["MAX_CONNECTIONS"],
+                "timeout": REDIS_POOL["POOL_TIMEOUT"],
+                "health_check_interval": REDIS_POOL["HEALTH_CHECK_INTERVAL"],
+            },
+            "SOCKET_CONNECT_TIMEOUT": REDIS_POOL["SOCKET_CONNECT_TIMEOUT"],
+            "SOCKET_TIMEOUT": REDIS_POOL["SOCKET_TIMEOUT"],
         },
     }
 }
 
+# Totals of paginated listings: "exact" (COUNT(*)), "cached" (COUNT(*) kept CACHE_TIMEOUT seconds)
+# or "estimated" (planner statistics, exact below EXACT_THRESHOLD rows)
+LISTING_COUNT = {
+    "STRATEGY": os.getenv("LISTING_COUNT_STRATEGY", "estimated"),
+    "CACHE_TIMEOUT": int(os.getenv("LISTING_COUNT_CACHE_TIMEOUT", "60")),
+    "EXACT_THRESHOLD": int(os.getenv("LISTING_COUNT_EXACT_THRESHOLD", "1000")),
+}
+
 # Product cache timeout (in seconds)
 PRODUCT_CACHE_TIMEOUT = 60 * 60  # 1 hour
+# Cached listing pages; writes through ProductService invalidate them immediately
+PRODUCT_LISTING_CACHE_TIMEOUT = int(os.getenv("PRODUCT_LISTING_CACHE_TIMEOUT", "300"))
+# Lookups of unknown product ids are cached this long
+PRODUCT_NEGATIVE_CACHE_TIMEOUT = int(os.getenv("PRODUCT_NEGATIVE_CACHE_TIMEOUT", "30"))
+
+# Per-worker LRU in front of the Redis product cache, invalidated over pub/sub
+PRODUCT_LOCAL_CACHE = {
+    "MAX_SIZE": int(os.getenv("PRODUCT_LOCAL_CACHE_MAX_SIZE", "1000")),
+    "TTL": float(os.getenv("PRODUCT_LOCAL_CACHE_TTL", "30")),  # seconds, bounds staleness if pub/sub is down
+}
+
+# Product search: "postgres" (tsvector + pg_trgm indexes), "memory" (in-process inverted index) or "auto"
+PRODUCT_SEARCH_BACKEND = os.getenv("PRODUCT_SEARCH_BACKEND", "auto")
+
+# Max ids per GET /products/batch request
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", "100"))
+# Rows per INSERT/UPDATE statement of the /products/bulk endpoints
+PRODUCT_BULK_BATCH_SIZE = int(os.getenv("PRODUCT_BULK_BATCH_SIZE", "1000"))
+
+# Caching headers of public product responses; CDNs purge them by Surrogate-Key.
+# Only set a long SURROGATE_CONTROL (e.g. max-age=86400) once a surrogate_keys_purged
+# receiver purges the CDN; until then the CDN follows CACHE_CONTROL
+HTTP_CACHE = {
+    "CACHE_CONTROL": os.getenv("HTTP_CACHE_CONTROL", "public, max-age=60"),
+    "SURROGATE_CONTROL": os.getenv("HTTP_SURROGATE_CONTROL", ""),
+}
+
+# In-memory typeahead index behind /products/suggest, ranked by the popularity leaderboard
+PRODUCT_SUGGEST = {
+    "POPULARITY_REFRESH": float(os.getenv("PRODUCT_SUGGEST_POPULARITY_REFRESH", "60")),  # seconds
+    "POPULARITY_SIZE": int(os.getenv("PRODUCT_SUGGEST_POPULARITY_SIZE", "10000")),  # most visited products ranked
+    "MAX_LIMIT": 20,
+}
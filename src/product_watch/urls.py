@@ -1,11 +1,16 @@
+import math
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from ninja import NinjaAPI
+from ninja.errors import Throttled
 
 from auth.api import router as auth_router
 from core.api import router as core_router
+from core.ratelimit import READ_METHODS, WRITE_METHODS, RateLimit
+from core.renderers import ORJSONRenderer
 from products.api import router as products_router
 from visits.api import router as visits_router
 
@@ -15,9 +20,21 @@ api = NinjaAPI(
     version="1.0.0",
     description="API for product management and visit tracking",
     openapi_url="/openapi.json",  # Keep OpenAPI schema
+    renderer=ORJSONRenderer(),
+    # Reads share RATE_LIMIT["READ"] per client, writes get RATE_LIMIT["DEFAULT"] per client and
+    # route; routes may pass their own throttle
+    throttle=[RateLimit("READ", "read", methods=READ_METHODS), RateLimit("DEFAULT", methods=WRITE_METHODS)],
 )
 
 
+@api.exception_handler(Throttled)
+def throttled(request, exc: Throttled):
+    response = api.create_response(request, {"detail": "Too many requests."}, status=429)
+    if exc.wait:
+        response["Retry-After"] = str(math.ceil(exc.wait))
+    return response
+
+
 # Agregar routers
 api.add_router("/", core_router)
 api.add_router("/auth", auth_router)
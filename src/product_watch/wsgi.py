@@ -9,3 +9,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "product_watch.settings")
 
 application = get_wsgi_application()
+
+# Imported after setup, the suggest index needs the app registry
+from products.suggest import warm_product_name_index  # noqa: E402
+
+warm_product_name_index()
@@ -2,12 +2,27 @@ import logging
 from typing import Dict, List, Optional
 from uuid import UUID
 
-from django.http import HttpRequest
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
 from ninja import Query, Router
 
 from auth.dependencies import get_admin_auth
+from core.http import make_etag, not_modified, set_cache_headers
+from core.pagination import InvalidCursor
+from core.ratelimit import RateLimit
 from notifications.service import NotificationService
-from products.schemas import ProductCreate, ProductList, ProductOut, ProductUpdate
+from products.cache import CATALOG_SURROGATE_KEY, aget_catalog_version, product_surrogate_key
+from products.schemas import (
+    ProductBatch,
+    ProductBulkDelete,
+    ProductBulkResult,
+    ProductBulkUpdate,
+    ProductCreate,
+    ProductList,
+    ProductOut,
+    ProductSuggestion,
+    ProductUpdate,
+)
 from products.service import ProductService
 
 logger = logging.getLogger("products")
@@ -17,41 +32,165 @@ product_service = ProductService()
 notification_service = NotificationService()
 
 
-@router.get("/", response=ProductList)
-def list_products(
+@router.get("/", response={200: ProductList, 400: Dict[str, str]})
+async def list_products(
     request: HttpRequest,
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 100,
     name: Optional[str] = None,
+    include_count: bool = False,
+    skip: int = 0,
+    q: Optional[str] = None,
 ):
     """
-    List all products with optional filtering and pagination.
+    List products, newest first, with optional filtering and cursor pagination.
+
+    Pass the returned next_cursor to get the following page. ``skip`` is kept
+    for older clients and costs an OFFSET scan. ``q`` runs a full-text search
+    over name and description instead, ranked by relevance and paginated with
+    ``skip``. Pages are cached until the catalog changes, and their ETag
+    follows the catalog version so unchanged pages are answered with 304.
     """
-    products, total = product_service.get_all_products(skip=skip, limit=limit, name_filter=name)
-    return ProductList(items=[ProductOut.from_orm(p) for p in products], count=total)
+    version = await aget_catalog_version()
+    etag = product_service.listing_etag(version, cursor, limit, name, include_count, skip, q)
+    response = not_modified(request, etag)
+    if response is None:
+        try:
+            page = await product_service.aget_products_page_json(
+                cursor=cursor,
+                limit=limit,
+                name_filter=name,
+                include_count=include_count,
+                skip=skip,
+                query=q,
+                version=version,
+            )
+        except InvalidCursor as e:
+            return 400, {"detail": str(e)}
+        response = HttpResponse(page, content_type="application/json")
+    return set_cache_headers(response, etag, surrogate_keys=[CATALOG_SURROGATE_KEY])
 
 
 @router.get("/popular", response=List[ProductOut])
 def list_popular_products(request: HttpRequest, limit: int = 5):
     """
     List popular products based on visit counts.
+
+    Returns the cached, already rendered JSON list.
+    """
+    body = product_service.get_popular_products_json(limit=limit)
+    etag = make_etag(body)
+    response = not_modified(request, etag) or HttpResponse(body, content_type="application/json")
+    return set_cache_headers(response, etag, surrogate_keys=[CATALOG_SURROGATE_KEY])
+
+
+@router.get("/suggest", response=List[ProductSuggestion], throttle=RateLimit("SUGGEST", "suggest"))
+async def suggest_products(request: HttpRequest, prefix: str, limit: int = 10):
+    """
+    Typeahead suggestions for product names starting with ``prefix`` at any word.
+
+    Served from an in-memory index, most visited products first.
+    """
+    suggestions = await product_service.asuggest_products(prefix, limit)
+    return [{"id": product_id, "name": name} for product_id, name in suggestions]
+
+
+@router.get("/batch", response={200: ProductBatch, 400: Dict[str, str]})
+def get_products_batch(request: HttpRequest, ids: List[str] = Query(...)):
+    """
+    Get many products by ID, in request order.
+
+    Accepts ``ids=a,b,c`` or repeated ``ids``. Unknown ids come back with
+    found=false. One cache read, at most one query and one cache write per request.
+    """
+    try:
+        product_ids = [UUID(value.strip()) for raw in ids for value in raw.split(",") if value.strip()]
+    except ValueError:
+        return 400, {"detail": "ids must be UUIDs"}
+    if not product_ids or len(product_ids) > settings.PRODUCT_BATCH_MAX_IDS:
+        return 400, {"detail": f"Pass between 1 and {settings.PRODUCT_BATCH_MAX_IDS} ids"}
+
+    return HttpResponse(product_service.get_products_batch_json(product_ids), content_type="application/json")
+
+
+@router.post(
+    "/bulk",
+    auth=get_admin_auth(),
+    response={201: ProductBulkResult},
+    throttle=RateLimit("PRODUCT_CREATE", "product_create"),
+)
+def bulk_create_products(request: HttpRequest, products_data: List[ProductCreate]):
+    """
+    Create many products in one transaction (admin only).
+
+    Admins get a single notification for the whole batch.
     """
-    products = product_service.get_popular_products(limit=limit)
-    return [ProductOut.from_orm(p) for p in products]
+    products = product_service.bulk_create_products(products_data)
+    product_ids = [product.id for product in products]
+    notify_bulk_change("created", product_ids, request.user.id)
+    return 201, {"count": len(product_ids), "ids": product_ids}
+
+
+@router.put("/bulk", auth=get_admin_auth(), response={200: ProductBulkResult})
+def bulk_update_products(request: HttpRequest, products_data: List[ProductBulkUpdate]):
+    """
+    Update many products in one transaction (admin only).
+
+    Unknown ids are skipped and returned in not_found.
+    """
+    products, not_found = product_service.bulk_update_products(products_data)
+    product_ids = [product.id for product in products]
+    notify_bulk_change("updated", product_ids, request.user.id)
+    return 200, {"count": len(product_ids), "ids": product_ids, "not_found": not_found}
+
+
+@router.delete("/bulk", auth=get_admin_auth(), response={200: ProductBulkResult})
+def bulk_delete_products(request: HttpRequest, payload: ProductBulkDelete):
+    """
+    Delete many products in one transaction (admin only).
+
+    Unknown ids are skipped and returned in not_found.
+    """
+    deleted, not_found = product_service.bulk_delete_products(payload.ids)
+    notify_bulk_change("deleted", deleted, request.user.id)
+    return 200, {"count": len(deleted), "ids": deleted, "not_found": not_found}
+
+
+def notify_bulk_change(action: str, product_ids: List[UUID], user_id: UUID) -> None:
+    if not product_ids:
+        return
+    logger.info(f"Productos {action} en lote: {len(product_ids)}")
+    try:
+        notification_service.notify_products_bulk_changed(action, product_ids, user_id)
+    except Exception as e:
+        logger.error(f"Error al enviar notificación: {str(e)}")
 
 
 @router.get("/{product_id}", response={200: ProductOut, 404: Dict[str, str]})
-def get_product(request: HttpRequest, product_id: UUID):
+async def get_product(request: HttpRequest, product_id: UUID):
     """
     Get a specific product by ID.
+
+    Returns the cached, already rendered JSON of the product, or 304 if the
+    client's ETag / Last-Modified still match.
     """
-    product = product_service.get_product_by_id(product_id)
-    if not product:
+    serialized = await product_service.aget_product_json(product_id)
+    if not serialized:
         return 404, {"detail": "Product not found"}
-    return 200, ProductOut.from_orm(product)
-
-
-@router.post("/", auth=get_admin_auth(), response={201: ProductOut, 400: Dict[str, str]})
+    response = not_modified(request, serialized.etag, serialized.last_modified)
+    if response is None:
+        response = HttpResponse(serialized.body, content_type="application/json")
+    return set_cache_headers(
+        response, serialized.etag, serialized.last_modified, surrogate_keys=[product_surrogate_key(product_id)]
+    )
+
+
+@router.post(
+    "/",
+    auth=get_admin_auth(),
+    response={201: ProductOut, 400: Dict[str, str]},
+    throttle=RateLimit("PRODUCT_CREATE", "product_create"),
+)
 def create_product(request: HttpRequest, product_data: ProductCreate):
     """
     Create a new product (admin only).
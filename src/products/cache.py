@@ -0,0 +1,95 @@
+import hashlib
+from datetime import datetime
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import TwoTierCache
+from core.http import make_etag
+from core.redis import get_async_redis
+
+CATALOG_VERSION_KEY = "products:catalog_version"
+# Surrogate key of every response that depends on the whole catalog (listings, popular products)
+CATALOG_SURROGATE_KEY = "products"
+
+product_cache = TwoTierCache(
+    "products",
+    max_size=settings.PRODUCT_LOCAL_CACHE["MAX_SIZE"],
+    local_ttl=settings.PRODUCT_LOCAL_CACHE["TTL"],
+    timeout=settings.PRODUCT_CACHE_TIMEOUT,
+)
+
+# Listing pages are keyed under the catalog version, so old pages are simply never read again
+listing_cache = TwoTierCache(
+    "product_listings",
+    max_size=settings.PRODUCT_LOCAL_CACHE["MAX_SIZE"],
+    local_ttl=settings.PRODUCT_LOCAL_CACHE["TTL"],
+    timeout=settings.PRODUCT_LISTING_CACHE_TIMEOUT,
+)
+
+
+def product_cache_key(product_id: UUID) -> str:
+    # v2: values are CacheEntry tuples; "product:{id}" still holds raw Product pickles until they expire
+    return f"product:v2:{product_id}"
+
+
+def product_json_cache_key(product_id: UUID) -> str:
+    return f"product_json:{product_id}"
+
+
+def product_surrogate_key(product_id: UUID) -> str:
+    return f"product-{product_id}"
+
+
+def popular_products_json_cache_key(version: int, limit: int) -> str:
+    # Keyed by catalog version like listing pages, so product writes invalidate it
+    return f"popular_products_json:v{version}:{limit}"
+
+
+class SerializedProduct(NamedTuple):
+    """
+    Rendered ProductOut JSON, versioned by the product's updated_at
+    """
+
+    version: str
+    body: bytes
+
+    @property
+    def etag(self) -> str:
+        return make_etag(self.version)
+
+    @property
+    def last_modified(self) -> datetime:
+        return datetime.fromisoformat(self.version)
+
+
+def get_catalog_version() -> int:
+    return cache.get(CATALOG_VERSION_KEY) or 0
+
+
+async def aget_catalog_version() -> int:
+    raw = await get_async_redis().get(cache.make_key(CATALOG_VERSION_KEY))
+    return 0 if raw is None else cache.client.decode(raw)
+
+
+def bump_catalog_version() -> int:
+    """
+    Invalidate every cached listing page in O(1) by moving to a new namespace
+    """
+    cache.add(CATALOG_VERSION_KEY, 0, timeout=None)
+    return cache.incr(CATALOG_VERSION_KEY)
+
+
+def listing_cache_key(
+    version: int,
+    cursor: Optional[str],
+    limit: int,
+    name_filter: Optional[str],
+    include_count: bool,
+    skip: int,
+    query: Optional[str] = None,
+) -> str:
+    params = f"{cursor or ''}|{limit}|{name_filter or ''}|{int(include_count)}|{skip}|{query or ''}"
+    return f"products:list:v{version}:{hashlib.sha1(params.encode()).hexdigest()}"
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+PRODUCT_TABLE = 'products_product'
+SEARCH_CONFIG = 'simple'
+
+
+def add_search_indexes(apps, schema_editor):
+    """
+    Add a stored tsvector over name and description with a GIN index and, when
+    pg_trgm can be installed, a trigram index on UPPER(name).
+
+    The trigram index also serves the ``name__icontains`` filter, which Django
+    compiles to ``UPPER(name) LIKE UPPER(%s)``.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {PRODUCT_TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ('
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+            f') STORED'
+        )
+        cursor.execute(f'CREATE INDEX product_search_vector_idx ON {PRODUCT_TABLE} USING GIN (search_vector)')
+
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+        if not cursor.fetchone()[0]:
+            return
+        # Installing an extension may need privileges the migration user does not have
+        cursor.execute('SAVEPOINT product_trgm')
+        try:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except Exception:
+            cursor.execute('ROLLBACK TO SAVEPOINT product_trgm')
+            return
+        cursor.execute('RELEASE SAVEPOINT product_trgm')
+        cursor.execute(f'CREATE INDEX product_name_trgm_idx ON {PRODUCT_TABLE} USING GIN (UPPER(name) gin_trgm_ops)')
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP INDEX IF EXISTS product_name_trgm_idx')
+        cursor.execute('DROP INDEX IF EXISTS product_search_vector_idx')
+        cursor.execute(f'ALTER TABLE {PRODUCT_TABLE} DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
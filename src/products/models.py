@@ -11,5 +11,11 @@ class Product(BaseModel):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog on (created_at, id)
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+        ]
+
     def __str__(self) -> str:
         return self.name
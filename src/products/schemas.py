@@ -1,6 +1,6 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 from ninja import Schema
@@ -35,6 +35,20 @@ class ProductUpdate(Schema):
         return v
 
 
+class ProductBulkUpdate(ProductUpdate):
+    id: UUID
+
+
+class ProductBulkDelete(Schema):
+    ids: List[UUID] = Field(..., min_length=1)
+
+
+class ProductBulkResult(Schema):
+    count: int
+    ids: List[UUID]
+    not_found: List[UUID] = []  # Update and delete only
+
+
 class ProductOut(ProductBase):
     id: UUID
     created_at: datetime
@@ -43,4 +57,21 @@ class ProductOut(ProductBase):
 
 class ProductList(Schema):
     items: list[ProductOut]
-    count: int
+    next_cursor: Optional[str] = None  # None on the last page
+    count: Optional[int] = None  # Only when include_count=true
+    count_exact: Optional[bool] = None  # False when count is an estimate or cached
+
+
+class ProductSuggestion(Schema):
+    id: UUID
+    name: str
+
+
+class ProductBatchItem(Schema):
+    id: UUID
+    found: bool
+    product: Optional[ProductOut] = None  # None when found is false
+
+
+class ProductBatch(Schema):
+    items: List[ProductBatchItem]
@@ -0,0 +1,195 @@
+import bisect
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+
+from core.pagination import RowCount, count_rows
+from products.cache import get_catalog_version
+from products.models import Product
+
+logger = logging.getLogger("products")
+
+# Must match the text search configuration of the search_vector column (migration 0003)
+SEARCH_CONFIG = "simple"
+TRIGRAM_INDEX = "product_name_trgm_idx"
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Same defaults ts_rank_cd uses for the 'A' (name) and 'B' (description) weights
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+SearchRow = Tuple[UUID, str, Optional[str], datetime]
+
+_trigram_index: Optional[bool] = None
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def get_search_backend() -> str:
+    backend = settings.PRODUCT_SEARCH_BACKEND
+    if backend == "auto":
+        return "postgres" if connection.vendor == "postgresql" else "memory"
+    return backend
+
+
+def has_trigram_index() -> bool:
+    """
+    Whether migration 0003 could create the pg_trgm index on product names
+    """
+    global _trigram_index
+    if _trigram_index is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = %s)", [TRIGRAM_INDEX])
+            _trigram_index = cursor.fetchone()[0]
+    return _trigram_index
+
+
+def postgres_search(query: str, tokens: List[str]) -> QuerySet:
+    """
+    Products matching every token as a word prefix, best ranked first.
+
+    Matches come from the GIN index on search_vector. With pg_trgm, names
+    similar to the whole query also match, which catches typos.
+    """
+    table = connection.ops.quote_name(Product._meta.db_table)
+    tsquery = " & ".join(f"{token}:*" for token in tokens)
+    match_sql = f"{table}.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)"
+    rank_sql = f"ts_rank_cd({table}.search_vector, to_tsquery('{SEARCH_CONFIG}', %s))"
+    match_params: List[str] = [tsquery]
+    rank_params: List[str] = [tsquery]
+
+    if has_trigram_index():
+        # % is the pg_trgm similarity operator, escaped for the DB-API
+        match_sql = f"({match_sql} OR UPPER({table}.name) %% UPPER(%s))"
+        rank_sql = f"{rank_sql} + similarity(UPPER({table}.name), UPPER(%s))"
+        match_params.append(query)
+        rank_params.append(query)
+
+    return (
+        Product.objects.filter(RawSQL(match_sql, match_params, output_field=BooleanField()))
+        .annotate(search_rank=RawSQL(rank_sql, rank_params, output_field=FloatField()))
+        .order_by("-search_rank", "-created_at", "-id")
+    )
+
+
+class InMemorySearchIndex:
+    """
+    Inverted index of product names and descriptions kept in process memory.
+
+    Used where Postgres full-text search is not available. Query tokens match
+    as word prefixes, found by bisecting the sorted vocabulary, and results
+    are ranked like ts_rank_cd with the name weighing more than the
+    description. The index is rebuilt when the catalog version changes.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[UUID, float]] = {}
+        self._vocabulary: List[str] = []
+        self._created_at: Dict[UUID, datetime] = {}
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._created_at)
+
+    def build(self, rows: Iterable[SearchRow]) -> None:
+        postings: Dict[str, Dict[UUID, float]] = {}
+        created_at: Dict[UUID, datetime] = {}
+        for product_id, name, description, created in rows:
+            created_at[product_id] = created
+            for tokens, weight in ((tokenize(name), NAME_WEIGHT), (tokenize(description), DESCRIPTION_WEIGHT)):
+                for token in tokens:
+                    scores = postings.setdefault(token, {})
+                    scores[product_id] = scores.get(product_id, 0.0) + weight
+
+        self._postings, self._created_at = postings, created_at
+        self._vocabulary = sorted(postings)
+
+    def _prefix_matches(self, token: str) -> Dict[UUID, float]:
+        matches: Dict[UUID, float] = {}
+        position = bisect.bisect_left(self._vocabulary, token)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(token):
+            for product_id, score in self._postings[self._vocabulary[position]].items():
+                matches[product_id] = matches.get(product_id, 0.0) + score
+            position += 1
+        return matches
+
+    def search(self, tokens: List[str]) -> List[UUID]:
+        """
+        Ids of the products matching every token, best ranked first
+        """
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[UUID, float]] = None
+        for token in tokens:
+            matches = self._prefix_matches(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    product_id: score + matches[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in matches
+                }
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda pid: (scores[pid], self._created_at[pid], str(pid)), reverse=True)
+
+    def ensure_current(self) -> None:
+        """
+        Rebuild the index from the database if the catalog changed since the last build
+        """
+        version = get_catalog_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            self.build(Product.objects.values_list("id", "name", "description", "created_at").iterator())
+            self._version = version
+            logger.info(f"Rebuilt in-memory product search index ({len(self)} products)")
+
+
+memory_search_index = InMemorySearchIndex()
+
+
+def search_products(
+    query: str, limit: int = 100, skip: int = 0, include_count: bool = False
+) -> Tuple[List[Product], Optional[RowCount]]:
+    """
+    Full-text search over product names and descriptions, best matches first.
+
+    Returns a page of products and, if requested, the number of matches
+    counted with the LISTING_COUNT strategy.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return [], RowCount(0, exact=True) if include_count else None
+
+    if get_search_backend() == "postgres":
+        queryset = postgres_search(query, tokens)
+        total = count_rows(queryset) if include_count else None
+        return list(queryset[skip : skip + limit]), total
+
+    memory_search_index.ensure_current()
+    product_ids = memory_search_index.search(tokens)
+    page_ids = product_ids[skip : skip + limit]
+    products = Product.objects.in_bulk(page_ids)
+    total = RowCount(len(product_ids), exact=True) if include_count else None
+    return [products[product_id] for product_id in page_ids if product_id in products], total
+
+
+asearch_products = sync_to_async(search_products)
@@ -1,50 +1,294 @@
-from typing import List, Optional, Tuple
+import logging
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
+import orjson
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.cache import cache
+from django.db import transaction
 from django.db.models.query import QuerySet
+from django.utils import timezone
 
+from core.http import make_etag
+from core.pagination import RowCount, acount_rows, apaginate_keyset, count_rows, paginate_keyset
+from core.renderers import dumps
+from products.cache import (
+    CATALOG_SURROGATE_KEY,
+    SerializedProduct,
+    aget_catalog_version,
+    bump_catalog_version,
+    get_catalog_version,
+    listing_cache,
+    listing_cache_key,
+    popular_products_json_cache_key,
+    product_cache,
+    product_cache_key,
+    product_json_cache_key,
+    product_surrogate_key,
+)
 from products.models import Product
-from products.schemas import ProductCreate, ProductUpdate
+from products.schemas import ProductBulkUpdate, ProductCreate, ProductList, ProductOut, ProductUpdate
+from products.search import asearch_products, search_products
+from products.signals import surrogate_keys_purged
+from products.suggest import Suggestion, product_name_index
+
+logger = logging.getLogger("products")
+
+PRODUCT_KEYSET = ("created_at", "id")
 
 
 class ProductService:
     @staticmethod
     def get_product_by_id(product_id: UUID) -> Optional[Product]:
         """
-        Get product by id, using cache if available
+        Get product by id, using the two-tier product cache if available.
+
+        Only one lookup per product runs at a time across workers, unknown ids
+        are cached briefly and hot entries are refreshed before they expire.
         """
-        cache_key = f"product:{product_id}"
-        cached_product = cache.get(cache_key)
 
-        if cached_product:
-            return cached_product
+        def load_product() -> Optional[Product]:
+            try:
+                return Product.objects.get(id=product_id)
+            except Product.DoesNotExist:
+                return None
 
-        try:
-            product = Product.objects.get(id=product_id)
-            # Cache product for future requests
-            cache.set(cache_key, product, timeout=settings.PRODUCT_CACHE_TIMEOUT)
-            return product
-        except Product.DoesNotExist:
-            return None
+        return product_cache.get_or_load(
+            product_cache_key(product_id), load_product, negative_timeout=settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT
+        )
+
+    @staticmethod
+    async def aget_product_by_id(product_id: UUID) -> Optional[Product]:
+        """
+        Async version of get_product_by_id
+        """
+
+        async def load_product() -> Optional[Product]:
+            try:
+                return await Product.objects.aget(id=product_id)
+            except Product.DoesNotExist:
+                return None
+
+        return await product_cache.aget_or_load(
+            product_cache_key(product_id), load_product, negative_timeout=settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT
+        )
+
+    @staticmethod
+    def serialize_product(product: Product) -> SerializedProduct:
+        """
+        Render a product to the JSON bytes returned by the API
+        """
+        return SerializedProduct(
+            version=product.updated_at.isoformat(), body=dumps(ProductOut.from_orm(product).model_dump())
+        )
+
+    @classmethod
+    def get_product_json(cls, product_id: UUID) -> Optional[SerializedProduct]:
+        """
+        Get the rendered JSON of a product, cached so hits skip model and schema construction
+        """
+
+        def load_product_json() -> Optional[SerializedProduct]:
+            try:
+                return cls.serialize_product(Product.objects.get(id=product_id))
+            except Product.DoesNotExist:
+                return None
+
+        return product_cache.get_or_load(
+            product_json_cache_key(product_id),
+            load_product_json,
+            negative_timeout=settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    async def aget_product_json(cls, product_id: UUID) -> Optional[SerializedProduct]:
+        """
+        Async version of get_product_json
+        """
+
+        async def load_product_json() -> Optional[SerializedProduct]:
+            try:
+                return cls.serialize_product(await Product.objects.aget(id=product_id))
+            except Product.DoesNotExist:
+                return None
+
+        return await product_cache.aget_or_load(
+            product_json_cache_key(product_id),
+            load_product_json,
+            negative_timeout=settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    def get_products_json_batch(cls, product_ids: List[UUID]) -> Dict[UUID, Optional[SerializedProduct]]:
+        """
+        Get the rendered JSON of many products with one cache read, one query
+        for the misses and one cache write to backfill them.
+
+        Unknown ids map to None and are cached briefly like single lookups.
+        """
+        keys = {product_json_cache_key(product_id): product_id for product_id in dict.fromkeys(product_ids)}
+        results = {keys[key]: value for key, value in product_cache.get_many(list(keys)).items()}
+
+        missing = [product_id for product_id in keys.values() if product_id not in results]
+        if missing:
+            products = Product.objects.in_bulk(missing)
+            loaded = {
+                product_json_cache_key(product_id): (
+                    cls.serialize_product(products[product_id]) if product_id in products else None
+                )
+                for product_id in missing
+            }
+            product_cache.set_many(loaded, negative_timeout=settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT)
+            results.update({keys[key]: value for key, value in loaded.items()})
+
+        return results
+
+    @classmethod
+    def get_products_batch_json(cls, product_ids: List[UUID]) -> bytes:
+        """
+        Render a ProductBatch in request order, embedding the cached product JSON as is
+        """
+        serialized = cls.get_products_json_batch(product_ids)
+        items = []
+        for product_id in product_ids:
+            product = serialized.get(product_id)
+            items.append(
+                {
+                    "id": product_id,
+                    "found": product is not None,
+                    "product": orjson.Fragment(product.body) if product is not None else None,
+                }
+            )
+        return dumps({"items": items})
 
     @staticmethod
-    def get_all_products(
-        skip: int = 0, limit: int = 100, name_filter: Optional[str] = None
-    ) -> Tuple[List[Product], int]:
+    def get_products_page(
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        name_filter: Optional[str] = None,
+        include_count: bool = False,
+        skip: int = 0,
+    ) -> Tuple[List[Product], Optional[str], Optional[RowCount]]:
         """
-        Get all products with optional pagination and filtering
+        Get a page of products, newest first, using keyset pagination on (created_at, id).
+
+        Returns the products, the cursor of the next page and, if requested,
+        the total counted with the LISTING_COUNT strategy.
         """
         queryset = Product.objects.all()
 
         if name_filter:
             queryset = queryset.filter(name__icontains=name_filter)
 
-        total = queryset.count()
-        products = queryset.order_by("-created_at")[skip : skip + limit]
+        total = count_rows(queryset) if include_count else None
+        products, next_cursor = paginate_keyset(queryset, PRODUCT_KEYSET, cursor, limit, offset=skip)
+
+        return products, next_cursor, total
+
+    @staticmethod
+    async def aget_products_page(
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        name_filter: Optional[str] = None,
+        include_count: bool = False,
+        skip: int = 0,
+    ) -> Tuple[List[Product], Optional[str], Optional[RowCount]]:
+        """
+        Async version of get_products_page
+        """
+        queryset = Product.objects.all()
+
+        if name_filter:
+            queryset = queryset.filter(name__icontains=name_filter)
+
+        total = await acount_rows(queryset) if include_count else None
+        products, next_cursor = await apaginate_keyset(queryset, PRODUCT_KEYSET, cursor, limit, offset=skip)
+
+        return products, next_cursor, total
+
+    @staticmethod
+    def search_products(
+        query: str, limit: int = 100, skip: int = 0, include_count: bool = False
+    ) -> Tuple[List[Product], Optional[RowCount]]:
+        """
+        Search products by name and description, best matches first
+        """
+        return search_products(query, limit=limit, skip=skip, include_count=include_count)
 
-        return list(products), total
+    @staticmethod
+    def suggest_products(prefix: str, limit: int = 10) -> List[Suggestion]:
+        """
+        Typeahead suggestions from the in-memory name index, most visited first
+        """
+        product_name_index.ensure_built()
+        return product_name_index.suggest(prefix, limit=min(max(limit, 1), settings.PRODUCT_SUGGEST["MAX_LIMIT"]))
+
+    @staticmethod
+    async def asuggest_products(prefix: str, limit: int = 10) -> List[Suggestion]:
+        """
+        Async version of suggest_products.
+
+        Only building the index reads the database, so only that runs in a
+        thread. An index cleared in the meantime returns no suggestions.
+        """
+        if not product_name_index.ready:
+            await sync_to_async(product_name_index.ensure_built)()
+        return product_name_index.suggest(prefix, limit=min(max(limit, 1), settings.PRODUCT_SUGGEST["MAX_LIMIT"]))
+
+    @staticmethod
+    def listing_etag(
+        version: int,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        name_filter: Optional[str] = None,
+        include_count: bool = False,
+        skip: int = 0,
+        query: Optional[str] = None,
+    ) -> str:
+        """
+        ETag of a listing page, known without loading the page
+        """
+        return make_etag(listing_cache_key(version, cursor, limit, name_filter, include_count, skip, query))
+
+    @classmethod
+    async def aget_products_page_json(
+        cls,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        name_filter: Optional[str] = None,
+        include_count: bool = False,
+        skip: int = 0,
+        query: Optional[str] = None,
+        version: Optional[int] = None,
+    ) -> bytes:
+        """
+        Get a rendered ProductList page, cached under the current catalog version.
+
+        With ``query`` the page holds search results ranked by relevance,
+        paginated with ``skip`` instead of a cursor. Pass ``version`` to read
+        the page of the catalog version an ETag was computed for.
+        """
+        if version is None:
+            version = await aget_catalog_version()
+        cache_key = listing_cache_key(version, cursor, limit, name_filter, include_count, skip, query)
+
+        async def load_page() -> bytes:
+            if query:
+                products, total = await asearch_products(query, limit=limit, skip=skip, include_count=include_count)
+                next_cursor = None
+            else:
+                products, next_cursor, total = await cls.aget_products_page(
+                    cursor=cursor, limit=limit, name_filter=name_filter, include_count=include_count, skip=skip
+                )
+            page = ProductList(
+                items=[ProductOut.from_orm(p) for p in products],
+                next_cursor=next_cursor,
+                count=total.value if total else None,
+                count_exact=total.exact if total else None,
+            )
+            return dumps(page.model_dump())
+
+        return await listing_cache.aget_or_load(cache_key, load_page)
 
     @staticmethod
     def create_product(product_data: ProductCreate) -> Product:
@@ -53,6 +297,9 @@ class ProductService:
         """
         product = Product(**product_data.dict())
         product.save()
+        bump_catalog_version()
+        product_name_index.publish_add(product.id, product.name)
+        ProductService.purge_surrogate_keys([CATALOG_SURROGATE_KEY])
         return product
 
     @staticmethod
@@ -70,9 +317,12 @@ class ProductService:
 
             product.save()
 
-            # Invalidate cache
-            cache_key = f"product:{product_id}"
-            cache.delete(cache_key)
+            # Invalidate cache in Redis and in every worker's local tier
+            ProductService.invalidate_product_cache(product_id)
+            bump_catalog_version()
+            if "name" in update_data:
+                product_name_index.publish_add(product.id, product.name)
+            ProductService.purge_surrogate_keys([product_surrogate_key(product_id), CATALOG_SURROGATE_KEY])
 
             return product
         except Product.DoesNotExist:
@@ -87,30 +337,120 @@ class ProductService:
             product = Product.objects.get(id=product_id)
             product.delete()
 
-            # Invalidate cache
-            cache_key = f"product:{product_id}"
-            cache.delete(cache_key)
+            # Invalidate cache in Redis and in every worker's local tier
+            ProductService.invalidate_product_cache(product_id)
+            bump_catalog_version()
+            product_name_index.publish_remove(product_id)
+            ProductService.purge_surrogate_keys([product_surrogate_key(product_id), CATALOG_SURROGATE_KEY])
 
             return True
         except Product.DoesNotExist:
             return False
 
     @staticmethod
-    def get_popular_products(limit: int = 5) -> List[Product]:
+    def bulk_create_products(products_data: List[ProductCreate]) -> List[Product]:
         """
-        Get popular products based on visit counts
-        Uses cache for better performance
+        Create many products in one transaction with batched INSERTs
         """
-        cache_key = f"popular_products:{limit}"
-        cached_products = cache.get(cache_key)
+        products = [Product(**product_data.dict()) for product_data in products_data]
+        with transaction.atomic():
+            Product.objects.bulk_create(products, batch_size=settings.PRODUCT_BULK_BATCH_SIZE)
 
-        if cached_products:
-            return cached_products
+        bump_catalog_version()
+        product_name_index.publish_bulk([(product.id, product.name) for product in products], [])
+        ProductService.purge_surrogate_keys([CATALOG_SURROGATE_KEY])
+        logger.info(f"Bulk created {len(products)} products")
+        return products
 
-        # Convertir QuerySet a lista para forzar la ejecución
-        products = list(Product.objects.all().order_by("-created_at")[:limit])
+    @staticmethod
+    def bulk_update_products(products_data: List[ProductBulkUpdate]) -> Tuple[List[Product], List[UUID]]:
+        """
+        Update many products in one transaction with batched UPDATEs.
 
-        # Cache popular products
-        cache.set(cache_key, products, timeout=settings.PRODUCT_CACHE_TIMEOUT)
+        Returns the updated products and the ids that do not exist.
+        """
+        updates = {
+            product_data.id: product_data.dict(exclude_unset=True, exclude={"id"}) for product_data in products_data
+        }
+        now = timezone.now()
+        with transaction.atomic():
+            products = Product.objects.select_for_update().in_bulk(list(updates))
+            fields = {"updated_at"}
+            for product_id, product in products.items():
+                for key, value in updates[product_id].items():
+                    setattr(product, key, value)
+                    fields.add(key)
+                # bulk_update does not apply auto_now
+                product.updated_at = now
+            Product.objects.bulk_update(
+                list(products.values()), sorted(fields), batch_size=settings.PRODUCT_BULK_BATCH_SIZE
+            )
 
-        return products
+        updated = list(products.values())
+        ProductService.invalidate_product_caches([product.id for product in updated])
+        bump_catalog_version()
+        renamed = [(product.id, product.name) for product in updated if "name" in updates[product.id]]
+        product_name_index.publish_bulk(renamed, [])
+        ProductService.purge_surrogate_keys(
+            [product_surrogate_key(product.id) for product in updated] + [CATALOG_SURROGATE_KEY]
+        )
+        logger.info(f"Bulk updated {len(updated)} products")
+        return updated, [product_id for product_id in updates if product_id not in products]
+
+    @staticmethod
+    def bulk_delete_products(product_ids: List[UUID]) -> Tuple[List[UUID], List[UUID]]:
+        """
+        Delete many products in one transaction.
+
+        Returns the deleted ids and the ids that do not exist.
+        """
+        with transaction.atomic():
+            existing = set(Product.objects.filter(id__in=product_ids).values_list("id", flat=True))
+            Product.objects.filter(id__in=existing).delete()
+
+        deleted = [product_id for product_id in dict.fromkeys(product_ids) if product_id in existing]
+        ProductService.invalidate_product_caches(deleted)
+        bump_catalog_version()
+        product_name_index.publish_bulk([], deleted)
+        ProductService.purge_surrogate_keys(
+            [product_surrogate_key(product_id) for product_id in deleted] + [CATALOG_SURROGATE_KEY]
+        )
+        logger.info(f"Bulk deleted {len(deleted)} products")
+        return deleted, [product_id for product_id in dict.fromkeys(product_ids) if product_id not in existing]
+
+    @staticmethod
+    def invalidate_product_caches(product_ids: List[UUID]) -> None:
+        """
+        Invalidate many products in one pass
+        """
+        keys = [product_cache_key(product_id) for product_id in product_ids]
+        keys += [product_json_cache_key(product_id) for product_id in product_ids]
+        product_cache.delete_many(keys)
+
+    @staticmethod
+    def invalidate_product_cache(product_id: UUID) -> None:
+        product_cache.delete(product_cache_key(product_id))
+        product_cache.delete(product_json_cache_key(product_id))
+
+    @staticmethod
+    def purge_surrogate_keys(surrogate_keys: List[str]) -> None:
+        """
+        Announce the CDN surrogate keys made stale by a write
+        """
+        logger.info(f"Purging surrogate keys: {' '.join(surrogate_keys)}")
+        surrogate_keys_purged.send(sender=ProductService, surrogate_keys=surrogate_keys)
+
+    @staticmethod
+    def get_popular_products_json(limit: int = 5) -> bytes:
+        """
+        Get the rendered JSON list of popular products, cached as bytes
+        """
+        return product_cache.get_or_load(
+            popular_products_json_cache_key(get_catalog_version(), limit),
+            lambda: dumps([ProductOut.from_orm(p).model_dump() for p in ProductService._load_popular_products(limit)]),
+        )
+
+    @staticmethod
+    def _load_popular_products(limit: int) -> List[Product]:
+        # Convertir QuerySet a lista para forzar la ejecución
+        return list(Product.objects.all().order_by("-created_at")[:limit])
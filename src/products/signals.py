@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by ProductService after a write with ``surrogate_keys``, the CDN keys whose
+# cached responses are now stale. Connect a receiver to purge them at the CDN.
+surrogate_keys_purged = Signal()
@@ -0,0 +1,296 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.cache import MISSING, LocalCache
+from core.redis import get_pubsub, get_redis
+from products.models import Product
+from visits.leaderboard import popularity_leaderboard
+
+logger = logging.getLogger("products")
+
+Suggestion = Tuple[UUID, str]
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lowercase, strip accents and collapse whitespace, so "Café  Olé" matches "cafe ole"
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.lower().split())
+
+
+class ProductNameIndex:
+    """
+    In-memory typeahead index over normalized product names.
+
+    Every word start of a name is kept in a sorted array, so a prefix is
+    answered by bisecting to the first match and scanning the matching run.
+    Matches are ranked by the visit counts of the popularity leaderboard,
+    refreshed in the background, and results are memoized until the index or
+    the popularity snapshot changes.
+
+    The index is built once per worker and kept current by ProductService,
+    which applies each change locally and publishes it on a Redis channel
+    for the other workers.
+    """
+
+    CHANNEL = "products:suggest"
+
+    def __init__(self, popularity_refresh: float, popularity_size: int, memo_size: int = 1000) -> None:
+        self.popularity_refresh = popularity_refresh
+        self.popularity_size = popularity_size
+        self._entries: List[Tuple[str, UUID]] = []
+        self._names: Dict[UUID, Tuple[str, str]] = {}
+        self._popularity: Dict[UUID, int] = {}
+        self._memo = LocalCache(memo_size, popularity_refresh)
+        self._ready = False
+        self._lock = threading.RLock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @staticmethod
+    def _keys(normalized: str) -> List[str]:
+        # One key per word start: "red running shoes", "running shoes", "shoes"
+        words = normalized.split(" ")
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def build(self, products: Iterable[Suggestion]) -> None:
+        names = {product_id: (normalize_name(name), name) for product_id, name in products}
+        entries = sorted(
+            (key, product_id) for product_id, (normalized, _) in names.items() for key in self._keys(normalized)
+        )
+        with self._lock:
+            self._names, self._entries = names, entries
+            self._memo.clear()
+            self._ready = True
+
+    def ensure_built(self) -> None:
+        """
+        Load every product name from the database, once per worker
+        """
+        self._ensure_listener()
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            started = time.monotonic()
+            self.build(Product.objects.values_list("id", "name").iterator())
+            logger.info(f"Built product suggest index ({len(self)} products) in {time.monotonic() - started:.2f}s")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries, self._names = [], {}
+            self._memo.clear()
+            self._ready = False
+
+    def add(self, product_id: UUID, name: str) -> None:
+        """
+        Insert or rename a product
+        """
+        with self._lock:
+            if not self._ready:
+                return
+            self._remove(product_id)
+            normalized = normalize_name(name)
+            self._names[product_id] = (normalized, name)
+            for key in self._keys(normalized):
+                bisect.insort(self._entries, (key, product_id))
+            self._memo.clear()
+
+    def remove(self, product_id: UUID) -> None:
+        with self._lock:
+            if self._ready and self._remove(product_id):
+                self._memo.clear()
+
+    def _remove(self, product_id: UUID) -> bool:
+        current = self._names.pop(product_id, None)
+        if current is None:
+            return False
+        for key in self._keys(current[0]):
+            position = bisect.bisect_left(self._entries, (key, product_id))
+            if position < len(self._entries) and self._entries[position] == (key, product_id):
+                del self._entries[position]
+        return True
+
+    def set_popularity(self, scores: Dict[UUID, int]) -> None:
+        with self._lock:
+            self._popularity = scores
+            self._memo.clear()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """
+        Names starting with ``prefix`` at any word, most visited first
+        """
+        normalized = normalize_name(prefix)
+        if not normalized:
+            return []
+
+        memo_key = f"{limit}:{normalized}"
+        cached = self._memo.get(memo_key)
+        if cached is not MISSING:
+            return cached
+
+        with self._lock:
+            matches = set()
+            position = bisect.bisect_left(self._entries, (normalized,))
+            while position < len(self._entries) and self._entries[position][0].startswith(normalized):
+                matches.add(self._entries[position][1])
+                position += 1
+
+            popularity = self._popularity
+            best = heapq.nsmallest(
+                limit, matches, key=lambda product_id: (-popularity.get(product_id, 0), self._names[product_id][0])
+            )
+            suggestions = [(product_id, self._names[product_id][1]) for product_id in best]
+            self._memo.set(memo_key, suggestions)
+            return suggestions
+
+    def publish_add(self, product_id: UUID, name: str) -> None:
+        self.add(product_id, name)
+        self._publish({"op": "add", "id": str(product_id), "name": name})
+
+    def publish_remove(self, product_id: UUID) -> None:
+        self.remove(product_id)
+        self._publish({"op": "remove", "id": str(product_id)})
+
+    def apply_bulk(self, added: List[Suggestion], removed: List[UUID]) -> None:
+        """
+        Insert, rename and remove many products with a single re-sort
+        """
+        with self._lock:
+            if not self._ready:
+                return
+            stale = {product_id for product_id in removed if product_id in self._names}
+            stale.update(product_id for product_id, _ in added if product_id in self._names)
+            entries = [entry for entry in self._entries if entry[1] not in stale] if stale else self._entries
+            for product_id in removed:
+                self._names.pop(product_id, None)
+            for product_id, name in added:
+                normalized = normalize_name(name)
+                self._names[product_id] = (normalized, name)
+                entries.extend((key, product_id) for key in self._keys(normalized))
+            entries.sort()
+            self._entries = entries
+            self._memo.clear()
+
+    def publish_bulk(self, added: List[Suggestion], removed: List[UUID], chunk_size: int = 1000) -> None:
+        """
+        Apply many changes locally and publish them with one message per chunk
+        """
+        self.apply_bulk(added, removed)
+        for start in range(0, max(len(added), len(removed)), chunk_size):
+            self._publish(
+                {
+                    "op": "bulk",
+                    "add": [[str(product_id), name] for product_id, name in added[start : start + chunk_size]],
+                    "remove": [str(product_id) for product_id in removed[start : start + chunk_size]],
+                }
+            )
+
+    def _publish(self, message: Dict[str, Any]) -> None:
+        try:
+            get_redis().publish(self.CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Error publishing product suggest update: {str(e)}")
+
+    def _apply(self, message: Dict[str, Any]) -> None:
+        if message["op"] == "add":
+            self.add(UUID(message["id"]), message["name"])
+        elif message["op"] == "remove":
+            self.remove(UUID(message["id"]))
+        elif message["op"] == "bulk":
+            self.apply_bulk(
+                [(UUID(product_id), name) for product_id, name in message["add"]],
+                [UUID(product_id) for product_id in message["remove"]],
+            )
+
+    def refresh_popularity(self) -> None:
+        """
+        Snapshot visit counts of the most popular products from the leaderboard
+        """
+        today = timezone.localdate()
+        start_day = today - timedelta(days=popularity_leaderboard.WINDOW_DAYS - 1)
+        self.set_popularity(dict(popularity_leaderboard.top(start_day, today, self.popularity_size)))
+
+    def _ensure_listener(self) -> None:
+        # Threads do not survive a fork, so pre-forking servers start one listener per worker
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listener = threading.Thread(target=self._listen, name="product-suggest-updates", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        retry_delay = 1.0
+        refreshed_at = 0.0
+        while True:
+            try:
+                pubsub = get_pubsub()
+                pubsub.subscribe(self.CHANNEL)
+                retry_delay = 1.0
+                while True:
+                    if time.monotonic() - refreshed_at >= self.popularity_refresh:
+                        refreshed_at = time.monotonic()
+                        self._refresh_popularity_safely()
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._apply(json.loads(message["data"]))
+            except Exception as e:
+                logger.error(f"Product suggest listener disconnected: {str(e)}")
+                # Updates may be missed while disconnected, so rebuild on next use
+                self.clear()
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30.0)
+
+    def _refresh_popularity_safely(self) -> None:
+        try:
+            self.refresh_popularity()
+        except Exception as e:
+            logger.error(f"Error refreshing product suggest popularity: {str(e)}")
+
+
+product_name_index = ProductNameIndex(
+    popularity_refresh=settings.PRODUCT_SUGGEST["POPULARITY_REFRESH"],
+    popularity_size=settings.PRODUCT_SUGGEST["POPULARITY_SIZE"],
+)
+
+
+def warm_product_name_index() -> None:
+    """
+    Build the suggest index in the background when the server starts
+    """
+
+    def build() -> None:
+        try:
+            product_name_index.ensure_built()
+        except Exception as e:
+            logger.error(f"Error building product suggest index: {str(e)}")
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=build, name="product-suggest-warmup", daemon=True).start()
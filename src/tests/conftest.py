@@ -5,9 +5,33 @@ import pytest
 from django.conf import settings
 
 from auth.models import User
+from auth.token_cache import verified_tokens
+from core.cache import clear_local_caches
+from core.ratelimit import RateLimiter, local_rate_filter
+from core.redis import get_redis
 from products.models import Product
 
 
+@pytest.fixture(autouse=True)
+def clear_local_cache_tiers():
+    """Local cache tiers outlive the test database transaction"""
+    clear_local_caches()
+    verified_tokens.clear()
+    yield
+    clear_local_caches()
+    verified_tokens.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Every test client request comes from 127.0.0.1 and counts against the same budgets"""
+    redis_client = get_redis()
+    keys = list(redis_client.scan_iter(f"{RateLimiter.KEY_PREFIX}:*"))
+    if keys:
+        redis_client.delete(*keys)
+    local_rate_filter.clear()
+
+
 @pytest.fixture
 def admin_user():
     user = User(
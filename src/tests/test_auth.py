@@ -1,9 +1,24 @@
+import asyncio
+import time
+from uuid import uuid4
+
 import pytest
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.hashers import check_password
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncClient, RequestFactory
+from django_redis import get_redis_connection
 
+from auth.dependencies import get_admin_auth, get_user_auth
+from auth.jwt import JWTHandler, get_jwt_handler
 from auth.models import User
-from auth.schemas import UserCreate
+from auth.schemas import TokenPayload, UserCreate
 from auth.service import AuthService
+from auth.token_cache import verified_tokens
+from core.ratelimit import LocalRateFilter, RateLimiter, RatePolicy, parse_rate, rate_limiter
+from core.redis import get_redis
 
 
 @pytest.mark.django_db
@@ -75,3 +90,285 @@ class TestAuthService:
 
         # Assert
         assert user is None
+
+
+class TestRedisRegistry:
+    def test_auth_shares_bounded_clients_without_pinging(self, monkeypatch):
+        # Setup
+        def unexpected_ping(*args, **kwargs):
+            raise AssertionError("Clients should connect lazily")
+
+        monkeypatch.setattr(redis.Redis, "ping", unexpected_ping)
+
+        # Execute
+        handler = JWTHandler()
+        text_pool = get_redis(decode_responses=True).connection_pool
+        cache_pool = get_redis().connection_pool
+
+        # Assert - one client and one pool per process, shared by every caller
+        assert handler.redis_client is get_redis(decode_responses=True)
+        assert get_admin_auth() is get_admin_auth()
+        assert get_user_auth() is get_user_auth()
+        assert get_admin_auth().jwt_handler is get_jwt_handler()
+        for pool in (text_pool, cache_pool):
+            assert isinstance(pool, redis.BlockingConnectionPool)
+            assert pool.max_connections == settings.REDIS_POOL["MAX_CONNECTIONS"]
+            assert pool.connection_kwargs["socket_timeout"] == settings.REDIS_POOL["SOCKET_TIMEOUT"]
+            assert pool.connection_kwargs["socket_connect_timeout"] == settings.REDIS_POOL["SOCKET_CONNECT_TIMEOUT"]
+        assert cache_pool is get_redis_connection("default").connection_pool
+
+
+class TestVerifiedTokenCache:
+    def test_repeat_verification_skips_redis_until_revoked(self, settings, monkeypatch):
+        # Setup
+        settings.STRICT_TOKEN_VALIDATION = True
+        handler = get_jwt_handler()
+        user_id = uuid4()
+        token = handler.create_access_token(user_id=user_id, is_admin=True)
+        lookups = []
+        exists = handler.redis_client.exists
+        monkeypatch.setattr(handler.redis_client, "exists", lambda key: lookups.append(key) or exists(key))
+
+        # Execute
+        first = handler.verify_token(token)
+        second = handler.verify_token(token)
+        handler.invalidate_tokens(user_id)
+        after_logout = handler.verify_token(token)
+
+        # Assert
+        assert first.sub == second.sub == str(user_id)
+        assert lookups == [f"token:{user_id}", f"token:{user_id}"]  # second call served from memory
+        assert after_logout is None
+
+    def test_entries_bounded_by_revocation_and_expiry(self):
+        # Setup
+        user_id = str(uuid4())
+        verified_at = time.monotonic()
+        live = TokenPayload(sub=user_id, exp=time.time() + 600, iat=time.time(), is_admin=False)
+        expired = TokenPayload(sub=str(uuid4()), exp=time.time() - 1, iat=time.time() - 60, is_admin=False)
+
+        # Execute - a revocation lands while the token is being verified
+        verified_tokens.revoke(user_id)
+        verified_tokens.add("raced-token", live, verified_at)
+        verified_tokens.add("expired-token", expired, time.monotonic())
+        verified_tokens.add("fresh-token", live, time.monotonic())
+
+        # Assert
+        assert verified_tokens.get("raced-token") is None
+        assert verified_tokens.get("expired-token") is None
+        assert verified_tokens.get("fresh-token") == live
+
+
+@pytest.mark.django_db
+class TestAuthenticatedUser:
+    def test_admin_check_served_from_cached_projection(
+        self, admin_user, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        # Setup
+        token = get_jwt_handler().create_access_token(user_id=admin_user.id, is_admin=True)
+        request = RequestFactory().get("/api/products/")
+        auth = get_admin_auth()
+        auth.authenticate(request, token)  # warms the user cache
+
+        # Execute
+        with django_assert_num_queries(0):
+            user = auth.authenticate(request, token)
+        with django_assert_num_queries(1):
+            created_at = user.created_at  # the full model loads on demand
+
+        admin_user.is_admin = False
+        with django_capture_on_commit_callbacks() as callbacks:
+            admin_user.save()
+        still_cached = auth.authenticate(RequestFactory().get("/api/products/"), token)  # until the commit
+        for callback in callbacks:
+            callback()
+        demoted = auth.authenticate(request, token)
+
+        # Assert
+        assert user.id == admin_user.id
+        assert user.is_admin is True
+        assert created_at == admin_user.created_at
+        assert request.user is user
+        assert still_cached is not None
+        assert demoted is None
+        assert get_user_auth().authenticate(request, token).is_admin is False
+
+
+@pytest.mark.django_db
+class TestRateLimit:
+    def test_login_policy_rejects_burst_with_retry_after(self, client):
+        # Setup
+        credentials = {"email": "nobody@example.com", "password": "wrongpassword"}
+        limit = parse_rate("LOGIN", settings.RATE_LIMIT["LOGIN"]).limit
+
+        # Execute
+        statuses = [
+            client.post("/api/auth/login", credentials, content_type="application/json").status_code
+            for _ in range(limit)
+        ]
+        throttled = client.post("/api/auth/login", credentials, content_type="application/json")
+
+        # Assert
+        assert statuses == [401] * limit
+        assert throttled.status_code == 429
+        assert int(throttled["Retry-After"]) >= 1
+
+    def test_spoofed_forwarded_for_shares_one_bucket(self, client):
+        # Setup
+        credentials = {"email": "nobody@example.com", "password": "wrongpassword"}
+        limit = parse_rate("LOGIN", settings.RATE_LIMIT["LOGIN"]).limit
+
+        # Execute - every attempt claims to come from another client
+        statuses = [
+            client.post(
+                "/api/auth/login", credentials, content_type="application/json", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}"
+            ).status_code
+            for i in range(limit + 5)
+        ]
+
+        # Assert - all of them are counted against REMOTE_ADDR
+        assert statuses == [401] * limit + [429] * 5
+
+    def test_reads_and_suggest_have_their_own_budgets(self, client, sample_product):
+        # Setup
+        writes = parse_rate("DEFAULT", settings.RATE_LIMIT["DEFAULT"]).limit
+
+        # Execute - more reads than the write budget allows
+        suggest = [client.get("/api/products/suggest", {"prefix": "te"}).status_code for _ in range(writes + 1)]
+        details = [client.get(f"/api/products/{sample_product.id}").status_code for _ in range(writes + 1)]
+
+        # Assert
+        assert set(suggest) == {200}
+        assert set(details) == {200}
+
+    def test_gcra_single_key_expires_on_its_own(self):
+        # Setup
+        policy = RatePolicy("TEST", limit=2, period=60)
+        identity = "route:10.0.0.1"
+
+        # Execute
+        results = [rate_limiter.hit(policy, identity) for _ in range(3)]
+        keys = list(get_redis().scan_iter(f"{RateLimiter.KEY_PREFIX}:TEST:*"))
+
+        # Assert
+        assert [result.allowed for result in results] == [True, True, False]
+        assert [result.remaining for result in results[:2]] == [1, 0]
+        assert 0 < results[2].retry_after <= 30
+        assert len(keys) == 1
+        assert 0 < get_redis().pttl(keys[0]) <= 60000
+        with pytest.raises(ImproperlyConfigured):
+            parse_rate("BROKEN", "10/fortnight")
+
+    def test_local_filter_leases_batches_and_sheds_floods(self):
+        # Setup
+        class CountingLimiter(RateLimiter):
+            def __init__(self):
+                super().__init__()
+                self.costs = []
+
+            def hit(self, policy, identity, cost=1, refund=0):
+                self.costs.append(cost)
+                return super().hit(policy, identity, cost, refund)
+
+        policy = RatePolicy("LOCAL", limit=40, period=3600)
+        worker_a = LocalRateFilter(CountingLimiter(), max_size=2, lease_size=10, lease_ttl=60)
+        worker_b = LocalRateFilter(CountingLimiter(), max_size=2, lease_size=10, lease_ttl=60)
+
+        # Execute - one client floods worker A, then worker B
+        flood_a = [worker_a.hit(policy, "10.0.0.2") for _ in range(60)]
+        flood_b = [worker_b.hit(policy, "10.0.0.2") for _ in range(20)]
+        for ip in ("10.0.0.3", "10.0.0.4"):
+            worker_a.hit(policy, ip)
+
+        # Assert - the budget holds across workers
+        assert sum(result.allowed for result in flood_a) == 40
+        assert not any(result.allowed for result in flood_b)
+        # Leases start once the burst shows and shrink to single requests near the limit
+        flood_costs = worker_a.limiter.costs[:-2]  # the last two are the other clients
+        assert flood_costs[0] == 1 and max(flood_costs) > 1 and flood_costs[-1] == 1
+        assert sum(flood_costs) == 40
+        assert len(flood_costs) < 30
+        assert len(worker_b.limiter.costs) == 1  # blocked locally after the first rejection
+        assert all(result.retry_after > 0 for result in flood_a[40:] + flood_b)
+        assert len(worker_a) == 2
+
+    def test_local_filter_grants_whole_budget_over_time_and_workers(self):
+        # Setup
+        policy = RatePolicy("SPREAD", limit=100, period=3600)
+        # A zero lease TTL expires every lease before the next request, like requests minutes apart
+        slow_worker = LocalRateFilter(rate_limiter, max_size=10, lease_size=10, lease_ttl=0)
+        workers = [LocalRateFilter(rate_limiter, max_size=10, lease_size=10, lease_ttl=60) for _ in range(4)]
+
+        # Execute
+        over_time = [slow_worker.hit(policy, "10.0.0.5") for _ in range(150)]
+        round_robin = [workers[i % len(workers)].hit(policy, "10.0.0.6") for i in range(200)]
+
+        # Assert - unused leases are given back, so both clients get exactly the policy
+        assert sum(result.allowed for result in over_time) == 100
+        assert sum(result.allowed for result in round_robin) == 100
+
+    def test_header_rotation_keeps_redis_calls_per_client_flat(self, client, monkeypatch):
+        # Setup
+        class CountingLimiter(RateLimiter):
+            def __init__(self):
+                super().__init__()
+                self.calls = 0
+
+            def hit(self, policy, identity, cost=1, refund=0):
+                self.calls += 1
+                return super().hit(policy, identity, cost, refund)
+
+        limiter = CountingLimiter()
+        worker = LocalRateFilter(limiter, max_size=100, lease_size=10, lease_ttl=60)
+        monkeypatch.setattr("core.ratelimit.local_rate_filter", worker)
+        credentials = {"email": "nobody@example.com", "password": "wrongpassword"}
+        limit = parse_rate("LOGIN", settings.RATE_LIMIT["LOGIN"]).limit
+
+        # Execute - 50 attempts, each with a new X-Forwarded-For
+        statuses = [
+            client.post(
+                "/api/auth/login", credentials, content_type="application/json", HTTP_X_FORWARDED_FOR=f"198.51.100.{i}"
+            ).status_code
+            for i in range(50)
+        ]
+
+        # Assert - one bucket, and Redis stops being asked once the client is blocked
+        assert statuses.count(401) == limit
+        assert len(worker) == 1
+        assert limiter.calls <= limit + 1
+
+    def test_async_operations_never_wait_for_redis(self, sample_product, monkeypatch, caplog):
+        # Setup
+        class AsyncOnlyLimiter(RateLimiter):
+            def __init__(self):
+                super().__init__()
+                self.async_calls = 0
+
+            def hit(self, policy, identity, cost=1, refund=0):
+                raise AssertionError("blocking Redis call on the event loop")
+
+            async def ahit(self, policy, identity, cost=1, refund=0):
+                self.async_calls += 1
+                return await super().ahit(policy, identity, cost, refund)
+
+        limiter = AsyncOnlyLimiter()
+        policy = RatePolicy("ASYNC", limit=10, period=3600)
+        worker = LocalRateFilter(limiter, max_size=10, lease_size=5, lease_ttl=60)
+        monkeypatch.setattr("core.ratelimit.local_rate_filter", worker)
+
+        async def flood():
+            results = []
+            for _ in range(30):
+                results.append(worker.hit_nowait(policy, "10.0.0.7"))
+                await asyncio.sleep(0.005)  # lets the background checks answer
+            return results
+
+        # Execute
+        results = async_to_sync(flood)()
+        response = async_to_sync(AsyncClient().get)(f"/api/products/{sample_product.id}")
+
+        # Assert - Redis answers apply to the next requests, so at most one extra request gets through
+        assert 10 <= sum(result.allowed for result in results) <= 11
+        assert 0 < limiter.async_calls < 30
+        assert response.status_code == 200
+        assert "blocking Redis call" not in caplog.text
@@ -1,12 +1,32 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from uuid import uuid4
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.core.cache import cache
-
+from django.db import connection
+from django.utils import timezone
+from django_redis import get_redis_connection
+from ninja.renderers import JSONRenderer
+
+from auth.jwt import JWTHandler
+from core.cache import MISSING, LocalCache, TwoTierCache, get_cache_stats
+from core.pagination import InvalidCursor, count_rows, estimate_count
+from core.renderers import ORJSONRenderer
+from products.cache import get_catalog_version, product_cache, product_cache_key, product_json_cache_key
 from products.models import Product
-from products.schemas import ProductCreate, ProductUpdate
+from products.schemas import ProductBulkUpdate, ProductCreate, ProductOut, ProductUpdate
+from products.search import InMemorySearchIndex, memory_search_index
 from products.service import ProductService
+from products.signals import surrogate_keys_purged
+from products.suggest import ProductNameIndex, product_name_index
+from visits.leaderboard import popularity_leaderboard
 
 
 @pytest.mark.django_db
@@ -41,6 +61,17 @@ class TestProductService:
         assert product.id == product_id
         assert product.name == sample_product.name
 
+    def test_get_product_by_id_ignores_pre_versioned_cache_entries(self, sample_product):
+        # Setup - raw Product pickled under the key used before values were wrapped in CacheEntry
+        cache.set(f"product:{sample_product.id}", sample_product)
+
+        # Execute
+        product = ProductService().get_product_by_id(sample_product.id)
+
+        # Assert
+        assert product.id == sample_product.id
+        assert product_cache_key(sample_product.id) != f"product:{sample_product.id}"
+
     def test_get_product_by_id_nonexistent(self):
         # Setup
         service = ProductService()
@@ -105,39 +136,39 @@ class TestProductService:
         # Assert
         assert success is False
 
-    def test_get_all_products(self, sample_products):
+    def test_get_products_page_counts_total(self, sample_products):
         # Setup
         service = ProductService()
 
         # Execute
-        products, total = service.get_all_products()
+        products, _, total = service.get_products_page(include_count=True)
 
         # Assert
         assert len(products) == 5
-        assert total == 5
+        assert total.value == 5
 
-    def test_get_all_products_with_name_filter(self, sample_products):
+    def test_get_products_page_with_name_filter(self, sample_products):
         # Setup
         service = ProductService()
 
         # Execute - should match "Test Product 1"
-        products, total = service.get_all_products(name_filter="Product 1")
+        products, _, total = service.get_products_page(name_filter="Product 1", include_count=True)
 
         # Assert
         assert len(products) == 1
-        assert total == 1
+        assert total.value == 1
         assert products[0].name == "Test Product 1"
 
-    def test_get_all_products_with_pagination(self, sample_products):
+    def test_get_products_page_with_offset(self, sample_products):
         # Setup
         service = ProductService()
 
         # Execute
-        products, total = service.get_all_products(skip=2, limit=2)
+        products, _, total = service.get_products_page(skip=2, limit=2, include_count=True)
 
         # Assert
         assert len(products) == 2
-        assert total == 5  # Total should still be 5, despite pagination
+        assert total.value == 5  # Total should still be 5, despite pagination
 
     def test_product_cache(self, sample_product, monkeypatch):
         # Setup
@@ -173,6 +204,483 @@ class TestProductService:
         assert first_query_count == 1  # First call should hit database
         assert second_query_count == 1  # Second call should use cache (no new queries)
 
+    def test_async_get_product_shares_cache(self, sample_product):
+        # Setup
+        service = ProductService()
+        cache.clear()
+
+        # Execute - the async read populates the cache entry used by the sync path
+        product = async_to_sync(service.aget_product_by_id)(sample_product.id)
+        Product.objects.filter(id=sample_product.id).update(name="Renamed Outside Service")
+        cached = service.get_product_by_id(sample_product.id)
+        missing = async_to_sync(service.aget_product_by_id)(uuid4())
+
+        # Assert
+        assert product.id == sample_product.id
+        assert cached.name == sample_product.name
+        assert missing is None
+
+    def test_get_products_page_with_cursor(self, sample_products):
+        # Setup - two products share a created_at, so the id breaks the tie
+        service = ProductService()
+        Product.objects.filter(id=sample_products[1].id).update(created_at=sample_products[2].created_at)
+        expected = [p.id for p in Product.objects.order_by("-created_at", "-id")]
+
+        # Execute - walk every page
+        seen = []
+        cursor = None
+        while True:
+            products, cursor, total = service.get_products_page(cursor=cursor, limit=2)
+            seen.extend(p.id for p in products)
+            if cursor is None:
+                break
+
+        # Assert
+        assert seen == expected
+        assert total is None
+
+    def test_async_get_products_page(self, sample_products):
+        # Setup
+        service = ProductService()
+        _, cursor, _ = service.get_products_page(limit=1, name_filter="Product")
+
+        # Execute
+        products, next_cursor, total = async_to_sync(service.aget_products_page)(
+            cursor=cursor, limit=2, name_filter="Product", include_count=True
+        )
+
+        # Assert
+        assert [p.id for p in products] == [p.id for p in service.get_products_page(skip=1, limit=2)[0]]
+        assert next_cursor is not None
+        assert total == (5, True)  # Small enough to count exactly
+
+    def test_count_rows_strategies(self, sample_products, settings):
+        # Setup
+        queryset = Product.objects.filter(name__startswith="Test")
+        cache.delete_pattern("listing_count:*")
+
+        # Execute
+        exact = count_rows(queryset, "exact")
+        cached = count_rows(queryset, "cached")
+        Product.objects.create(name="Test Extra", price=Decimal("1.00"))
+        still_cached = count_rows(queryset, "cached")
+        small_estimate = count_rows(queryset, "estimated")
+
+        # Assert
+        assert exact == (5, True)
+        assert cached == (5, False)
+        assert still_cached == (5, False)  # Until the cached count expires
+        assert small_estimate == (6, True)  # Below the threshold the exact count is cheap
+        with pytest.raises(ValueError):
+            count_rows(queryset, "guess")
+
+    @pytest.mark.skipif(connection.vendor == "postgresql", reason="Planner estimates are PostgreSQL only")
+    def test_estimated_count_is_exact_without_planner(self, sample_products, settings):
+        # Setup
+        settings.LISTING_COUNT = {**settings.LISTING_COUNT, "EXACT_THRESHOLD": 0}
+
+        # Execute
+        estimated = count_rows(Product.objects.filter(name__startswith="Test"), "estimated")
+
+        # Assert
+        assert estimated == (5, True)
+        assert estimate_count(Product.objects.all()) == 5
+
+    @pytest.mark.skipif(connection.vendor != "postgresql", reason="Planner estimates require PostgreSQL")
+    def test_estimated_count_uses_planner(self, sample_products, settings):
+        # Setup
+        settings.LISTING_COUNT = {**settings.LISTING_COUNT, "EXACT_THRESHOLD": 0}
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Product._meta.db_table}")
+
+        # Execute
+        estimated = count_rows(Product.objects.filter(name__startswith="Test"), "estimated")
+        whole_table = estimate_count(Product.objects.all())
+
+        # Assert
+        assert estimated.exact is False
+        assert 1 <= estimated.value <= 5
+        assert whole_table == 5  # reltuples is exact right after ANALYZE of a small table
+
+    def test_list_products_endpoint_cursor(self, sample_products, client):
+        # Execute
+        first = client.get("/api/products/", {"limit": 3}).json()
+        second = client.get("/api/products/", {"limit": 3, "cursor": first["next_cursor"]}).json()
+        invalid = client.get("/api/products/", {"cursor": "bogus"})
+
+        # Assert
+        assert len(first["items"]) == 3
+        assert first["count"] is None
+        assert len(second["items"]) == 2
+        assert second["next_cursor"] is None
+        assert invalid.status_code == 400
+
+    def test_listing_cache_is_invalidated_by_catalog_version(self, sample_products, client, monkeypatch):
+        # Setup
+        service = ProductService()
+        first = client.get("/api/products/", {"limit": 2, "name": "Test"})
+        version = get_catalog_version()
+
+        async def unexpected_query(*args, **kwargs):
+            raise AssertionError("Cached listing should not query the database")
+
+        monkeypatch.setattr(ProductService, "aget_products_page", unexpected_query)
+
+        # Execute - the same page is served from the listing cache
+        second = client.get("/api/products/", {"limit": 2, "name": "Test"})
+        monkeypatch.undo()
+        created = service.create_product(ProductCreate(name="Test Newest", price=Decimal("5.00"), stock=1))
+        third = client.get("/api/products/", {"limit": 2, "name": "Test"})
+
+        # Assert
+        assert second.content == first.content
+        assert get_catalog_version() == version + 1
+        assert third.json()["items"][0]["id"] == str(created.id)
+        assert get_cache_stats()["product_listings"]["hit_ratio"] > 0
+
+    @pytest.mark.parametrize(
+        "backend",
+        [
+            pytest.param(
+                "postgres",
+                marks=pytest.mark.skipif(
+                    connection.vendor != "postgresql", reason="Full-text search requires PostgreSQL"
+                ),
+            ),
+            "memory",
+        ],
+    )
+    def test_search_products(self, backend, settings):
+        # Setup
+        settings.PRODUCT_SEARCH_BACKEND = backend
+        memory_search_index.build([])
+        memory_search_index._version = None
+        shoes = Product.objects.create(name="Red Running Shoes", description="Light trainers", price=Decimal("80.00"))
+        Product.objects.create(name="Blue Shoes", description="Leather", price=Decimal("60.00"))
+        hat = Product.objects.create(name="Red Hat", description="Warm wool hat", price=Decimal("15.00"))
+        lamp = Product.objects.create(name="Desk Light", description="LED lamp", price=Decimal("25.00"))
+        service = ProductService()
+
+        # Execute
+        prefix_results, total = service.search_products("red sho", include_count=True)
+        description_results, _ = service.search_products("wool")
+        ranked_results, _ = service.search_products("light")
+        empty_results, empty_total = service.search_products("?!", include_count=True)
+
+        # Assert - every token must match a word prefix
+        assert [p.id for p in prefix_results] == [shoes.id]
+        assert total == (1, True)
+        assert [p.id for p in description_results] == [hat.id]
+        # A match in the name ranks above a match in the description
+        assert [p.id for p in ranked_results] == [lamp.id, shoes.id]
+        assert empty_results == [] and empty_total == (0, True)
+
+    def test_memory_search_index_ranks_name_matches_first(self):
+        # Setup
+        index = InMemorySearchIndex()
+        first, second, third = uuid4(), uuid4(), uuid4()
+        now = timezone.now()
+        index.build(
+            [
+                (first, "Desk", "Lamp for the desk", now),
+                (second, "Desk Lamp", None, now),
+                (third, "Chair", "Office chair", now),
+            ]
+        )
+
+        # Execute & Assert
+        assert index.search(["lamp"]) == [second, first]
+        assert index.search(["de", "la"]) == [second, first]
+        assert index.search(["desk", "chair"]) == []
+        assert index.search(["sofa"]) == []
+
+    def test_list_products_search_endpoint(self, sample_products, client):
+        # Setup
+        ProductService().create_product(
+            ProductCreate(name="Walnut Bookshelf", description="Solid wood", price=Decimal("120.00"), stock=3)
+        )
+
+        # Execute
+        response = client.get("/api/products/", {"q": "walnut", "include_count": True})
+        no_match = client.get("/api/products/", {"q": "walnutx"})
+
+        # Assert
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["name"] for item in data["items"]] == ["Walnut Bookshelf"]
+        assert data["next_cursor"] is None
+        assert (data["count"], data["count_exact"]) == (1, True)
+        assert no_match.json()["items"] == []
+
+    def test_product_name_index_suggest(self):
+        # Setup
+        index = ProductNameIndex(popularity_refresh=60, popularity_size=100)
+        cafe, cap, shoes = uuid4(), uuid4(), uuid4()
+        index.build([(cafe, "Café Olé"), (cap, "Red Cap"), (shoes, "Red Running Shoes")])
+        index.set_popularity({shoes: 10})
+
+        # Execute & Assert - accents and case are ignored, any word start matches
+        assert index.suggest("CAFE o") == [(cafe, "Café Olé")]
+        assert index.suggest("red") == [(shoes, "Red Running Shoes"), (cap, "Red Cap")]
+        assert index.suggest("run") == [(shoes, "Red Running Shoes")]
+        assert index.suggest("red", limit=1) == [(shoes, "Red Running Shoes")]
+        assert index.suggest("  ") == []
+
+        # Incremental updates
+        index.add(cap, "Blue Cap")
+        index.remove(shoes)
+        assert index.suggest("red") == []
+        assert index.suggest("blu") == [(cap, "Blue Cap")]
+        assert len(index) == 2
+
+        # Bulk changes are applied with a single re-sort
+        lamp = uuid4()
+        index.apply_bulk([(lamp, "Blue Lamp"), (cafe, "Green Tea")], [cap])
+        assert index.suggest("blu") == [(lamp, "Blue Lamp")]
+        assert index.suggest("caf") == []
+        assert index.suggest("tea") == [(cafe, "Green Tea")]
+
+    def test_suggest_endpoint_is_maintained_by_service(self, client, django_assert_num_queries):
+        # Setup
+        service = ProductService()
+        product_name_index.clear()
+        quiet = service.create_product(ProductCreate(name="Zephyr Quiet Fan", price=Decimal("30.00"), stock=1))
+        client.get("/api/products/suggest", {"prefix": "zephyr"})
+        loud = service.create_product(ProductCreate(name="Zephyr Loud Fan", price=Decimal("30.00"), stock=1))
+        popularity_leaderboard.increment(loud.id, {timezone.localdate(): 5})
+        product_name_index.refresh_popularity()
+
+        # Execute - answered from memory without touching the database
+        with django_assert_num_queries(0):
+            response = client.get("/api/products/suggest", {"prefix": "zeph"})
+        service.update_product(quiet.id, ProductUpdate(name="Calm Fan"))
+        service.delete_product(loud.id)
+        after_changes = client.get("/api/products/suggest", {"prefix": "zeph"}).json()
+
+        # Assert
+        assert response.status_code == 200
+        assert [item["name"] for item in response.json()] == ["Zephyr Loud Fan", "Zephyr Quiet Fan"]
+        assert after_changes == []
+        assert [item["id"] for item in client.get("/api/products/suggest", {"prefix": "calm"}).json()] == [
+            str(quiet.id)
+        ]
+
+    def test_async_suggest_builds_index_off_the_event_loop(self, sample_products, monkeypatch):
+        # Setup
+        product_name_index.clear()
+
+        # Execute - building from the event loop would raise SynchronousOnlyOperation
+        built = async_to_sync(ProductService.asuggest_products)("test product 1")
+        # The listener clears the index between the ready check and the lookup
+        product_name_index.clear()
+        monkeypatch.setattr(ProductNameIndex, "ready", property(lambda index: True))
+        cleared = async_to_sync(ProductService.asuggest_products)("test product 1")
+
+        # Assert
+        assert built == [(sample_products[1].id, "Test Product 1")]
+        assert cleared == []
+
+    def test_get_product_conditional_requests(self, sample_product, client, monkeypatch):
+        # Setup
+        url = f"/api/products/{sample_product.id}"
+        first = client.get(url)
+        etag, last_modified = first["ETag"], first["Last-Modified"]
+
+        def unexpected_serialization(*args, **kwargs):
+            raise AssertionError("A 304 should not serialize the product")
+
+        monkeypatch.setattr(ProductService, "serialize_product", unexpected_serialization)
+
+        # Execute
+        by_etag = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        by_date = client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        monkeypatch.undo()
+        ProductService().update_product(sample_product.id, ProductUpdate(stock=7))
+        after_update = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        # Assert
+        assert first.status_code == 200
+        assert first["Cache-Control"] == settings.HTTP_CACHE["CACHE_CONTROL"]
+        assert first["Surrogate-Key"] == f"product-{sample_product.id}"
+        assert by_etag.status_code == 304
+        assert by_etag.content == b""
+        assert by_etag["ETag"] == etag
+        assert by_date.status_code == 304
+        assert after_update.status_code == 200
+        assert after_update["ETag"] != etag
+        assert after_update.json()["stock"] == 7
+
+    def test_list_products_conditional_requests(self, sample_products, client, monkeypatch):
+        # Setup
+        first = client.get("/api/products/", {"limit": 2})
+
+        async def unexpected_load(*args, **kwargs):
+            raise AssertionError("A 304 should not load the page")
+
+        monkeypatch.setattr(ProductService, "aget_products_page_json", unexpected_load)
+
+        # Execute
+        unchanged = client.get("/api/products/", {"limit": 2}, HTTP_IF_NONE_MATCH=first["ETag"])
+        monkeypatch.undo()
+        ProductService().create_product(ProductCreate(name="Brand New", price=Decimal("3.00"), stock=1))
+        changed = client.get("/api/products/", {"limit": 2}, HTTP_IF_NONE_MATCH=first["ETag"])
+        popular = client.get("/api/products/popular")
+        popular_unchanged = client.get("/api/products/popular", HTTP_IF_NONE_MATCH=popular["ETag"])
+
+        # Assert
+        assert unchanged.status_code == 304
+        assert unchanged["Surrogate-Key"] == "products"
+        assert changed.status_code == 200
+        assert changed.json()["items"][0]["name"] == "Brand New"
+        assert popular_unchanged.status_code == 304
+
+    def test_writes_purge_surrogate_keys(self, sample_product):
+        # Setup
+        purged = []
+
+        def receiver(sender, surrogate_keys, **kwargs):
+            purged.append(surrogate_keys)
+
+        surrogate_keys_purged.connect(receiver)
+        service = ProductService()
+
+        # Execute
+        try:
+            created = service.create_product(ProductCreate(name="Purge Me", price=Decimal("1.00"), stock=1))
+            service.update_product(sample_product.id, ProductUpdate(stock=1))
+            service.delete_product(created.id)
+        finally:
+            surrogate_keys_purged.disconnect(receiver)
+
+        # Assert
+        assert purged == [
+            ["products"],
+            [f"product-{sample_product.id}", "products"],
+            [f"product-{created.id}", "products"],
+        ]
+
+    def test_surrogate_control_is_opt_in_and_updates_purge_it(self, sample_product, client, settings):
+        # Setup
+        url = f"/api/products/{sample_product.id}"
+        purged = []
+
+        def receiver(sender, surrogate_keys, **kwargs):
+            purged.append(surrogate_keys)
+
+        # Execute - without a purge receiver the CDN only gets the short Cache-Control
+        default = client.get(url)
+        settings.HTTP_CACHE = {**settings.HTTP_CACHE, "SURROGATE_CONTROL": "max-age=86400"}
+        surrogate_keys_purged.connect(receiver)
+        try:
+            cached = client.get(url)
+            ProductService().update_product(sample_product.id, ProductUpdate(stock=3))
+        finally:
+            surrogate_keys_purged.disconnect(receiver)
+
+        # Assert
+        assert "Surrogate-Control" not in default
+        assert default["Cache-Control"] == "public, max-age=60"
+        assert cached["Surrogate-Control"] == "max-age=86400"
+        assert purged == [[cached["Surrogate-Key"], "products"]]
+
+    def test_bulk_create_update_delete(self, sample_product, django_assert_max_num_queries):
+        # Setup
+        service = ProductService()
+        payloads = [ProductCreate(name=f"Bulk {i}", price=Decimal("2.50"), stock=i) for i in range(50)]
+        cached = service.get_product_json(sample_product.id)
+        version = get_catalog_version()
+
+        # Execute - one INSERT per batch, not one per product
+        with django_assert_max_num_queries(3):
+            created = service.bulk_create_products(payloads)
+        missing_id = uuid4()
+        updated, not_found = service.bulk_update_products(
+            [
+                ProductBulkUpdate(id=sample_product.id, name="Bulk Renamed", stock=1),
+                ProductBulkUpdate(id=created[0].id, price=Decimal("9.99")),
+                ProductBulkUpdate(id=missing_id, stock=3),
+            ]
+        )
+        deleted, not_deleted = service.bulk_delete_products([created[1].id, created[2].id, missing_id])
+
+        # Assert
+        assert Product.objects.filter(name__startswith="Bulk ").count() == 49  # 48 left + the renamed sample
+        assert {product.id for product in updated} == {sample_product.id, created[0].id}
+        assert not_found == [missing_id]
+        sample_product.refresh_from_db()
+        assert sample_product.name == "Bulk Renamed"
+        assert sample_product.updated_at.isoformat() != cached.version
+        assert json.loads(service.get_product_json(sample_product.id).body)["name"] == "Bulk Renamed"
+        assert Product.objects.get(id=created[0].id).price == Decimal("9.99")
+        assert deleted == [created[1].id, created[2].id]
+        assert not_deleted == [missing_id]
+        assert get_catalog_version() == version + 3
+
+    def test_bulk_endpoint_sends_single_notification(self, admin_user, client, monkeypatch):
+        # Setup
+        queued = []
+        monkeypatch.setattr(
+            "notifications.service.notify_products_bulk_changed.delay", lambda *args: queued.append(args)
+        )
+        token = JWTHandler().create_access_token(admin_user.id, True)
+        payload = [{"name": f"Import {i}", "price": "1.00", "stock": 1} for i in range(30)]
+
+        # Execute
+        response = client.post(
+            "/api/products/bulk", payload, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+        invalid = client.post(
+            "/api/products/bulk",
+            [{"name": "No price", "stock": 1}],
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+
+        # Assert
+        assert response.status_code == 201
+        assert response.json()["count"] == 30
+        assert len(queued) == 1
+        action, count, sample_ids, changed_by = queued[0]
+        assert (action, count, changed_by) == ("created", 30, str(admin_user.id))
+        assert len(sample_ids) == settings.NOTIFICATION_BULK_SAMPLE_SIZE
+        assert invalid.status_code == 422
+
+    def test_get_products_batch(self, sample_products, client, settings, django_assert_num_queries):
+        # Setup
+        settings.PRODUCT_BATCH_MAX_IDS = 5
+        first, second = sample_products[0], sample_products[1]
+        unknown = uuid4()
+        ids = f"{second.id},{unknown},{first.id},{second.id}"
+
+        # Execute
+        with django_assert_num_queries(1):
+            response = client.get("/api/products/batch", {"ids": ids})
+        with django_assert_num_queries(0):
+            cached = client.get("/api/products/batch", {"ids": ids})
+        repeated = client.get(f"/api/products/batch?ids={first.id}&ids={second.id}")
+        invalid = client.get("/api/products/batch", {"ids": "not-a-uuid"})
+        too_many = client.get("/api/products/batch", {"ids": ",".join(str(uuid4()) for _ in range(6))})
+
+        # Assert
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert [item["id"] for item in items] == [str(second.id), str(unknown), str(first.id), str(second.id)]
+        assert [item["found"] for item in items] == [True, False, True, True]
+        assert items[0]["product"] == json.loads(ProductService.serialize_product(second).body)
+        assert items[1]["product"] is None
+        assert cached.content == response.content
+        # Misses are backfilled together, unknown ids with the shorter negative timeout
+        assert 0 < cache.ttl(product_json_cache_key(unknown)) <= settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT
+        assert cache.ttl(product_json_cache_key(first.id)) > settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT
+        assert [item["id"] for item in repeated.json()["items"]] == [str(first.id), str(second.id)]
+        assert invalid.status_code == 400
+        assert too_many.status_code == 400
+
+    def test_get_products_page_invalid_cursor(self):
+        # Execute & Assert
+        with pytest.raises(InvalidCursor):
+            ProductService().get_products_page(cursor="not-a-cursor")
+
     def test_cache_invalidation_on_update(self, sample_product):
         # Setup
         service = ProductService()
@@ -192,32 +700,103 @@ class TestProductService:
         assert updated_product.name == "Updated After Cache"
         assert product_after_update.name == "Updated After Cache"
 
-    def test_get_popular_products(self, sample_products):
+    def test_product_served_from_local_tier(self, sample_product, monkeypatch):
+        # Setup
+        service = ProductService()
+        service.get_product_by_id(sample_product.id)
+        before = product_cache.stats()
+
+        def redis_unavailable(*args, **kwargs):
+            raise AssertionError("Redis should not be hit")
+
+        monkeypatch.setattr("core.cache.cache.get", redis_unavailable)
+
+        # Execute
+        product = service.get_product_by_id(sample_product.id)
+
+        # Assert
+        assert product.id == sample_product.id
+        assert product_cache.stats()["local"]["hits"] == before["local"]["hits"] + 1
+        assert get_cache_stats()["products"]["redis"] == before["redis"]
+
+    def test_get_product_json_is_cached_and_invalidated(self, sample_product, client, monkeypatch):
+        # Setup
+        service = ProductService()
+        first = client.get(f"/api/products/{sample_product.id}")
+
+        def unexpected_serialization(*args, **kwargs):
+            raise AssertionError("Cached product should not be serialized again")
+
+        monkeypatch.setattr(ProductService, "serialize_product", unexpected_serialization)
+
+        # Execute - served from the cached bytes
+        second = client.get(f"/api/products/{sample_product.id}")
+        monkeypatch.undo()
+        service.update_product(sample_product.id, ProductUpdate(name="Renamed"))
+        third = client.get(f"/api/products/{sample_product.id}")
+
+        # Assert
+        assert first.status_code == second.status_code == 200
+        assert second.content == first.content
+        assert first.json()["price"] == "19.99"
+        assert third.json()["name"] == "Renamed"
+        assert service.get_product_json(uuid4()) is None
+
+    def test_orjson_renderer_matches_default_renderer(self, sample_product):
+        # Setup
+        data = {"product": ProductOut.from_orm(sample_product).model_dump(), 1: None}
+
+        # Execute
+        rendered = ORJSONRenderer().render(None, data, response_status=200)
+        expected = JSONRenderer().render(None, data, response_status=200)
+
+        # Assert - same document, including the date and decimal formats
+        assert json.loads(rendered) == json.loads(expected)
+
+    def test_list_popular_products_json(self, sample_products, client):
+        # Execute
+        response = client.get("/api/products/popular", {"limit": 2})
+        expected = [str(p.id) for p in Product.objects.order_by("-created_at")[:2]]
+        created = ProductService().create_product(ProductCreate(name="Newest", price=Decimal("5.00"), stock=1))
+        after_write = client.get("/api/products/popular", {"limit": 2})
+
+        # Assert
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json()] == expected
+        # The cached list is keyed by catalog version, so writes are visible at once
+        assert after_write.json()[0]["id"] == str(created.id)
+
+    def test_get_popular_products_json(self, sample_products):
         # Setup
         service = ProductService()
 
         # Execute
-        popular_products = service.get_popular_products(limit=3)
+        popular_products = json.loads(service.get_popular_products_json(limit=3))
 
         # Assert
         assert len(popular_products) <= 3
 
         # Test with different limit
-        all_popular_products = service.get_popular_products(limit=10)
+        all_popular_products = json.loads(service.get_popular_products_json(limit=10))
         assert len(all_popular_products) <= 10
 
-    def test_cache_popular_products(self, sample_products):
+    def test_cache_popular_products_json(self, sample_products, monkeypatch):
         # Setup
         service = ProductService()
+        loads = []
+        load_popular_products = ProductService._load_popular_products
 
-        # Clear cache to start fresh
-        cache.clear()
+        def counting_load(limit):
+            loads.append(limit)
+            return load_popular_products(limit)
+
+        monkeypatch.setattr(ProductService, "_load_popular_products", staticmethod(counting_load))
 
         # Execute - Primera llamada (debería ir a la base de datos)
-        products1 = service.get_popular_products()
+        products1 = service.get_popular_products_json()
 
-        # Crear un nuevo producto para verificar el caché
-        new_product = Product.objects.create(
+        # Un producto creado fuera del servicio no cambia la versión del catálogo
+        Product.objects.create(
             name="NEW PRODUCT AFTER CACHE",
             description="This product should not appear in cached results",
             price=Decimal("99.99"),
@@ -225,12 +804,146 @@ class TestProductService:
         )
 
         # Execute - Segunda llamada (debería usar caché)
-        products2 = service.get_popular_products()
+        products2 = service.get_popular_products_json()
 
-        # Verificar que products2 viene de la caché (no contiene el nuevo producto)
-        assert not any(p.name == "NEW PRODUCT AFTER CACHE" for p in products2)
+        # Assert
+        assert products2 == products1
+        assert loads == [5]
+        assert b"NEW PRODUCT AFTER CACHE" not in products2
 
-        # Limpiar caché y verificar que ahora sí incluye el nuevo producto
-        cache.clear()
-        products3 = service.get_popular_products()
-        assert any(p.name == "NEW PRODUCT AFTER CACHE" for p in products3)
+
+class TestTwoTierCache:
+    def test_local_cache_lru_and_ttl(self):
+        # Setup
+        local = LocalCache(max_size=2, ttl=60)
+        local.set("a", 1)
+        local.set("b", 2)
+
+        # Execute - "a" is used, so "b" is the least recently used entry
+        local.get("a")
+        local.set("c", 3)
+        local.set("c", 4, ttl=0)
+
+        # Assert
+        assert local.get("b") is MISSING
+        assert local.get("a") == 1
+        assert local.get("c") is MISSING
+        assert (local.hits, local.misses) == (2, 2)
+        assert len(local) == 1
+
+    def test_delete_is_published_to_other_workers(self):
+        # Setup - two workers sharing the same cache
+        worker_a = TwoTierCache("pubsub-test", max_size=10, local_ttl=60, timeout=60)
+        worker_b = TwoTierCache("pubsub-test", max_size=10, local_ttl=60, timeout=60)
+        worker_b.get("warmup")
+        redis_client = get_redis_connection("default")
+        deadline = time.monotonic() + 5
+        while dict(redis_client.pubsub_numsub(worker_b.channel))[worker_b.channel.encode()] < 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        worker_a.set("key", "value")
+        assert worker_b.get("key") == "value"
+
+        # Execute
+        worker_a.delete("key")
+
+        # Assert - worker B evicts its local copy once the invalidation arrives
+        while len(worker_b.local):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert worker_b.get("key") is MISSING
+
+    def test_get_or_load_runs_one_loader_per_key(self):
+        # Setup
+        product_cache_b = TwoTierCache("single-flight-test", max_size=10, local_ttl=60, timeout=60)
+        key = f"single-flight:{uuid4()}"
+        calls = []
+
+        def slow_loader():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        # Execute - concurrent requests for the same cold key
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: product_cache_b.get_or_load(key, slow_loader), range(8)))
+
+        # Assert
+        assert results == ["value"] * 8
+        assert len(calls) == 1
+
+    def test_get_or_load_waits_for_loader_in_other_worker(self):
+        # Setup - another worker holds the lock and is about to store the value
+        two_tier_cache = TwoTierCache("lock-test", max_size=10, local_ttl=60, timeout=60)
+        key = f"lock:{uuid4()}"
+        cache.add(f"{key}:lock", True, timeout=10)
+        other_worker = threading.Timer(0.1, lambda: two_tier_cache.set(key, "from other worker"))
+        other_worker.start()
+
+        # Execute
+        value = two_tier_cache.get_or_load(key, lambda: "loaded here")
+
+        # Assert
+        assert value == "from other worker"
+        assert two_tier_cache.loads == 0
+
+    def test_get_or_load_async_single_flight(self):
+        # Setup
+        two_tier_cache = TwoTierCache("async-single-flight-test", max_size=10, local_ttl=60, timeout=60)
+        key = f"async-single-flight:{uuid4()}"
+
+        async def slow_loader():
+            await asyncio.sleep(0.1)
+            return "value"
+
+        async def concurrent_reads():
+            return await asyncio.gather(*[two_tier_cache.aget_or_load(key, slow_loader) for _ in range(5)])
+
+        # Execute
+        results = async_to_sync(concurrent_reads)()
+
+        # Assert
+        assert results == ["value"] * 5
+        assert two_tier_cache.loads == 1
+
+    def test_get_or_load_refreshes_hot_key_early(self, monkeypatch):
+        # Setup - an entry whose loader took long relative to its remaining lifetime
+        two_tier_cache = TwoTierCache("early-refresh-test", max_size=10, local_ttl=60, timeout=60)
+        key = f"early-refresh:{uuid4()}"
+        two_tier_cache.set(key, "old", timeout=5, delta=1.0)
+
+        # Execute & Assert - far from expiry the entry is served as is
+        monkeypatch.setattr("core.cache.random.random", lambda: 0.9)
+        assert two_tier_cache.get_or_load(key, lambda: "new") == "old"
+
+        # Execute & Assert - a low draw pulls the refresh forward
+        monkeypatch.setattr("core.cache.random.random", lambda: 1e-9)
+        assert two_tier_cache.get_or_load(key, lambda: "new") == "new"
+        assert two_tier_cache.early_refreshes == 1
+
+
+@pytest.mark.django_db
+class TestProductNegativeCache:
+    def test_unknown_product_is_cached_briefly(self, monkeypatch):
+        # Setup
+        service = ProductService()
+        missing_id = uuid4()
+        query_count = [0]
+        original_get = Product.objects.get
+
+        def mock_get(*args, **kwargs):
+            query_count[0] += 1
+            return original_get(*args, **kwargs)
+
+        monkeypatch.setattr(Product.objects, "get", mock_get)
+
+        # Execute
+        first = service.get_product_by_id(missing_id)
+        product_cache.clear_local()
+        second = service.get_product_by_id(missing_id)
+
+        # Assert - the second lookup is answered by the negative entry in Redis
+        assert first is None
+        assert second is None
+        assert query_count[0] == 1
+        assert cache.ttl(product_cache_key(missing_id)) <= settings.PRODUCT_NEGATIVE_CACHE_TIMEOUT
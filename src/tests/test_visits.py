@@ -1,11 +1,37 @@
+import csv
 import hashlib
+import json
+import time
 from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from io import StringIO
+from uuid import UUID, uuid4
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import AsyncClient, AsyncRequestFactory, Client, RequestFactory
 from django.utils import timezone
 
-from visits.models import ProductAnalytics, Visit, VisitSession
+from core.redis import get_redis
+from visits.buffer import InMemoryVisitBuffer, RedisStreamVisitBuffer
+from visits.export import EXPORT_FIELDS, stream_visits
+from visits.models import ProductAnalytics, Visit, VisitDailyRollup, VisitSession
+from visits.partitions import (
+    add_months,
+    create_partition,
+    current_month,
+    drop_expired_partitions,
+    ensure_partitions,
+    list_partitions,
+    partition_name,
+    partitioning_supported,
+    purge_default_partition,
+)
 from visits.service import VisitService
+from visits.sketches import unique_visitor_sketches
 
 
 @pytest.mark.django_db
@@ -91,7 +117,7 @@ class TestVisitService:
             )
 
         # Execute
-        analytics = service.update_analytics(product_id)
+        analytics = service.update_analytics(product_id, reconcile=True)
 
         # Assert
         assert analytics is not None
@@ -125,3 +151,545 @@ class TestVisitService:
         # Verificar limitación de resultados
         visits = service.get_visits_for_product(product_id, limit=1)
         assert len(visits) == 1
+
+    def test_ingest_visits(self, sample_product):
+        # Setup
+        service = VisitService()
+        VisitSession.objects.create(session_id="known-session")
+        events = [
+            service.build_visit_event(sample_product.id, "10.0.0.1", "Agent", "known-session"),
+            service.build_visit_event(sample_product.id, "10.0.0.2", "Agent", "known-session"),
+            service.build_visit_event(sample_product.id, "10.0.0.3", "Agent", "new-session"),
+        ]
+
+        # Execute
+        written = service.ingest_visits(events)
+
+        # Assert
+        assert written == 3
+        assert Visit.objects.filter(product=sample_product).count() == 3
+        assert VisitSession.objects.get(session_id="known-session").visit_count == 3
+        assert VisitSession.objects.get(session_id="new-session").visit_count == 1
+        assert ProductAnalytics.objects.get(product=sample_product).total_visits == 3
+
+    def test_ingest_visits_is_idempotent_and_skips_missing_products(self, sample_product):
+        # Setup
+        service = VisitService()
+        event = service.build_visit_event(sample_product.id, "10.0.0.1", "Agent", "session-1")
+        orphan = service.build_visit_event(uuid4(), "10.0.0.2", "Agent", "session-2")
+
+        # Execute - replaying the same event must not duplicate the visit
+        service.ingest_visits([event, orphan])
+        service.ingest_visits([event])
+
+        # Assert
+        assert Visit.objects.count() == 1
+        assert not VisitSession.objects.filter(session_id="session-2").exists()
+
+    def test_in_memory_buffer_flush(self, sample_product):
+        # Setup
+        buffer = InMemoryVisitBuffer(max_size=2, batch_size=100, flush_interval=3600)
+        service = VisitService()
+
+        # Execute
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            buffer.enqueue(service.build_visit_event(sample_product.id, ip, "Agent", "session-1"))
+        written = buffer.flush()
+
+        # Assert - the third event is dropped because the buffer is bounded
+        assert written == 2
+        assert buffer.dropped == 1
+        assert len(buffer) == 0
+        assert Visit.objects.filter(product=sample_product).count() == 2
+
+    def test_redis_stream_buffer_retries_failed_and_orphaned_entries(self, sample_product, monkeypatch):
+        # Setup
+        stream_key = f"visits:stream:test:{uuid4()}"
+        options = dict(stream_key=stream_key, group="flushers", max_size=100, batch_size=100, flush_interval=3600)
+        crashed = RedisStreamVisitBuffer(get_redis(decode_responses=True), claim_idle=10, **options)
+        crashed.consumer = "gone-worker"
+        flusher = RedisStreamVisitBuffer(get_redis(decode_responses=True), claim_idle=10, **options)
+        service = VisitService()
+        for ip in ("10.0.0.1", "10.0.0.2"):
+            crashed.enqueue(service.build_visit_event(sample_product.id, ip, "Agent", "session-1"))
+
+        def failing_write(events):
+            raise OperationalError("database unavailable")
+
+        # Execute - one worker reads the entries and dies before acknowledging them
+        monkeypatch.setattr(crashed, "_write", failing_write)
+        failed = crashed.flush()
+        pending_after_failure = get_redis().xpending(stream_key, "flushers")["pending"]
+        time.sleep(0.05)  # longer than claim_idle
+        flusher._group_ready = True  # created by the first flush
+        written = flusher.flush()
+
+        # Assert
+        assert failed == 0
+        assert pending_after_failure == 2
+        assert written == 2
+        assert get_redis().xpending(stream_key, "flushers")["pending"] == 0
+        assert Visit.objects.filter(product=sample_product).count() == 2
+        get_redis().delete(stream_key)
+
+    def test_in_memory_buffer_isolates_malformed_events(self, sample_product):
+        # Setup
+        buffer = InMemoryVisitBuffer(max_size=100, batch_size=100, flush_interval=3600)
+        service = VisitService()
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            buffer.enqueue(service.build_visit_event(sample_product.id, ip, "Agent", "session-1"))
+        buffer._events[1]["timestamp"] = "not-a-timestamp"
+
+        # Execute
+        written = buffer.flush()
+
+        # Assert - only the malformed event is dropped
+        assert written == 2
+        assert Visit.objects.filter(product=sample_product).count() == 2
+
+    def test_redis_stream_buffer_dead_letters_malformed_entries(self, sample_product):
+        # Setup
+        stream_key = f"visits:stream:test:{uuid4()}"
+        flusher = RedisStreamVisitBuffer(
+            get_redis(decode_responses=True),
+            stream_key=stream_key,
+            group="flushers",
+            max_size=100,
+            batch_size=100,
+            flush_interval=3600,
+        )
+        service = VisitService()
+        for ip in ("10.0.0.1", "10.0.0.2"):
+            flusher.enqueue(service.build_visit_event(sample_product.id, ip, "Agent", "session-1"))
+        flusher.enqueue({**service.build_visit_event(sample_product.id, "10.0.0.3"), "product_id": "not-a-uuid"})
+        # An entry read and then trimmed from the stream comes back pending without fields
+        redis_client = get_redis(decode_responses=True)
+        redis_client.xgroup_create(stream_key, "flushers", id="0")
+        flusher._group_ready = True
+        trimmed_id = redis_client.xadd(stream_key, {"product_id": str(sample_product.id)})
+        redis_client.xreadgroup("flushers", flusher.consumer, {stream_key: ">"})
+        redis_client.xdel(stream_key, trimmed_id)
+
+        # Execute
+        written = flusher.flush()
+
+        # Assert - the rest of the batch is written and nothing is left pending
+        assert written == 2
+        assert Visit.objects.filter(product=sample_product).count() == 2
+        assert redis_client.xpending(stream_key, "flushers")["pending"] == 0
+        dead = redis_client.xrange(flusher.dead_letter_key)
+        assert [fields["product_id"] for _, fields in dead] == ["not-a-uuid"]
+        redis_client.delete(stream_key, flusher.dead_letter_key)
+
+    @pytest.mark.parametrize("cookie", ["x" * 200, "' OR 1=1 --"], ids=["too-long", "not-a-uuid"])
+    def test_middleware_replaces_invalid_session_cookie(self, sample_product, settings, monkeypatch, cookie):
+        # Setup
+        settings.VISIT_TRACKING = {**settings.VISIT_TRACKING, "MODE": "buffered"}
+        buffer = InMemoryVisitBuffer(max_size=100, batch_size=100, flush_interval=3600)
+        monkeypatch.setattr("visits.middleware.get_visit_buffer", lambda: buffer)
+        sync_client = Client()
+        sync_client.cookies["visit_session_id"] = cookie
+        async_client = AsyncClient()
+        async_client.cookies["visit_session_id"] = cookie
+
+        # Execute
+        responses = [
+            sync_client.get(f"/api/products/{sample_product.id}"),
+            async_to_sync(async_client.get)(f"/api/products/{sample_product.id}"),
+        ]
+
+        # Assert - both paths issue a fresh session id instead of queueing the cookie
+        assert buffer.flush() == 2
+        new_ids = {response.cookies["visit_session_id"].value for response in responses}
+        assert set(Visit.objects.values_list("session_id", flat=True)) == new_ids
+        assert all(str(UUID(session_id)) == session_id for session_id in new_ids)
+
+    def test_middleware_buffered_mode(self, sample_product, settings, monkeypatch, client):
+        # Setup
+        settings.VISIT_TRACKING = {**settings.VISIT_TRACKING, "MODE": "buffered"}
+        buffer = InMemoryVisitBuffer(max_size=100, batch_size=100, flush_interval=3600)
+        monkeypatch.setattr("visits.middleware.get_visit_buffer", lambda: buffer)
+
+        # Execute
+        response = client.get(f"/api/products/{sample_product.id}")
+
+        # Assert - nothing is written until the buffer is flushed
+        assert response.status_code == 200
+        assert "visit_session_id" in response.cookies
+        assert Visit.objects.count() == 0
+        assert buffer.flush() == 1
+        visit = Visit.objects.get()
+        assert visit.session_id == response.cookies["visit_session_id"].value
+
+    def test_async_middleware_buffered_mode(self, sample_product, settings, monkeypatch):
+        # Setup
+        settings.VISIT_TRACKING = {**settings.VISIT_TRACKING, "MODE": "buffered"}
+        buffer = InMemoryVisitBuffer(max_size=100, batch_size=100, flush_interval=3600)
+        monkeypatch.setattr("visits.middleware.get_visit_buffer", lambda: buffer)
+
+        # Execute
+        response = async_to_sync(AsyncClient().get)(f"/api/products/{sample_product.id}")
+
+        # Assert - the visit is queued without blocking the async response
+        assert response.status_code == 200
+        assert response.json()["id"] == str(sample_product.id)
+        assert len(buffer) == 1
+        assert buffer.flush() == 1
+        assert Visit.objects.get().session_id == response.cookies["visit_session_id"].value
+
+    def test_get_visits_page_with_cursor(self, sample_product):
+        # Setup
+        service = VisitService()
+        now = timezone.now()
+        visits = [
+            Visit.objects.create(product=sample_product, ip_hash=f"hash-{i}", timestamp=now - timedelta(minutes=i))
+            for i in range(5)
+        ]
+
+        # Execute
+        first_page, cursor = service.get_visits_page(sample_product.id, limit=3)
+        second_page, last_cursor = service.get_visits_page(sample_product.id, limit=3, cursor=cursor)
+
+        # Assert - newest first, no overlap between pages
+        assert [v.id for v in first_page + second_page] == [v.id for v in visits]
+        assert last_cursor is None
+
+    def test_export_visits_streams_ndjson_and_csv(self, sample_products):
+        # Setup
+        old = timezone.now() - timedelta(days=3)
+        Visit.objects.create(product=sample_products[0], ip_hash="hash-old", timestamp=old)
+        first = Visit.objects.create(product=sample_products[0], ip_hash="hash-1", user_agent="Agent, v1")
+        Visit.objects.create(product=sample_products[1], ip_hash="hash-2")
+
+        # Execute - NDJSON through a sync iterator
+        response = stream_visits(
+            RequestFactory().get("/api/visits/export"),
+            "ndjson",
+            product_id=sample_products[0].id,
+            start_date=timezone.now() - timedelta(days=1),
+            chunk_size=1,
+        )
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        # Assert
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert len(rows) == 1
+        assert rows[0]["id"] == str(first.id)
+        assert rows[0]["timestamp"] == first.timestamp.isoformat()
+
+        # Execute - CSV through an async iterator under ASGI
+        response = stream_visits(AsyncRequestFactory().get("/api/visits/export"), "csv")
+
+        async def consume():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        lines = list(csv.reader(async_to_sync(consume)().decode().splitlines()))
+
+        # Assert - header plus every visit, oldest first
+        assert lines[0] == EXPORT_FIELDS
+        assert [line[3] for line in lines[1:]] == ["hash-old", "hash-1", "hash-2"]
+        assert lines[2][4] == "Agent, v1"
+
+    def test_record_visits_applies_deltas(self, sample_product):
+        # Setup
+        service = VisitService()
+        service.track_visit(sample_product.id, "10.0.0.1", "Agent")
+        analytics = ProductAnalytics.objects.get(product=sample_product)
+        assert analytics.total_visits == 1
+
+        # Execute - a returning visitor and a new one
+        service.track_visit(sample_product.id, "10.0.0.1", "Agent")
+        visit = service.track_visit(sample_product.id, "10.0.0.2", "Agent")
+
+        # Assert
+        analytics.refresh_from_db()
+        today = timezone.localdate().isoformat()
+        assert analytics.total_visits == 3
+        assert analytics.unique_visitors == 2
+        assert analytics.daily_stats == [{"date": today, "count": 3, "unique_visitors": 2}]
+
+        # Durations keep an exact running average, including corrections
+        service.update_visit_duration(visit.id, 60)
+        service.update_visit_duration(visit.id, 90)
+        analytics.refresh_from_db()
+        assert (analytics.duration_sum, analytics.duration_count, analytics.avg_duration) == (90, 1, 90)
+
+        # The incremental counters match a full rebuild from raw visits
+        rebuilt = service.update_analytics(sample_product.id)
+        assert (rebuilt.total_visits, rebuilt.unique_visitors, rebuilt.avg_duration) == (3, 2, 90)
+        assert rebuilt.daily_stats == analytics.daily_stats
+
+    def test_reconcile_analytics_command(self, sample_product):
+        # Setup - counters that drifted from the raw visits
+        Visit.objects.create(product=sample_product, ip_hash="hash-1")
+        ProductAnalytics.objects.create(product=sample_product, total_visits=10)
+        out = StringIO()
+
+        # Execute
+        call_command("reconcile_analytics", str(sample_product.id), stdout=out)
+
+        # Assert
+        assert ProductAnalytics.objects.get(product=sample_product).total_visits == 1
+        assert "1 had drifted" in out.getvalue()
+
+    def test_reconcile_rebuilds_unique_visitor_sketches_in_place(self, sample_product):
+        # Setup - sketches holding a visitor and a day the raw visits do not have
+        service = VisitService()
+        today = timezone.localdate()
+        two_days_ago = today - timedelta(days=2)
+        Visit.objects.create(product=sample_product, ip_hash="hash-1")
+        Visit.objects.create(product=sample_product, ip_hash="hash-2")
+        unique_visitor_sketches.add(
+            sample_product.id, [(today, "hash-1"), (two_days_ago, "stale-1"), (two_days_ago, "stale-2")]
+        )
+        redis_client = get_redis()
+
+        # Execute - updating analytics reads the sketches, reconciliation rebuilds them
+        estimated = service.update_analytics(sample_product.id)
+        before = unique_visitor_sketches.count(sample_product.id)
+        call_command("reconcile_analytics", str(sample_product.id), stdout=StringIO())
+
+        # Assert
+        assert estimated.unique_visitors == before == 3  # hash-2 was never sketched
+        assert ProductAnalytics.objects.get(product=sample_product).unique_visitors == 2
+        assert unique_visitor_sketches.count(sample_product.id) == 2
+        assert unique_visitor_sketches.count(sample_product.id, today, today) == 2
+        assert unique_visitor_sketches.count(sample_product.id, two_days_ago, two_days_ago) == 0
+        assert list(redis_client.scan_iter(f"hll:visits:{sample_product.id}:*:rebuild:*")) == []
+        assert redis_client.ttl(f"hll:visits:{sample_product.id}:all") == -1
+
+    def test_get_unique_visitors_count(self, sample_product):
+        # Setup
+        service = VisitService()
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1"):
+            service.track_visit(sample_product.id, ip, "Agent")
+        yesterday = timezone.now() - timedelta(days=1)
+
+        # Execute & Assert - estimated from the sketches, all time and by range
+        assert service.get_unique_visitors_count(sample_product.id) == 2
+        assert service.get_unique_visitors_count(sample_product.id, start_date=yesterday) == 2
+        assert service.get_unique_visitors_count(sample_product.id, end_date=yesterday) == 0
+
+        # Exact count over the raw visits
+        assert service.get_unique_visitors_count(sample_product.id, start_date=yesterday, exact=True) == 2
+
+    def test_rollup_visits(self, sample_product):
+        # Setup - visits two days ago and today
+        service = VisitService()
+        two_days_ago = timezone.now() - timedelta(days=2)
+        Visit.objects.create(product=sample_product, ip_hash="hash-1", timestamp=two_days_ago, duration=30)
+        Visit.objects.create(product=sample_product, ip_hash="hash-1", timestamp=two_days_ago, duration=60)
+        Visit.objects.create(product=sample_product, ip_hash="hash-2")
+
+        # Execute
+        service.rollup_visits()
+
+        # Assert - the finished day is closed, today stays open
+        past = VisitDailyRollup.objects.get(product=sample_product, date=timezone.localdate(two_days_ago))
+        assert (past.visits, past.unique_visitors, past.duration_sum, past.duration_count) == (2, 1, 90, 2)
+        assert past.closed is True
+        today = VisitDailyRollup.objects.get(product=sample_product, date=timezone.localdate())
+        assert (today.visits, today.closed) == (1, False)
+
+        # Closed days are not aggregated again, only today is
+        Visit.objects.create(product=sample_product, ip_hash="hash-3", timestamp=two_days_ago)
+        Visit.objects.create(product=sample_product, ip_hash="hash-3")
+        service.rollup_visits()
+        past.refresh_from_db()
+        today.refresh_from_db()
+        assert past.visits == 2
+        assert today.visits == 2
+
+        # Reconciliation re-aggregates closed days from the raw visits, late ones included
+        Visit.objects.filter(product=sample_product, ip_hash="hash-3", timestamp=two_days_ago).update(duration=10)
+        analytics = service.update_analytics(sample_product.id, reconcile=True)
+        past.refresh_from_db()
+        assert (past.visits, past.unique_visitors, past.duration_sum, past.closed) == (3, 2, 100, True)
+        assert (analytics.total_visits, analytics.duration_sum) == (5, 100)
+
+    def test_get_popular_products(self, sample_products):
+        # Setup - product 0 gets more visits now, product 1 had more visits in the previous period
+        service = VisitService()
+        forty_days_ago = timezone.now() - timedelta(days=40)
+        for i in range(3):
+            service.track_visit(sample_products[0].id, f"10.0.0.{i}", "Agent")
+        service.track_visit(sample_products[1].id, "10.0.1.1", "Agent")
+        for _ in range(2):
+            Visit.objects.create(product=sample_products[0], ip_hash="old", timestamp=forty_days_ago)
+        service.rebuild_popularity_leaderboard()
+
+        # Execute
+        popular = service.get_popular_products(limit=2)
+
+        # Assert
+        assert [product.id for product, _ in popular] == [sample_products[0].id, sample_products[1].id]
+        stats = popular[0][1]
+        assert stats["total_visits"] == 3
+        assert stats["unique_visitors"] == 3
+        assert stats["percentage_change"] == 50.0
+        assert popular[1][1]["percentage_change"] == 100.0
+
+    def test_get_product_analytics_stale_while_revalidate(self, sample_product, settings, monkeypatch):
+        # Setup - a snapshot older than the max age
+        settings.VISIT_ANALYTICS_MAX_AGE = 60
+        service = VisitService()
+        service.track_visit(sample_product.id, "10.0.0.1", "Agent")
+        ProductAnalytics.objects.filter(product=sample_product).update(
+            last_updated=timezone.now() - timedelta(minutes=5)
+        )
+        Visit.objects.create(product=sample_product, ip_hash="untracked")
+        scheduled = []
+        monkeypatch.setattr(
+            "visits.tasks.refresh_product_analytics.delay", lambda product_id: scheduled.append(product_id)
+        )
+        cache.delete(f"analytics_refresh:{sample_product.id}")
+
+        # Execute - concurrent readers of the same stale snapshot
+        first = service.get_product_analytics(sample_product.id)
+        second = service.get_product_analytics(sample_product.id)
+
+        # Assert - the stale snapshot is served and only one refresh is queued
+        assert first.total_visits == second.total_visits == 1
+        assert scheduled == [str(sample_product.id)]
+
+        # The background refresh rebuilds the snapshot and releases the lock
+        assert service.refresh_analytics(sample_product.id).total_visits == 2
+        assert service.get_product_analytics(sample_product.id).total_visits == 2
+        assert service.schedule_analytics_refresh(sample_product.id) is True
+        assert service.get_product_analytics(uuid4()) is None
+
+    def test_popular_products_leaderboard_is_realtime(
+        self, sample_products, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        # Setup - start from an empty leaderboard
+        service = VisitService()
+        service.rebuild_popularity_leaderboard()
+        with django_capture_on_commit_callbacks(execute=True):
+            service.track_visit(sample_products[2].id, "10.0.2.1", "Agent")
+            service.track_visit(sample_products[2].id, "10.0.2.2", "Agent")
+            service.track_visit(sample_products[3].id, "10.0.3.1", "Agent")
+        # Visits rolled back with their transaction are never counted
+        with django_capture_on_commit_callbacks(execute=True), pytest.raises(RuntimeError):
+            with transaction.atomic():
+                service.track_visit(sample_products[4].id, "10.0.4.1", "Agent")
+                raise RuntimeError("rollback")
+
+        # Execute
+        popular = service.get_popular_products(limit=5)
+
+        # Assert
+        assert [(product.id, stats["total_visits"]) for product, stats in popular] == [
+            (sample_products[2].id, 2),
+            (sample_products[3].id, 1),
+        ]
+
+        # Without Redis the daily rollups are used instead
+        def unavailable(*args, **kwargs):
+            raise ConnectionError("Redis unavailable")
+
+        monkeypatch.setattr("visits.service.popularity_leaderboard.top", unavailable)
+        service.rollup_visits()
+        assert [product.id for product, _ in service.get_popular_products(limit=5)] == [
+            sample_products[2].id,
+            sample_products[3].id,
+        ]
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(not partitioning_supported(), reason="Visit partitioning requires PostgreSQL")
+class TestVisitPartitions:
+    def test_current_and_upcoming_partitions_exist(self):
+        # Execute - partitions created by the migration make this a no-op
+        created = ensure_partitions(months_ahead=2)
+
+        # Assert
+        assert created == []
+        months = list_partitions()
+        assert current_month() in months
+        assert add_months(current_month(), 2) in months
+
+    def test_date_filters_prune_partitions(self, sample_product):
+        # Setup
+        old_month = add_months(current_month(), -1)
+        create_partition(old_month)
+
+        # Execute
+        plan = Visit.objects.filter(product=sample_product, timestamp__gte=timezone.now()).explain()
+
+        # Assert
+        assert partition_name(current_month()) in plan
+        assert partition_name(old_month) not in plan
+
+    def test_create_partition_moves_rows_from_default_and_retention_drops_it(self, sample_product):
+        # Setup - a visit older than every partition lands in the default partition
+        old_month = add_months(current_month(), -24)
+        old_visit = Visit.objects.create(
+            product=sample_product,
+            ip_hash="old-hash",
+            timestamp=datetime(old_month.year, old_month.month, 15, tzinfo=dt_timezone.utc),
+        )
+
+        # Execute
+        assert create_partition(old_month) is True
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {partition_name(old_month)}")
+            assert cursor.fetchone()[0] == 1
+
+        removed = drop_expired_partitions(retention_months=13)
+
+        # Assert
+        assert removed == [partition_name(old_month)]
+        assert not Visit.objects.filter(id=old_visit.id).exists()
+        assert current_month() in list_partitions()
+
+    def test_retention_purges_expired_rows_from_default_partition(self, sample_product, caplog):
+        # Setup - neither month has a partition, so both visits land in the default partition
+        expired_month = add_months(current_month(), -24)
+        recent_month = add_months(current_month(), -2)
+        expired = Visit.objects.create(
+            product=sample_product,
+            ip_hash="expired-hash",
+            timestamp=datetime(expired_month.year, expired_month.month, 15, tzinfo=dt_timezone.utc),
+        )
+        recent = Visit.objects.create(
+            product=sample_product,
+            ip_hash="recent-hash",
+            timestamp=datetime(recent_month.year, recent_month.month, 15, tzinfo=dt_timezone.utc),
+        )
+
+        # Execute
+        kept = purge_default_partition(retention_months=13, detach_only=True)
+        purged = purge_default_partition(retention_months=13)
+
+        # Assert
+        assert kept == 0
+        assert purged == 1
+        assert not Visit.objects.filter(id=expired.id).exists()
+        assert Visit.objects.filter(id=recent.id).exists()
+        assert "1 visits are in visits_visit_default" in caplog.text
+
+    def test_reconcile_keeps_unique_visitors_of_dropped_partitions(self, sample_product):
+        # Setup - one visitor only seen in a month past retention, one seen today
+        service = VisitService()
+        old_month = add_months(current_month(), -24)
+        old_visit = Visit.objects.create(
+            product=sample_product,
+            ip_hash="old-hash",
+            timestamp=datetime(old_month.year, old_month.month, 15, 12, tzinfo=dt_timezone.utc),
+        )
+        create_partition(old_month)
+        Visit.objects.create(product=sample_product, ip_hash="recent-hash")
+        service.rollup_visits()
+        unique_visitor_sketches.add(
+            sample_product.id, [(old_visit.timestamp.date(), "old-hash"), (timezone.localdate(), "recent-hash")]
+        )
+        drop_expired_partitions(retention_months=13)
+
+        # Execute
+        call_command("reconcile_analytics", str(sample_product.id), stdout=StringIO())
+
+        # Assert - the dropped visitor is still counted, by the analytics and the sketch
+        analytics = ProductAnalytics.objects.get(product=sample_product)
+        assert (analytics.total_visits, analytics.unique_visitors) == (2, 2)
+        assert unique_visitor_sketches.count(sample_product.id) == 2
+        assert unique_visitor_sketches.count(sample_product.id, timezone.localdate(), timezone.localdate()) == 1
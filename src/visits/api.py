@@ -2,12 +2,15 @@ from datetime import datetime
 from typing import Dict, List, Optional
 from uuid import UUID
 
-from django.http import HttpRequest
+from django.http import HttpRequest, HttpResponse
 from ninja import Router
 
 from auth.dependencies import get_admin_auth
-from visits.schemas import PopularProductOut, ProductAnalyticsOut, VisitOut
+from core.pagination import InvalidCursor
+from visits.export import EXPORT_FORMATS, stream_visits
+from visits.schemas import PopularProductOut, ProductAnalyticsOut, UniqueVisitorsOut, VisitOut
 from visits.service import VisitService
+from visits.sketches import UniqueVisitorSketches
 
 router = Router(tags=["visits"])
 visit_service = VisitService()
@@ -24,29 +27,60 @@ def update_visit_duration(request: HttpRequest, visit_id: UUID, duration: int):
     return 200, {"detail": "Visit duration updated"}
 
 
-@router.get("/product/{product_id}", auth=get_admin_auth(), response={200: List[VisitOut], 404: Dict[str, str]})
+@router.get(
+    "/product/{product_id}",
+    auth=get_admin_auth(),
+    response={200: List[VisitOut], 400: Dict[str, str], 404: Dict[str, str]},
+)
 def get_product_visits(
     request: HttpRequest,
+    response: HttpResponse,
     product_id: UUID,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
 ):
     """
-    Get visits for a specific product (admin only).
+    Get visits for a specific product, newest first (admin only).
+
+    The cursor of the next page is returned in the X-Next-Cursor header.
     """
-    visits = visit_service.get_visits_for_product(product_id, start_date, end_date, limit)
+    try:
+        visits, next_cursor = visit_service.get_visits_page(product_id, start_date, end_date, limit, cursor)
+    except InvalidCursor as e:
+        return 400, {"detail": str(e)}
+    if next_cursor:
+        response["X-Next-Cursor"] = next_cursor
     return 200, [VisitOut.from_orm(v) for v in visits]
 
 
+@router.get("/export", auth=get_admin_auth(), response={400: Dict[str, str]})
+def export_visits(
+    request: HttpRequest,
+    format: str = "ndjson",
+    product_id: Optional[UUID] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    """
+    Stream visits as NDJSON or CSV (admin only).
+    """
+    if format not in EXPORT_FORMATS:
+        return 400, {"detail": f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}
+    return stream_visits(request, format, product_id, start_date, end_date)
+
+
 @router.get(
     "/analytics/product/{product_id}", auth=get_admin_auth(), response={200: ProductAnalyticsOut, 404: Dict[str, str]}
 )
 def get_product_analytics(request: HttpRequest, product_id: UUID):
     """
     Get analytics for a specific product (admin only).
+
+    Serves the stored snapshot; stale snapshots are refreshed in the background.
     """
-    analytics = visit_service.update_analytics(product_id)
+    analytics = visit_service.get_product_analytics(product_id)
     if not analytics:
         return 404, {"detail": "Analytics not found"}
 
@@ -63,6 +97,28 @@ def get_product_analytics(request: HttpRequest, product_id: UUID):
     )
 
 
+@router.get("/analytics/product/{product_id}/unique-visitors", auth=get_admin_auth(), response=UniqueVisitorsOut)
+def get_unique_visitors(
+    request: HttpRequest,
+    product_id: UUID,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    exact: bool = False,
+):
+    """
+    Get unique visitors for a product in a date range (admin only).
+
+    Estimated from HyperLogLog sketches unless exact=true is requested.
+    """
+    unique_visitors = visit_service.get_unique_visitors_count(product_id, start_date, end_date, exact=exact)
+    return UniqueVisitorsOut(
+        product_id=product_id,
+        unique_visitors=unique_visitors,
+        exact=exact,
+        error_bound=0.0 if exact else UniqueVisitorSketches.ERROR_BOUND,
+    )
+
+
 @router.get("/popular", auth=get_admin_auth(), response=List[PopularProductOut])
 def get_popular_products(request: HttpRequest, limit: int = 5):
     """
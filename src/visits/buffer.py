@@ -0,0 +1,318 @@
+import abc
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+from core.redis import get_redis
+
+logger = logging.getLogger("visits")
+
+VisitEvent = Dict[str, Any]
+
+
+def get_tracking_settings() -> Dict[str, Any]:
+    """
+    Visit tracking settings merged over their defaults
+    """
+    defaults = {
+        "MODE": "sync",
+        "BUFFER_BACKEND": "memory",
+        "BUFFER_MAX_SIZE": 10000,
+        "BATCH_SIZE": 500,
+        "FLUSH_INTERVAL": 2.0,
+        "STREAM_KEY": "visits:stream",
+        "STREAM_GROUP": "visit-flushers",
+        "STREAM_CLAIM_IDLE": 60000,
+    }
+    return {**defaults, **getattr(settings, "VISIT_TRACKING", {})}
+
+
+class VisitBuffer(abc.ABC):
+    """
+    Bounded buffer of compact visit events waiting to be written in batches
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+    @abc.abstractmethod
+    def enqueue(self, event: VisitEvent) -> bool:
+        """
+        Queue an event without blocking; return False when it is dropped
+        """
+
+    @abc.abstractmethod
+    def flush(self) -> int:
+        """
+        Write the queued events and return how many visits were stored
+        """
+
+    @staticmethod
+    def _write(events: List[VisitEvent]) -> int:
+        # Imported here to avoid a circular import with visits.service
+        from visits.service import VisitService
+
+        return VisitService.ingest_visits(events)
+
+    def _write_isolating(self, events: List[VisitEvent]) -> Tuple[int, List[int]]:
+        """
+        Write a batch, bisecting it on failure so one malformed event does not
+        hold back the rest. Returns the number of visits written and the
+        indexes of the events rejected on their own. Database outages are
+        raised so the caller can keep the batch for a retry.
+        """
+        try:
+            return self._write(events), []
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as e:
+            if len(events) == 1:
+                logger.error(f"Descartando visita malformada {events[0].get('id')}: {str(e)}")
+                return 0, [0]
+        middle = len(events) // 2
+        head_written, head_rejected = self._write_isolating(events[:middle])
+        tail_written, tail_rejected = self._write_isolating(events[middle:])
+        return head_written + tail_written, head_rejected + [middle + index for index in tail_rejected]
+
+
+class InMemoryVisitBuffer(VisitBuffer):
+    """
+    Per-process buffer drained by a background flusher thread.
+
+    Events are flushed when the buffer reaches ``batch_size`` or when the
+    oldest event is older than ``flush_interval`` seconds. When the buffer is
+    full new events are dropped instead of blocking the request.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float) -> None:
+        super().__init__(batch_size, flush_interval)
+        self.max_size = max_size
+        self._events: Deque[VisitEvent] = deque()
+        self._oldest_at: Optional[float] = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def enqueue(self, event: VisitEvent) -> bool:
+        self._ensure_flusher()
+        with self._condition:
+            if len(self._events) >= self.max_size:
+                self.dropped += 1
+                return False
+            if not self._events:
+                self._oldest_at = time.monotonic()
+            self._events.append(event)
+            if len(self._events) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def _take(self, max_items: int) -> List[VisitEvent]:
+        with self._condition:
+            count = min(max_items, len(self._events))
+            batch = [self._events.popleft() for _ in range(count)]
+            self._oldest_at = time.monotonic() if self._events else None
+            return batch
+
+    def _is_due(self) -> bool:
+        if not self._events:
+            return False
+        if len(self._events) >= self.batch_size:
+            return True
+        return self._oldest_at is not None and time.monotonic() - self._oldest_at >= self.flush_interval
+
+    def flush(self) -> int:
+        """
+        Write every buffered event, one batch at a time
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    written += self._write_isolating(batch)[0]
+                except Exception as e:
+                    logger.error(f"Error writing {len(batch)} buffered visits: {str(e)}")
+        return written
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive a fork, so pre-forking servers restart the flusher per worker
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="visit-buffer-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(self._is_due, timeout=self.flush_interval)
+            if self._is_due():
+                self.flush()
+                close_old_connections()
+
+
+class RedisStreamVisitBuffer(VisitBuffer):
+    """
+    Buffer backed by a capped Redis Stream shared by every worker.
+
+    Web workers only XADD; the ``flush_visit_buffer`` Celery task reads the
+    stream through a consumer group, writes each batch and acknowledges it.
+
+    Entries are only acknowledged after they are written. A batch that
+    fails because the database is unavailable stays in the consumer's
+    pending list and is retried first on the next flush, and entries left
+    pending by a consumer that went away (the name changes with every
+    restart) are claimed once they have been idle for ``claim_idle`` ms.
+    Entries that cannot be written on their own are moved to the
+    ``<stream_key>:dead`` stream so they do not block the stream.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        stream_key: str,
+        group: str,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        claim_idle: int = 60000,
+    ) -> None:
+        super().__init__(batch_size, flush_interval)
+        self.redis_client = redis_client
+        self.stream_key = stream_key
+        self.group = group
+        self.max_size = max_size
+        self.claim_idle = claim_idle
+        self.dead_letter_key = f"{stream_key}:dead"
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+
+    def enqueue(self, event: VisitEvent) -> bool:
+        fields = {key: "" if value is None else str(value) for key, value in event.items()}
+        try:
+            self.redis_client.xadd(self.stream_key, fields, maxlen=self.max_size, approximate=True)
+            return True
+        except Exception as e:
+            self.dropped += 1
+            logger.error(f"Error enqueuing visit in Redis stream: {str(e)}")
+            return False
+
+    def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            self.redis_client.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            # BUSYGROUP: the group already exists
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def flush(self) -> int:
+        """
+        Drain the stream in batches: this consumer's pending entries, then
+        entries orphaned by other consumers, then new entries
+        """
+        self._ensure_group()
+        self._claim_orphans()
+        written = 0
+        for start_id in ("0", ">"):
+            while True:
+                response = self.redis_client.xreadgroup(
+                    self.group, self.consumer, {self.stream_key: start_id}, count=self.batch_size
+                )
+                entries = response[0][1] if response else []
+                if not entries:
+                    break
+                # Entries deleted or trimmed while pending come back without fields
+                live_entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+                events = [self._decode(fields) for _, fields in live_entries]
+                try:
+                    batch_written, rejected = self._write_isolating(events)
+                except Exception as e:
+                    # Left pending, so the next flush retries them
+                    logger.error(f"Error writing {len(entries)} visits from Redis stream: {str(e)}")
+                    return written
+                written += batch_written
+                if rejected:
+                    self._dead_letter([live_entries[index] for index in rejected])
+                entry_ids = [entry_id for entry_id, _ in entries]
+                self.redis_client.xack(self.stream_key, self.group, *entry_ids)
+                self.redis_client.xdel(self.stream_key, *entry_ids)
+        return written
+
+    def _dead_letter(self, entries: List[Tuple[str, Dict[str, str]]]) -> None:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for _, fields in entries:
+            pipe.xadd(self.dead_letter_key, fields, maxlen=self.max_size, approximate=True)
+        pipe.execute()
+        logger.warning(f"Movidas {len(entries)} visitas malformadas a {self.dead_letter_key}")
+
+    def _claim_orphans(self) -> None:
+        # Hand entries pending too long with any consumer over to this one; they are read with "0"
+        start_id = "0-0"
+        while True:
+            start_id, claimed, *_ = self.redis_client.xautoclaim(
+                self.stream_key, self.group, self.consumer, self.claim_idle, start_id, count=self.batch_size
+            )
+            if claimed:
+                logger.warning(f"Reclamadas {len(claimed)} visitas pendientes del stream")
+            if start_id in ("0-0", b"0-0"):
+                break
+
+    @staticmethod
+    def _decode(fields: Dict[str, str]) -> VisitEvent:
+        return {key: value or None for key, value in fields.items()}
+
+
+_visit_buffer: Optional[VisitBuffer] = None
+_visit_buffer_lock = threading.Lock()
+
+
+def get_visit_buffer() -> VisitBuffer:
+    """
+    Return the process-wide visit buffer configured in VISIT_TRACKING
+    """
+    global _visit_buffer
+    if _visit_buffer is None:
+        with _visit_buffer_lock:
+            if _visit_buffer is None:
+                config = get_tracking_settings()
+                if config["BUFFER_BACKEND"] == "redis":
+                    _visit_buffer = RedisStreamVisitBuffer(
+                        redis_client=get_redis(decode_responses=True),
+                        stream_key=config["STREAM_KEY"],
+                        group=config["STREAM_GROUP"],
+                        max_size=config["BUFFER_MAX_SIZE"],
+                        batch_size=config["BATCH_SIZE"],
+                        flush_interval=config["FLUSH_INTERVAL"],
+                        claim_idle=config["STREAM_CLAIM_IDLE"],
+                    )
+                else:
+                    _visit_buffer = InMemoryVisitBuffer(
+                        max_size=config["BUFFER_MAX_SIZE"],
+                        batch_size=config["BATCH_SIZE"],
+                        flush_interval=config["FLUSH_INTERVAL"],
+                    )
+    return _visit_buffer
@@ -0,0 +1,94 @@
+import csv
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, StreamingHttpResponse
+
+from visits.service import VisitService
+
+EXPORT_FIELDS = ["id", "product_id", "timestamp", "ip_hash", "user_agent", "session_id", "duration"]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class _Echo:
+    """
+    File-like object that hands back what csv.writer writes to it
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_chunks(rows: Iterable[Tuple], chunk_size: int) -> Iterator[str]:
+    lines: List[str] = []
+    for row in rows:
+        lines.append(json.dumps({field: _encode_value(value) for field, value in zip(EXPORT_FIELDS, row)}))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def _csv_chunks(rows: Iterable[Tuple], chunk_size: int) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    lines: List[str] = []
+    for row in rows:
+        lines.append(writer.writerow(["" if value is None else _encode_value(value) for value in row]))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+async def _async_chunks(chunks: Iterator[str]) -> AsyncIterator[str]:
+    # Pull every chunk on the same thread, which owns the server-side cursor
+    next_chunk = sync_to_async(lambda: next(chunks, None), thread_sensitive=True)
+    while True:
+        chunk = await next_chunk()
+        if chunk is None:
+            break
+        yield chunk
+
+
+def stream_visits(
+    request: HttpRequest,
+    export_format: str,
+    product_id: Optional[UUID] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    chunk_size: int = 2000,
+) -> StreamingHttpResponse:
+    """
+    Stream visits as NDJSON or CSV without loading them into memory.
+
+    Rows come from a server-side cursor as plain tuples and are encoded
+    ``chunk_size`` at a time. Under ASGI the chunks are produced through an
+    async iterator, since Django buffers sync iterators on async servers.
+    """
+    rows = VisitService.iter_visits(EXPORT_FIELDS, product_id, start_date, end_date, chunk_size=chunk_size)
+    chunks = (_ndjson_chunks if export_format == "ndjson" else _csv_chunks)(rows, chunk_size)
+
+    response = StreamingHttpResponse(
+        _async_chunks(chunks) if isinstance(request, ASGIRequest) else chunks,
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="visits.{export_format}"'
+    return response
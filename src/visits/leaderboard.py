@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+from uuid import UUID
+
+import redis
+
+from core.redis import get_redis
+
+
+class PopularityLeaderboard:
+    """
+    Per-day Redis sorted sets of visit counts, scored by product id.
+
+    Every tracked visit increments today's set, so a window of days is read
+    with one ZUNIONSTORE over its daily keys. The union is kept for a few
+    seconds, which makes repeated reads a single ZREVRANGE.
+    """
+
+    WINDOW_DAYS = 30
+    DAY_KEY = "leaderboard:visits:{day}"
+    WINDOW_KEY = "leaderboard:visits:window:{start}:{end}"
+    WINDOW_TTL = 5
+
+    @staticmethod
+    def _redis() -> redis.Redis:
+        return get_redis()
+
+    def _day_key(self, day: date) -> str:
+        return self.DAY_KEY.format(day=day.isoformat())
+
+    def _day_keys(self, start_day: date, end_day: date) -> List[str]:
+        return [self._day_key(start_day + timedelta(days=i)) for i in range((end_day - start_day).days + 1)]
+
+    def _expire_seconds(self) -> int:
+        # Daily sets must outlive the current and the previous window
+        return (self.WINDOW_DAYS * 2 + 1) * 24 * 3600
+
+    def increment(self, product_id: UUID, visits_by_day: Dict[date, int]) -> None:
+        """
+        Add a product's new visits to the daily sets
+        """
+        pipe = self._redis().pipeline(transaction=False)
+        for day, count in visits_by_day.items():
+            pipe.zincrby(self._day_key(day), count, str(product_id))
+            pipe.expire(self._day_key(day), self._expire_seconds())
+        pipe.execute()
+
+    def _window(self, start_day: date, end_day: date) -> str:
+        window_key = self.WINDOW_KEY.format(start=start_day.isoformat(), end=end_day.isoformat())
+        client = self._redis()
+        if not client.exists(window_key):
+            pipe = client.pipeline(transaction=False)
+            pipe.zunionstore(window_key, self._day_keys(start_day, end_day))
+            pipe.expire(window_key, self.WINDOW_TTL)
+            pipe.execute()
+        return window_key
+
+    def top(self, start_day: date, end_day: date, limit: int) -> List[Tuple[UUID, int]]:
+        """
+        Products with the most visits between two days (inclusive)
+        """
+        members = self._redis().zrevrange(self._window(start_day, end_day), 0, limit - 1, withscores=True)
+        return [(UUID(member.decode()), int(score)) for member, score in members]
+
+    def scores(self, start_day: date, end_day: date, product_ids: List[UUID]) -> Dict[UUID, int]:
+        """
+        Visits between two days (inclusive) for the given products
+        """
+        if not product_ids:
+            return {}
+        scores = self._redis().zmscore(
+            self._window(start_day, end_day), [str(product_id) for product_id in product_ids]
+        )
+        return {product_id: int(score or 0) for product_id, score in zip(product_ids, scores)}
+
+    def rebuild(self, start_day: date, end_day: date, daily_counts: Iterable[Tuple[date, UUID, int]]) -> None:
+        """
+        Replace the daily sets between two days with the given (day, product_id, visits) rows
+        """
+        counts_by_day: Dict[date, Dict[str, int]] = {}
+        for day, product_id, count in daily_counts:
+            counts_by_day.setdefault(day, {})[str(product_id)] = count
+
+        client = self._redis()
+        window_keys = list(client.scan_iter(match=self.WINDOW_KEY.format(start="*", end="*")))
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(*self._day_keys(start_day, end_day), *window_keys)
+        for day, counts in counts_by_day.items():
+            pipe.zadd(self._day_key(day), counts)
+            pipe.expire(self._day_key(day), self._expire_seconds())
+        pipe.execute()
+
+
+popularity_leaderboard = PopularityLeaderboard()
@@ -0,0 +1,55 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from visits.partitions import (
+    DEFAULT_PARTITION,
+    default_partition_rows,
+    drop_expired_partitions,
+    ensure_partitions,
+    partitioning_supported,
+    purge_default_partition,
+)
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly Visit partitions and detach or drop the ones past the retention window"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--premake",
+            type=int,
+            default=settings.VISIT_PARTITIONS["PREMAKE_MONTHS"],
+            help="Months ahead of the current one to create partitions for",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.VISIT_PARTITIONS["RETENTION_MONTHS"],
+            help="Months of raw visits to keep",
+        )
+        parser.add_argument(
+            "--detach-only",
+            action="store_true",
+            default=settings.VISIT_PARTITIONS["DETACH_ONLY"],
+            help="Detach expired partitions instead of dropping them",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not partitioning_supported():
+            self.stdout.write(self.style.WARNING("Visit partitioning requires PostgreSQL, nothing to do"))
+            return
+
+        for name in ensure_partitions(months_ahead=options["premake"]):
+            self.stdout.write(f"Created {name}")
+        for name in drop_expired_partitions(options["retention_months"], detach_only=options["detach_only"]):
+            self.stdout.write(f"{'Detached' if options['detach_only'] else 'Dropped'} {name}")
+        purged = purge_default_partition(options["retention_months"], detach_only=options["detach_only"])
+        if purged:
+            self.stdout.write(f"Deleted {purged} expired visits from {DEFAULT_PARTITION}")
+        remaining = default_partition_rows()
+        if remaining:
+            self.stdout.write(self.style.WARNING(f"{remaining} visits are in {DEFAULT_PARTITION}, missing partitions"))
+
+        self.stdout.write(self.style.SUCCESS("Visit partitions are up to date"))
@@ -0,0 +1,44 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from products.models import Product
+from visits.models import ProductAnalytics
+from visits.service import VisitService
+
+
+class Command(BaseCommand):
+    help = "Reconcile incrementally maintained ProductAnalytics counters against the raw Visit table"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("product_ids", nargs="*", help="Products to reconcile (default: all products)")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        product_ids = options["product_ids"] or Product.objects.values_list("id", flat=True).iterator()
+
+        checked = 0
+        drifted = 0
+        for product_id in product_ids:
+            before = ProductAnalytics.objects.filter(product_id=product_id).first()
+            after = VisitService.update_analytics(product_id, reconcile=True)
+            try:
+                VisitService.rebuild_unique_visitor_sketches(product_id)
+            except Exception as e:
+                self.stderr.write(f"{product_id}: error rebuilding unique visitor sketches: {str(e)}")
+            checked += 1
+
+            if before is None or (before.total_visits, before.unique_visitors, before.duration_sum) != (
+                after.total_visits,
+                after.unique_visitors,
+                after.duration_sum,
+            ):
+                drifted += 1
+                self.stdout.write(
+                    f"{product_id}: total_visits={after.total_visits} unique_visitors={after.unique_visitors}"
+                )
+
+        if not options["product_ids"]:
+            VisitService.rebuild_popularity_leaderboard()
+            self.stdout.write("Rebuilt popularity leaderboard from daily rollups")
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {checked} products, {drifted} had drifted"))
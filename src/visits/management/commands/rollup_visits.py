@@ -0,0 +1,13 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from visits.service import VisitService
+
+
+class Command(BaseCommand):
+    help = "Aggregate raw visits into VisitDailyRollup, closing finished days once"
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rows = VisitService.rollup_visits()
+        self.stdout.write(self.style.SUCCESS(f"Updated {rows} daily visit rollups"))
@@ -1,23 +1,49 @@
+import asyncio
+import logging
 import re
-from typing import Callable, Optional
+import uuid
+from typing import Callable, Optional, Set
 from uuid import UUID
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import close_old_connections
 from django.http import HttpRequest, HttpResponse
 
+from visits.buffer import InMemoryVisitBuffer, VisitBuffer, get_tracking_settings, get_visit_buffer
 from visits.service import VisitService
 
+logger = logging.getLogger("visits")
+
 
 class VisitTrackingMiddleware:
     """
-    Middleware to track visits to product pages
+    Middleware to track visits to product pages.
+
+    Under ASGI the middleware runs natively async: the visit is recorded in
+    the background and the response is never held up by the tracking write.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response: Callable) -> None:
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Keep references to background tracking tasks so they are not garbage collected
+        self._background_tasks: Set[asyncio.Task] = set()
         # Compile the regex for product detail URLs
         self.product_pattern = re.compile(r"^/api/products/([a-f0-9-]+)/?$")
+        # In buffered mode visits are queued and written in batches by a flusher
+        self.visit_buffer: Optional[VisitBuffer] = None
+        if get_tracking_settings()["MODE"] == "buffered":
+            self.visit_buffer = get_visit_buffer()
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_async:
+            return self.__acall__(request)
+
         # Skip tracking for non-GET requests
         if request.method != "GET":
             return self.get_response(request)
@@ -30,16 +56,11 @@ class VisitTrackingMiddleware:
             ip_address = self._get_client_ip(request)
             # Get User-Agent
             user_agent = request.META.get("HTTP_USER_AGENT", "")
-            # Get session ID from cookie (or None if not available)
-            session_id = request.COOKIES.get("visit_session_id")
+            # Get session ID from cookie (or None if not available or not valid)
+            session_id = self._get_session_id(request)
 
             # Track visit
-            visit = VisitService.track_visit(
-                product_id=product_id,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                session_id=session_id,
-            )
+            visit_session_id = self._track(product_id, ip_address, user_agent, session_id)
 
             # Process the request
             response = self.get_response(request)
@@ -48,7 +69,7 @@ class VisitTrackingMiddleware:
             if not session_id:
                 response.set_cookie(
                     "visit_session_id",
-                    visit.session_id,
+                    visit_session_id,
                     max_age=60 * 60 * 24 * 30,  # 30 days
                     httponly=True,
                 )
@@ -57,6 +78,93 @@ class VisitTrackingMiddleware:
 
         return self.get_response(request)
 
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if request.method != "GET":
+            return await self.get_response(request)
+
+        product_id = self._extract_product_id(request.path)
+        if not product_id:
+            return await self.get_response(request)
+
+        ip_address = self._get_client_ip(request)
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        cookie_session_id = self._get_session_id(request)
+        # Assign the session id up front so the cookie does not wait for the write
+        session_id = cookie_session_id or str(uuid.uuid4())
+
+        self._track_in_background(product_id, ip_address, user_agent, session_id)
+
+        response = await self.get_response(request)
+
+        if not cookie_session_id:
+            response.set_cookie(
+                "visit_session_id",
+                session_id,
+                max_age=60 * 60 * 24 * 30,  # 30 days
+                httponly=True,
+            )
+
+        return response
+
+    def _track_in_background(self, product_id: UUID, ip_address: str, user_agent: str, session_id: str) -> None:
+        """
+        Fire-and-forget the tracking work from the event loop
+        """
+        if isinstance(self.visit_buffer, InMemoryVisitBuffer):
+            # Appending to the in-memory buffer never blocks, so do it inline
+            self._track(product_id, ip_address, user_agent, session_id)
+            return
+
+        task = asyncio.create_task(self._track_async(product_id, ip_address, user_agent, session_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _track_async(self, product_id: UUID, ip_address: str, user_agent: str, session_id: str) -> None:
+        try:
+            await sync_to_async(self._track_in_thread, thread_sensitive=False)(
+                product_id, ip_address, user_agent, session_id
+            )
+        except Exception as e:
+            logger.error(f"Error tracking visit for product {product_id}: {str(e)}")
+
+    def _track_in_thread(self, product_id: UUID, ip_address: str, user_agent: str, session_id: str) -> None:
+        # Runs outside the request cycle, so manage the thread's DB connection here
+        close_old_connections()
+        try:
+            self._track(product_id, ip_address, user_agent, session_id)
+        finally:
+            close_old_connections()
+
+    def _track(self, product_id: UUID, ip_address: str, user_agent: str, session_id: Optional[str]) -> str:
+        """
+        Record the visit and return the session id to keep in the cookie
+        """
+        if self.visit_buffer is None:
+            visit = VisitService.track_visit(
+                product_id=product_id,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                session_id=session_id,
+            )
+            return visit.session_id
+
+        # The session row is created by the flusher, so the id is assigned here
+        session_id = session_id or str(uuid.uuid4())
+        self.visit_buffer.enqueue(VisitService.build_visit_event(product_id, ip_address, user_agent, session_id))
+        return session_id
+
+    def _get_session_id(self, request: HttpRequest) -> Optional[str]:
+        """
+        Get the session ID from the cookie, ignoring values that are not UUIDs
+        """
+        cookie = request.COOKIES.get("visit_session_id")
+        if not cookie:
+            return None
+        try:
+            return str(UUID(cookie))
+        except ValueError:
+            return None
+
     def _extract_product_id(self, path: str) -> Optional[UUID]:
         """
         Extract product ID from URL path
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:36
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_duration_totals(apps, schema_editor):
+    Visit = apps.get_model('visits', 'Visit')
+    ProductAnalytics = apps.get_model('visits', 'ProductAnalytics')
+    totals = (
+        Visit.objects.filter(duration__isnull=False)
+        .values('product_id')
+        .annotate(duration_sum=Sum('duration'), duration_count=Count('id'))
+    )
+    for row in totals:
+        ProductAnalytics.objects.filter(product_id=row['product_id']).update(
+            duration_sum=row['duration_sum'], duration_count=row['duration_count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        ('visits', '0002_visit_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productanalytics',
+            name='duration_count',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productanalytics',
+            name='duration_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['product', 'ip_hash', 'timestamp'], name='visit_product_ip_ts_idx'),
+        ),
+        migrations.RunPython(backfill_duration_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        ('visits', '0003_incremental_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('visits', models.BigIntegerField(default=0)),
+                ('unique_visitors', models.BigIntegerField(default=0)),
+                ('duration_sum', models.BigIntegerField(default=0)),
+                ('duration_count', models.BigIntegerField(default=0)),
+                ('closed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['timestamp'], name='visit_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='visitdailyrollup',
+            name='product',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='products.product'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='visitdailyrollup',
+            index=models.Index(fields=['date', 'product'], name='visit_rollup_date_product_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='visitdailyrollup',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='visit_rollup_product_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,116 @@
+from datetime import date, datetime, timezone
+
+from django.db import migrations
+
+VISIT_TABLE = 'visits_visit'
+DEFAULT_PARTITION = 'visits_visit_default'
+PREMAKE_MONTHS = 3
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def create_monthly_partitions(cursor, first_month, last_month):
+    month = first_month
+    while month <= last_month:
+        lower = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+        upper = datetime(next_month(month).year, next_month(month).month, 1, tzinfo=timezone.utc)
+        cursor.execute(
+            f'CREATE TABLE {VISIT_TABLE}_p{month.year:04d}_{month.month:02d} PARTITION OF {VISIT_TABLE} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [lower.isoformat(), upper.isoformat()],
+        )
+        month = next_month(month)
+
+
+def partition_visits(apps, schema_editor):
+    """
+    Rebuild visits_visit as a table partitioned by month on timestamp.
+
+    The primary key of a partitioned table must include the partition key, so
+    it becomes (id, timestamp). The Visit model still declares id as its
+    primary key (Django has no composite keys), so id uniqueness is no longer
+    enforced by the database and relies on ids being random UUIDs. Existing
+    rows are copied into monthly partitions; anything outside them lands in
+    the default partition.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {VISIT_TABLE} RENAME TO {VISIT_TABLE}_unpartitioned')
+        cursor.execute(
+            f'ALTER TABLE {VISIT_TABLE}_unpartitioned '
+            f'RENAME CONSTRAINT {VISIT_TABLE}_pkey TO {VISIT_TABLE}_unpartitioned_pkey'
+        )
+        # Index names are schema-wide, so free them for the new table
+        cursor.execute('DROP INDEX IF EXISTS visit_product_ip_ts_idx')
+        cursor.execute('DROP INDEX IF EXISTS visit_timestamp_idx')
+
+        cursor.execute(
+            f'CREATE TABLE {VISIT_TABLE} (LIKE {VISIT_TABLE}_unpartitioned INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER TABLE {VISIT_TABLE} ADD CONSTRAINT {VISIT_TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        cursor.execute(
+            f'ALTER TABLE {VISIT_TABLE} ADD CONSTRAINT {VISIT_TABLE}_product_id_fk_products_product_id '
+            f'FOREIGN KEY (product_id) REFERENCES products_product (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX {VISIT_TABLE}_product_id_idx ON {VISIT_TABLE} (product_id)')
+        cursor.execute(f'CREATE INDEX visit_product_ip_ts_idx ON {VISIT_TABLE} (product_id, ip_hash, "timestamp")')
+        cursor.execute(f'CREATE INDEX visit_timestamp_idx ON {VISIT_TABLE} ("timestamp")')
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {VISIT_TABLE} DEFAULT')
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM {VISIT_TABLE}_unpartitioned')
+        first_visit = cursor.fetchone()[0]
+        current_month = datetime.now(timezone.utc).date().replace(day=1)
+        first_month = current_month
+        if first_visit:
+            first_month = min(first_visit.astimezone(timezone.utc).date().replace(day=1), current_month)
+        last_month = current_month
+        for _ in range(PREMAKE_MONTHS):
+            last_month = next_month(last_month)
+        create_monthly_partitions(cursor, first_month, last_month)
+
+        cursor.execute(f'INSERT INTO {VISIT_TABLE} SELECT * FROM {VISIT_TABLE}_unpartitioned')
+        cursor.execute(f'DROP TABLE {VISIT_TABLE}_unpartitioned')
+
+
+def unpartition_visits(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {VISIT_TABLE} RENAME TO {VISIT_TABLE}_partitioned')
+        cursor.execute(
+            f'ALTER TABLE {VISIT_TABLE}_partitioned '
+            f'RENAME CONSTRAINT {VISIT_TABLE}_pkey TO {VISIT_TABLE}_partitioned_pkey'
+        )
+        cursor.execute('DROP INDEX IF EXISTS visit_product_ip_ts_idx')
+        cursor.execute('DROP INDEX IF EXISTS visit_timestamp_idx')
+        cursor.execute(f'DROP INDEX IF EXISTS {VISIT_TABLE}_product_id_idx')
+
+        cursor.execute(f'CREATE TABLE {VISIT_TABLE} (LIKE {VISIT_TABLE}_partitioned INCLUDING DEFAULTS)')
+        cursor.execute(f'ALTER TABLE {VISIT_TABLE} ADD CONSTRAINT {VISIT_TABLE}_pkey PRIMARY KEY (id)')
+        cursor.execute(
+            f'ALTER TABLE {VISIT_TABLE} ADD CONSTRAINT {VISIT_TABLE}_product_id_fk_products_product_id '
+            f'FOREIGN KEY (product_id) REFERENCES products_product (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX {VISIT_TABLE}_product_id_idx ON {VISIT_TABLE} (product_id)')
+        cursor.execute(f'CREATE INDEX visit_product_ip_ts_idx ON {VISIT_TABLE} (product_id, ip_hash, "timestamp")')
+        cursor.execute(f'CREATE INDEX visit_timestamp_idx ON {VISIT_TABLE} ("timestamp")')
+
+        cursor.execute(f'INSERT INTO {VISIT_TABLE} SELECT * FROM {VISIT_TABLE}_partitioned')
+        cursor.execute(f'DROP TABLE {VISIT_TABLE}_partitioned CASCADE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visits', '0004_visit_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_visits, unpartition_visits),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_keyset_index'),
+        ('visits', '0005_partition_visits'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['product', 'timestamp', 'id'], name='visit_product_ts_id_idx'),
+        ),
+    ]
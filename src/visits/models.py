@@ -1,19 +1,34 @@
 import uuid
 
 from django.db import models
+from django.utils import timezone
 
 from core.models import BaseModel
 from products.models import Product
 
 
 class Visit(BaseModel):
+    # On PostgreSQL the table's primary key is (id, timestamp), see migration 0005. Django 5.1
+    # has no composite keys, so the model keeps id as its primary key; the database no longer
+    # enforces that id alone is unique, which holds in practice for random UUIDs.
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="visits")
     ip_hash = models.CharField(max_length=64)
     user_agent = models.TextField(null=True, blank=True)
     session_id = models.CharField(max_length=36, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered visits are written after the fact with their original time
+    timestamp = models.DateTimeField(default=timezone.now)
     duration = models.IntegerField(null=True, blank=True)  # Duration in seconds
 
+    class Meta:
+        indexes = [
+            # Backs the "seen this visitor before" checks of incremental analytics
+            models.Index(fields=["product", "ip_hash", "timestamp"], name="visit_product_ip_ts_idx"),
+            # Backs the per-day range scans of the rollup job
+            models.Index(fields=["timestamp"], name="visit_timestamp_idx"),
+            # Keyset pagination of a product's visits on (timestamp, id)
+            models.Index(fields=["product", "timestamp", "id"], name="visit_product_ts_id_idx"),
+        ]
+
     def __str__(self) -> str:
         return f"Visit to {self.product} at {self.timestamp}"
 
@@ -33,8 +48,40 @@ class ProductAnalytics(models.Model):
     total_visits = models.BigIntegerField(default=0)
     unique_visitors = models.BigIntegerField(default=0)
     avg_duration = models.IntegerField(null=True, blank=True)
+    # Running totals so avg_duration stays exact without re-reading every visit
+    duration_sum = models.BigIntegerField(default=0)
+    duration_count = models.BigIntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
     daily_stats = models.JSONField(default=dict)
 
     def __str__(self) -> str:
         return f"Analytics for {self.product}"
+
+
+class VisitDailyRollup(models.Model):
+    """
+    Per product and day visit aggregates maintained by the rollup job.
+
+    Finished days are aggregated once and marked ``closed``; only open days
+    are re-aggregated from the raw visits on later runs.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_rollups")
+    date = models.DateField()
+    visits = models.BigIntegerField(default=0)
+    unique_visitors = models.BigIntegerField(default=0)
+    duration_sum = models.BigIntegerField(default=0)
+    duration_count = models.BigIntegerField(default=0)
+    closed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "date"], name="visit_rollup_product_date_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["date", "product"], name="visit_rollup_date_product_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Visits to {self.product_id} on {self.date}"
@@ -0,0 +1,184 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger("visits")
+
+VISIT_TABLE = "visits_visit"
+DEFAULT_PARTITION = f"{VISIT_TABLE}_default"
+PARTITION_NAME_PATTERN = re.compile(rf"^{VISIT_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def partitioning_supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> date:
+    return month_start(datetime.now(timezone.utc).date())
+
+
+def partition_name(month: date) -> str:
+    return f"{VISIT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def _bound(month: date) -> str:
+    # Bounds are UTC midnights, matching how timestamps are stored
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def list_partitions() -> List[date]:
+    """
+    Months that currently have a partition attached to the visits table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [VISIT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME_PATTERN.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(month: date) -> bool:
+    """
+    Create the partition for a month, moving matching rows out of the default partition.
+
+    Returns False if the partition already existed.
+    """
+    if month in list_partitions():
+        return False
+
+    name = partition_name(month)
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [lower, upper],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {VISIT_TABLE} FOR VALUES FROM (%s) TO (%s)", [lower, upper]
+            )
+        else:
+            # A partition cannot be created over rows sitting in the default partition
+            cursor.execute(f"CREATE TABLE {name} (LIKE {VISIT_TABLE} INCLUDING DEFAULTS)")
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s '
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved",
+                [lower, upper],
+            )
+            cursor.execute(
+                f"ALTER TABLE {VISIT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [lower, upper]
+            )
+
+    logger.info(f"Created visit partition {name}")
+    return True
+
+
+def ensure_partitions(months_ahead: Optional[int] = None, today: Optional[date] = None) -> List[str]:
+    """
+    Make sure the current month and the next ``months_ahead`` months have partitions
+    """
+    if not partitioning_supported():
+        return []
+
+    months_ahead = settings.VISIT_PARTITIONS["PREMAKE_MONTHS"] if months_ahead is None else months_ahead
+    current = month_start(today) if today else current_month()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(month):
+            created.append(partition_name(month))
+    return created
+
+
+def retention_start(retention_months: Optional[int] = None, today: Optional[date] = None) -> date:
+    """
+    First month kept by the retention window; visits before it are dropped
+    """
+    retention_months = settings.VISIT_PARTITIONS["RETENTION_MONTHS"] if retention_months is None else retention_months
+    return add_months(month_start(today) if today else current_month(), -retention_months)
+
+
+def default_partition_rows() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {DEFAULT_PARTITION}")
+        return cursor.fetchone()[0]
+
+
+def purge_default_partition(
+    retention_months: Optional[int] = None, detach_only: bool = False, today: Optional[date] = None
+) -> int:
+    """
+    Apply the retention window to the default partition, returning the number of rows deleted.
+
+    Rows only land there when their month has no partition, so dropping
+    monthly partitions never reaches them. Expired ones are deleted (kept
+    with ``detach_only``) and any rows left are logged as a warning, since
+    they mean a partition is missing.
+    """
+    if not partitioning_supported():
+        return 0
+
+    oldest_kept = retention_start(retention_months, today)
+    deleted = 0
+    if not detach_only:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s', [_bound(oldest_kept)])
+            deleted = cursor.rowcount
+        if deleted:
+            logger.info(f"Deleted {deleted} expired visits from {DEFAULT_PARTITION}")
+
+    remaining = default_partition_rows()
+    if remaining:
+        logger.warning(f"{remaining} visits are in {DEFAULT_PARTITION}, create the partitions for their months")
+    return deleted
+
+
+def drop_expired_partitions(
+    retention_months: Optional[int] = None, detach_only: bool = False, today: Optional[date] = None
+) -> List[str]:
+    """
+    Detach (and unless ``detach_only``, drop) partitions that ended before the retention window
+    """
+    if not partitioning_supported():
+        return []
+
+    oldest_kept = retention_start(retention_months, today)
+    removed = []
+    for month in list_partitions():
+        if month >= oldest_kept:
+            continue
+        name = partition_name(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {VISIT_TABLE} DETACH PARTITION {name}")
+            if not detach_only:
+                cursor.execute(f"DROP TABLE {name}")
+        logger.info(f"{'Detached' if detach_only else 'Dropped'} visit partition {name}")
+        removed.append(name)
+    return removed
@@ -40,6 +40,13 @@ class ProductAnalyticsOut(Schema):
     daily_stats: List[DailyVisitStats]
 
 
+class UniqueVisitorsOut(Schema):
+    product_id: UUID
+    unique_visitors: int
+    exact: bool
+    error_bound: float  # Relative standard error, 0 for exact counts
+
+
 class PopularProductOut(Schema):
     product_id: UUID
     name: str
@@ -1,15 +1,33 @@
 import hashlib
+import logging
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from uuid import UUID
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Avg, Count, F, Q
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 
+from core.pagination import paginate_keyset
 from products.models import Product
-from visits.models import ProductAnalytics, Visit, VisitSession
+from visits.leaderboard import popularity_leaderboard
+from visits.models import ProductAnalytics, Visit, VisitDailyRollup, VisitSession
+from visits.partitions import partitioning_supported, retention_start
+from visits.sketches import unique_visitor_sketches
+
+logger = logging.getLogger("visits")
+
+VISIT_KEYSET = ("timestamp", "id")
+
+ANALYTICS_REFRESH_LOCK = "analytics_refresh:{product_id}"
+# Bounds how long a lost refresh task can block the next one
+ANALYTICS_REFRESH_LOCK_TIMEOUT = 5 * 60
 
 
 class VisitService:
@@ -60,23 +78,120 @@ class VisitService:
             product_id=product_id, ip_hash=ip_hash, user_agent=user_agent, session_id=session_id
         )
 
-        # Update analytics asynchronously (this would be better handled by Celery)
-        cls.update_analytics(product_id)
+        # Apply the visit to the stored analytics counters
+        cls.record_visits(product_id, [visit])
 
         return visit
 
+    @classmethod
+    def build_visit_event(
+        cls,
+        product_id: UUID,
+        ip_address: str,
+        user_agent: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Build the compact visit event queued by the buffered ingestion mode
+        """
+        return {
+            "id": str(uuid.uuid4()),
+            "product_id": str(product_id),
+            "ip_hash": cls._hash_ip(ip_address),
+            "user_agent": user_agent,
+            "session_id": session_id,
+            "timestamp": timezone.now().isoformat(),
+        }
+
+    @classmethod
+    def ingest_visits(cls, events: List[Dict[str, Any]]) -> int:
+        """
+        Write a batch of buffered visit events with a single bulk insert
+        """
+        if not events:
+            return 0
+
+        # Skip visits to products deleted (or never created) since the event was queued
+        product_ids = {UUID(str(event["product_id"])) for event in events}
+        existing_ids = set(Product.objects.filter(id__in=product_ids).values_list("id", flat=True))
+
+        visits = [
+            Visit(
+                id=UUID(str(event["id"])),
+                product_id=UUID(str(event["product_id"])),
+                ip_hash=event["ip_hash"],
+                user_agent=event.get("user_agent"),
+                session_id=event.get("session_id"),
+                timestamp=datetime.fromisoformat(str(event["timestamp"])),
+            )
+            for event in events
+            if UUID(str(event["product_id"])) in existing_ids
+        ]
+        # Events carry their own ids, so a batch replayed after a failed ack is skipped
+        already_written = set(Visit.objects.filter(id__in=[visit.id for visit in visits]).values_list("id", flat=True))
+        visits = [visit for visit in visits if visit.id not in already_written]
+        if not visits:
+            return 0
+
+        visits_by_product: Dict[UUID, List[Visit]] = defaultdict(list)
+        for visit in visits:
+            visits_by_product[visit.product_id].append(visit)
+
+        with transaction.atomic():
+            Visit.objects.bulk_create(visits, ignore_conflicts=True)
+            cls._record_sessions(Counter(visit.session_id for visit in visits if visit.session_id))
+            for product_id, product_visits in visits_by_product.items():
+                cls.record_visits(product_id, product_visits)
+
+        return len(visits)
+
+    @staticmethod
+    def _record_sessions(visit_counts: Dict[str, int]) -> None:
+        """
+        Bump visit counts for known sessions and create the missing ones
+        """
+        if not visit_counts:
+            return
+
+        now = timezone.now()
+        existing = set(VisitSession.objects.filter(session_id__in=visit_counts).values_list("session_id", flat=True))
+
+        # One UPDATE per distinct increment instead of one per session
+        sessions_by_increment: Dict[int, List[str]] = defaultdict(list)
+        for session_id in existing:
+            sessions_by_increment[visit_counts[session_id]].append(session_id)
+        for increment, session_ids in sessions_by_increment.items():
+            VisitSession.objects.filter(session_id__in=session_ids).update(
+                visit_count=F("visit_count") + increment, last_visit_time=now, updated_at=now
+            )
+
+        VisitSession.objects.bulk_create(
+            [
+                VisitSession(session_id=session_id, visit_count=count)
+                for session_id, count in visit_counts.items()
+                if session_id not in existing
+            ],
+            ignore_conflicts=True,
+        )
+
     @classmethod
     def update_visit_duration(cls, visit_id: UUID, duration: int) -> Optional[Visit]:
         """
         Update visit duration when user leaves the page
         """
         try:
-            visit = Visit.objects.get(id=visit_id)
+            # Durations arrive shortly after the visit, so look in the recent partitions first
+            recent_visit = Visit.objects.filter(id=visit_id, timestamp__gte=timezone.now() - timedelta(days=1)).first()
+            visit = recent_visit or Visit.objects.get(id=visit_id)
+            previous_duration = visit.duration
             visit.duration = duration
-            visit.save()
+            # Filtering on the partition key keeps the UPDATE on a single partition
+            now = timezone.now()
+            Visit.objects.filter(id=visit.id, timestamp=visit.timestamp).update(duration=duration, updated_at=now)
+            visit.updated_at = now
 
             # Update analytics for average duration
-            cls.update_analytics(visit.product_id)
+            cls.record_duration(visit.product_id, previous_duration, duration)
 
             return visit
         except Visit.DoesNotExist:
@@ -108,15 +223,83 @@ class VisitService:
 
         return list(query.order_by("-timestamp")[:limit])
 
+    @staticmethod
+    def get_visits_page(
+        product_id: UUID,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Visit], Optional[str]]:
+        """
+        Get a page of a product's visits, newest first, using keyset pagination on (timestamp, id)
+        """
+        query = Visit.objects.filter(product_id=product_id)
+
+        if start_date:
+            if not timezone.is_aware(start_date):
+                start_date = timezone.make_aware(start_date)
+            query = query.filter(timestamp__gt=start_date)
+
+        if end_date:
+            if not timezone.is_aware(end_date):
+                end_date = timezone.make_aware(end_date)
+            query = query.filter(timestamp__lte=end_date)
+
+        return paginate_keyset(query, VISIT_KEYSET, cursor, limit)
+
+    @staticmethod
+    def iter_visits(
+        fields: List[str],
+        product_id: Optional[UUID] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        chunk_size: int = 2000,
+    ) -> Iterator[Tuple]:
+        """
+        Iterate visits as value tuples, oldest first.
+
+        Uses a server-side cursor on PostgreSQL, so only ``chunk_size`` rows
+        are held in memory at a time.
+        """
+        query = Visit.objects.all()
+        if product_id:
+            query = query.filter(product_id=product_id)
+        if start_date:
+            if not timezone.is_aware(start_date):
+                start_date = timezone.make_aware(start_date)
+            query = query.filter(timestamp__gte=start_date)
+        if end_date:
+            if not timezone.is_aware(end_date):
+                end_date = timezone.make_aware(end_date)
+            query = query.filter(timestamp__lte=end_date)
+
+        return query.order_by("timestamp", "id").values_list(*fields).iterator(chunk_size=chunk_size)
+
     @staticmethod
     def get_unique_visitors_count(
         product_id: UUID,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        exact: bool = False,
     ) -> int:
         """
-        Get count of unique visitors for a product
+        Get count of unique visitors for a product.
+
+        By default the count is estimated from the daily HyperLogLog sketches
+        (whole days, standard error ``UniqueVisitorSketches.ERROR_BOUND``);
+        ``exact=True`` runs a distinct count over the raw visits instead.
         """
+        if not exact:
+            try:
+                return unique_visitor_sketches.count(
+                    product_id,
+                    timezone.localdate(start_date) if start_date else None,
+                    timezone.localdate(end_date) if end_date else None,
+                )
+            except Exception as e:
+                logger.error(f"Error reading unique visitor sketches, falling back to exact count: {str(e)}")
+
         query = Visit.objects.filter(product_id=product_id)
 
         if start_date:
@@ -126,109 +309,479 @@ class VisitService:
 
         return query.values("ip_hash").distinct().count()
 
+    @staticmethod
+    def _count_new_visitors(product_id: UUID, visits: List[Visit]) -> Tuple[int, Dict[str, int]]:
+        """
+        Count visitors in ``visits`` never seen before, overall and per day.
+
+        Uses the (product, ip_hash, timestamp) index, so the cost depends on
+        the size of the batch and not on the product's visit history.
+        """
+        new_ids = [visit.id for visit in visits]
+        ip_hashes = {visit.ip_hash for visit in visits}
+        known = set(
+            Visit.objects.filter(product_id=product_id, ip_hash__in=ip_hashes)
+            .exclude(id__in=new_ids)
+            .values_list("ip_hash", flat=True)
+            .distinct()
+        )
+        new_visitors = len(ip_hashes - known)
+
+        hashes_by_day: Dict[str, set] = defaultdict(set)
+        for visit in visits:
+            hashes_by_day[timezone.localdate(visit.timestamp).isoformat()].add(visit.ip_hash)
+
+        new_daily_visitors = {}
+        for day, day_hashes in hashes_by_day.items():
+            day_start, day_end = VisitService._day_bounds(date.fromisoformat(day))
+            known_today = set(
+                Visit.objects.filter(
+                    product_id=product_id,
+                    ip_hash__in=day_hashes,
+                    timestamp__gte=day_start,
+                    timestamp__lt=day_end,
+                )
+                .exclude(id__in=new_ids)
+                .values_list("ip_hash", flat=True)
+                .distinct()
+            )
+            new_daily_visitors[day] = len(day_hashes - known_today)
+
+        return new_visitors, new_daily_visitors
+
     @classmethod
     @transaction.atomic
-    def update_analytics(cls, product_id: UUID) -> ProductAnalytics:
+    def record_visits(cls, product_id: UUID, visits: List[Visit]) -> ProductAnalytics:
         """
-        Update analytics for a product
+        Apply newly stored visits to the product analytics as deltas
         """
-        # Get or create analytics
-        analytics, created = ProductAnalytics.objects.get_or_create(product_id=product_id)
+        # Redis is not rolled back with the transaction, so only count committed visits
+        popularity = Counter(timezone.localdate(visit.timestamp) for visit in visits)
+        transaction.on_commit(lambda: cls._increment_popularity(product_id, popularity))
 
-        # Update total visits
-        total_visits = Visit.objects.filter(product_id=product_id).count()
+        try:
+            # Unique counts come from the HyperLogLog sketches; they only ever grow
+            sketch_counts: Optional[Tuple[int, Dict[date, int]]] = unique_visitor_sketches.add(
+                product_id, [(timezone.localdate(visit.timestamp), visit.ip_hash) for visit in visits]
+            )
+        except Exception as e:
+            logger.error(f"Error updating unique visitor sketches, using exact lookups: {str(e)}")
+            sketch_counts = None
+
+        analytics = ProductAnalytics.objects.select_for_update().filter(product_id=product_id).first()
+        if analytics is None:
+            # No counters yet: build them once from the raw visits (already including these)
+            return cls.update_analytics(product_id)
+
+        visits_by_day = Counter(timezone.localdate(visit.timestamp).isoformat() for visit in visits)
+        daily_stats = {day["date"]: day for day in analytics.daily_stats or []}
+        for day, count in visits_by_day.items():
+            daily_stats.setdefault(day, {"date": day, "count": 0, "unique_visitors": 0})["count"] += count
+        analytics.total_visits += len(visits)
+
+        if sketch_counts is not None:
+            unique_visitors, daily_unique_visitors = sketch_counts
+            analytics.unique_visitors = max(analytics.unique_visitors, unique_visitors)
+            for day, day_unique_visitors in daily_unique_visitors.items():
+                stats = daily_stats[day.isoformat()]
+                stats["unique_visitors"] = max(stats["unique_visitors"], day_unique_visitors)
+        else:
+            new_visitors, new_daily_visitors = cls._count_new_visitors(product_id, visits)
+            analytics.unique_visitors += new_visitors
+            for day, day_new_visitors in new_daily_visitors.items():
+                daily_stats[day]["unique_visitors"] += day_new_visitors
 
-        # Update unique visitors
-        unique_visitors = Visit.objects.filter(product_id=product_id).values("ip_hash").distinct().count()
+        analytics.daily_stats = cls._trim_daily_stats(daily_stats.values())
 
-        # Update average duration (ignoring null durations)
-        avg_duration = Visit.objects.filter(product_id=product_id, duration__isnull=False).aggregate(
-            avg_duration=Avg("duration")
-        )["avg_duration"]
+        analytics.save()
+        return analytics
 
-        # Get daily stats for last 30 days
-        now = timezone.now()
-        thirty_days_ago = now - timedelta(days=30)
-        daily_visits = (
-            Visit.objects.filter(product_id=product_id, timestamp__gte=thirty_days_ago)
-            .extra(select={"date": "DATE(timestamp)"})
-            .values("date")
-            .annotate(count=Count("id"), unique_visitors=Count("ip_hash", distinct=True))
-            .order_by("date")
+    @staticmethod
+    def _increment_popularity(product_id: UUID, visits_by_day: Dict[date, int]) -> None:
+        try:
+            popularity_leaderboard.increment(product_id, visits_by_day)
+        except Exception as e:
+            logger.error(f"Error updating popularity leaderboard: {str(e)}")
+
+    @classmethod
+    @transaction.atomic
+    def record_duration(cls, product_id: UUID, previous_duration: Optional[int], duration: int) -> ProductAnalytics:
+        """
+        Apply a new or changed visit duration to the running average
+        """
+        analytics = ProductAnalytics.objects.select_for_update().filter(product_id=product_id).first()
+        if analytics is None:
+            return cls.update_analytics(product_id)
+
+        if previous_duration is None:
+            analytics.duration_sum += duration
+            analytics.duration_count += 1
+        else:
+            analytics.duration_sum += duration - previous_duration
+        analytics.avg_duration = cls._average_duration(analytics.duration_sum, analytics.duration_count)
+
+        analytics.save()
+        return analytics
+
+    @staticmethod
+    def _average_duration(duration_sum: int, duration_count: int) -> Optional[int]:
+        if not duration_count:
+            return None
+        return round(duration_sum / duration_count)
+
+    @staticmethod
+    def _trim_daily_stats(daily_stats: Any, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Keep only the last ``days`` days of stats, sorted by date
+        """
+        first_day = (timezone.localdate() - timedelta(days=days)).isoformat()
+        return sorted((day for day in daily_stats if day["date"] >= first_day), key=lambda day: day["date"])
+
+    @staticmethod
+    def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+        """
+        Start (inclusive) and end (exclusive) of a day in the current time zone
+        """
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        return day_start, day_start + timedelta(days=1)
+
+    @staticmethod
+    def _last_closed_day() -> Optional[date]:
+        return VisitDailyRollup.objects.filter(closed=True).aggregate(last=Max("date"))["last"]
+
+    @classmethod
+    def _first_complete_day(cls, product_id: UUID) -> Optional[date]:
+        """
+        First day whose raw visits are all still stored, or None when partition
+        retention has not dropped any visit of the product.
+
+        Daily rollups outlive the raw visits, so a rollup before that day means
+        the Visit table no longer holds the product's whole history.
+        """
+        if not partitioning_supported():
+            return None
+        first_rollup = VisitDailyRollup.objects.filter(product_id=product_id).aggregate(first=Min("date"))["first"]
+        if first_rollup is None:
+            return None
+
+        # Partitions end at UTC midnights, so the local day holding the bound may be partial
+        oldest_kept = datetime.combine(retention_start(), time.min, tzinfo=dt_timezone.utc)
+        first_day = timezone.localdate(oldest_kept)
+        if cls._day_bounds(first_day)[0] < oldest_kept:
+            first_day += timedelta(days=1)
+
+        # Partitions may also have been dropped with a shorter retention than the configured one
+        first_visit = Visit.objects.filter(product_id=product_id).aggregate(first=Min("timestamp"))["first"]
+        if first_visit is None:
+            first_day = timezone.localdate() + timedelta(days=1)
+        elif timezone.localdate(first_visit) > first_rollup:
+            first_day = max(first_day, timezone.localdate(first_visit) + timedelta(days=1))
+
+        return first_day if first_rollup < first_day else None
+
+    @classmethod
+    def _rollup_days(cls, first_day: date, last_day: date, product_id: Optional[UUID] = None) -> int:
+        """
+        Aggregate raw visits between two days (inclusive) into VisitDailyRollup rows.
+
+        Rows are closed once their day ended more than VISIT_ROLLUP_GRACE_MINUTES
+        ago, which leaves room for late buffered visits and duration updates.
+        Only the global job closes days, since closing marks the day as final for
+        every product; a product's closed days re-aggregated by reconciliation
+        stay closed.
+        """
+        range_start = cls._day_bounds(first_day)[0]
+        range_end = cls._day_bounds(last_day)[1]
+        visits = Visit.objects.filter(timestamp__gte=range_start, timestamp__lt=range_end)
+        if product_id is not None:
+            visits = visits.filter(product_id=product_id)
+
+        daily_totals = (
+            visits.annotate(day=TruncDate("timestamp"))
+            .values("product_id", "day")
+            .annotate(
+                visits=Count("id"),
+                unique_visitors=Count("ip_hash", distinct=True),
+                duration_sum=Sum("duration"),
+                duration_count=Count("duration"),
+            )
+        )
+
+        closing_cutoff = timezone.now() - timedelta(minutes=getattr(settings, "VISIT_ROLLUP_GRACE_MINUTES", 60))
+        last_closed = cls._last_closed_day() if product_id is not None else None
+        rollups = [
+            VisitDailyRollup(
+                product_id=row["product_id"],
+                date=row["day"],
+                visits=row["visits"],
+                unique_visitors=row["unique_visitors"],
+                duration_sum=row["duration_sum"] or 0,
+                duration_count=row["duration_count"],
+                closed=(
+                    cls._day_bounds(row["day"])[1] <= closing_cutoff
+                    if product_id is None
+                    else last_closed is not None and row["day"] <= last_closed
+                ),
+            )
+            for row in daily_totals
+        ]
+        VisitDailyRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=["product", "date"],
+            update_fields=["visits", "unique_visitors", "duration_sum", "duration_count", "closed", "updated_at"],
         )
+        return len(rollups)
+
+    @classmethod
+    def rollup_visits(cls) -> int:
+        """
+        Bring VisitDailyRollup up to date.
+
+        Starts after the last closed day, so finished days are aggregated once
+        and later runs only re-aggregate the open ones (normally just today).
+        """
+        last_closed = cls._last_closed_day()
+        if last_closed is not None:
+            first_day = last_closed + timedelta(days=1)
+        else:
+            first_visit = Visit.objects.aggregate(first=Min("timestamp"))["first"]
+            if first_visit is None:
+                return 0
+            first_day = timezone.localdate(first_visit)
+
+        return cls._rollup_days(first_day, timezone.localdate())
+
+    @classmethod
+    def get_product_analytics(cls, product_id: UUID) -> Optional[ProductAnalytics]:
+        """
+        Read the stored analytics snapshot (stale-while-revalidate).
+
+        A snapshot older than VISIT_ANALYTICS_MAX_AGE is still returned, and a
+        single background refresh is scheduled for the product. Analytics are
+        only computed inline when the product has no snapshot yet.
+        """
+        analytics = ProductAnalytics.objects.filter(product_id=product_id).first()
+        if analytics is None:
+            if not Product.objects.filter(id=product_id).exists():
+                return None
+            return cls.update_analytics(product_id)
+
+        max_age = timedelta(seconds=getattr(settings, "VISIT_ANALYTICS_MAX_AGE", 300))
+        if timezone.now() - analytics.last_updated > max_age:
+            cls.schedule_analytics_refresh(product_id)
+
+        return analytics
+
+    @staticmethod
+    def schedule_analytics_refresh(product_id: UUID) -> bool:
+        """
+        Queue a background analytics refresh unless one is already pending for the product
+        """
+        # Imported here to avoid a circular import with visits.tasks
+        from visits.tasks import refresh_product_analytics
+
+        lock_key = ANALYTICS_REFRESH_LOCK.format(product_id=product_id)
+        # cache.add is atomic, so only one reader wins the lock
+        if not cache.add(lock_key, True, timeout=ANALYTICS_REFRESH_LOCK_TIMEOUT):
+            return False
+
+        try:
+            refresh_product_analytics.delay(str(product_id))
+        except Exception as e:
+            cache.delete(lock_key)
+            logger.error(f"Error scheduling analytics refresh for product {product_id}: {str(e)}")
+            return False
+        return True
+
+    @classmethod
+    def refresh_analytics(cls, product_id: UUID) -> ProductAnalytics:
+        """
+        Rebuild a product's analytics and release its refresh lock
+        """
+        try:
+            return cls.update_analytics(product_id)
+        finally:
+            cache.delete(ANALYTICS_REFRESH_LOCK.format(product_id=product_id))
+
+    @classmethod
+    @transaction.atomic
+    def update_analytics(cls, product_id: UUID, reconcile: bool = False) -> ProductAnalytics:
+        """
+        Rebuild analytics for a product from its daily rollups.
 
-        # Convert QuerySet to dict for JSON storage
+        Tracked visits are applied incrementally by ``record_visits`` and
+        ``record_duration``. Open days are re-aggregated from the raw visits
+        first. Unique visitors come from the all-time HyperLogLog sketch.
+
+        ``reconcile=True`` also re-aggregates the closed days whose visits are
+        still stored, and runs the exact distinct count over every visit of
+        the product, unless partition retention already dropped some of them.
+        """
+        # Get or create analytics
+        analytics, created = ProductAnalytics.objects.get_or_create(product_id=product_id)
+
+        today = timezone.localdate()
+        last_closed = cls._last_closed_day()
+        first_complete_day = cls._first_complete_day(product_id) if reconcile else None
+        if last_closed is not None and not reconcile:
+            first_day = last_closed + timedelta(days=1)
+        else:
+            # Reconciling re-aggregates closed days too, picking up late buffered visits and duration
+            # updates, but not the days whose visits partition retention dropped
+            first_visit = Visit.objects.filter(product_id=product_id).aggregate(first=Min("timestamp"))["first"]
+            first_day = timezone.localdate(first_visit) if first_visit else today
+            if first_complete_day is not None:
+                first_day = max(first_day, first_complete_day)
+        cls._rollup_days(first_day, today, product_id=product_id)
+
+        rollups = VisitDailyRollup.objects.filter(product_id=product_id)
+        totals = rollups.aggregate(
+            total_visits=Sum("visits"), duration_sum=Sum("duration_sum"), duration_count=Sum("duration_count")
+        )
+        duration_sum = totals["duration_sum"] or 0
+        duration_count = totals["duration_count"] or 0
+
+        # Unique visitors across days cannot be summed from the rollups. The exact count only
+        # sees the visits still stored, so it would shrink the count once partitions were dropped
+        exact = reconcile and first_complete_day is None
+        unique_visitors = cls.get_unique_visitors_count(product_id, exact=exact)
+
+        # Daily stats for the last 30 days, about 30 rollup rows
         daily_stats = [
-            {"date": str(day["date"]), "count": day["count"], "unique_visitors": day["unique_visitors"]}
-            for day in daily_visits
+            {"date": rollup.date.isoformat(), "count": rollup.visits, "unique_visitors": rollup.unique_visitors}
+            for rollup in rollups.filter(date__gte=today - timedelta(days=30)).order_by("date")
         ]
 
         # Update analytics
-        analytics.total_visits = total_visits
+        analytics.total_visits = totals["total_visits"] or 0
         analytics.unique_visitors = unique_visitors
-        analytics.avg_duration = avg_duration
+        analytics.duration_sum = duration_sum
+        analytics.duration_count = duration_count
+        analytics.avg_duration = cls._average_duration(duration_sum, duration_count)
         analytics.daily_stats = daily_stats
         analytics.save()
-
         return analytics
 
-    @staticmethod
-    def get_popular_products(limit: int = 5) -> List[Tuple[Product, Dict]]:
-        """
-        Get most popular products based on visit counts
+    @classmethod
+    def rebuild_unique_visitor_sketches(cls, product_id: UUID) -> None:
         """
-        # Get products with most visits in last 30 days
-        now = timezone.now()
-        thirty_days_ago = now - timedelta(days=30)
-        sixty_days_ago = now - timedelta(days=60)
+        Rebuild a product's HyperLogLog sketches from the raw visits (reconciliation only).
 
-        # Current period stats
-        current_period_stats = (
-            Visit.objects.filter(timestamp__gte=thirty_days_ago)
-            .values("product_id")
-            .annotate(
-                total_visits=Count("id"),
-                unique_visitors=Count("ip_hash", distinct=True),
-            )
-            .order_by("-total_visits")[:limit]
+        Once partition retention dropped some of the product's visits they are
+        merged into the live sketches instead, so the all-time count keeps the
+        visitors of the dropped months.
+        """
+        unique_visitor_sketches.rebuild(
+            product_id,
+            Visit.objects.filter(product_id=product_id)
+            .annotate(day=TruncDate("timestamp"))
+            .values_list("day", "ip_hash")
+            .distinct()
+            .iterator(),
+            merge=cls._first_complete_day(product_id) is not None,
         )
 
-        # Previous period stats for comparison
-        previous_period_stats = (
-            Visit.objects.filter(timestamp__gte=sixty_days_ago, timestamp__lt=thirty_days_ago)
-            .values("product_id")
-            .annotate(prev_total_visits=Count("id"))
-            .order_by("-prev_total_visits")
+    @classmethod
+    def rebuild_popularity_leaderboard(cls) -> None:
+        """
+        Rebuild the Redis popularity leaderboard from the daily rollups
+        """
+        cls.rollup_visits()
+        today = timezone.localdate()
+        first_day = today - timedelta(days=popularity_leaderboard.WINDOW_DAYS * 2 - 1)
+        daily_counts = VisitDailyRollup.objects.filter(date__gte=first_day, date__lte=today).values_list(
+            "date", "product_id", "visits"
         )
+        popularity_leaderboard.rebuild(first_day, today, daily_counts.iterator())
+
+    @classmethod
+    def get_popular_products(cls, limit: int = 5) -> List[Tuple[Product, Dict]]:
+        """
+        Get most popular products based on visit counts.
+
+        Reads the Redis popularity leaderboard, so the cost does not depend on
+        visit volume. Falls back to the daily rollups if Redis is unavailable.
+        """
+        today = timezone.localdate()
+        current_start = today - timedelta(days=popularity_leaderboard.WINDOW_DAYS - 1)
+        previous_start = current_start - timedelta(days=popularity_leaderboard.WINDOW_DAYS)
+        previous_end = current_start - timedelta(days=1)
+
+        try:
+            current_visits = popularity_leaderboard.top(current_start, today, limit)
+            previous_visits = popularity_leaderboard.scores(
+                previous_start, previous_end, [product_id for product_id, _ in current_visits]
+            )
+            daily_unique_visitors: Dict[UUID, int] = {}
+        except Exception as e:
+            logger.error(f"Error reading popularity leaderboard, using daily rollups: {str(e)}")
+            current_visits, previous_visits, daily_unique_visitors = cls._popular_from_rollups(
+                current_start, previous_start, limit
+            )
 
-        # Convert to dict for easy lookup
-        prev_stats_dict = {item["product_id"]: item["prev_total_visits"] for item in previous_period_stats}
+        products = Product.objects.in_bulk([product_id for product_id, _ in current_visits])
 
         # Calculate percentage change and combine with product objects
         result = []
-        for stat in current_period_stats:
-            try:
-                product = Product.objects.get(id=stat["product_id"])
-
-                # Calculate percentage change
-                prev_visits = prev_stats_dict.get(stat["product_id"], 0)
-                if prev_visits > 0:
-                    percentage_change = ((stat["total_visits"] - prev_visits) / prev_visits) * 100
-                else:
-                    percentage_change = 100.0  # New product with no previous visits
-
-                result.append(
-                    (
-                        product,
-                        {
-                            "total_visits": stat["total_visits"],
-                            "unique_visitors": stat["unique_visitors"],
-                            "percentage_change": percentage_change,
-                        },
-                    )
-                )
-            except Product.DoesNotExist:
+        for product_id, total_visits in current_visits:
+            product = products.get(product_id)
+            if product is None:
                 # Skip if product no longer exists
                 continue
 
+            # Calculate percentage change
+            prev_visits = previous_visits.get(product_id, 0)
+            if prev_visits > 0:
+                percentage_change = ((total_visits - prev_visits) / prev_visits) * 100
+            else:
+                percentage_change = 100.0  # New product with no previous visits
+
+            try:
+                unique_visitors = unique_visitor_sketches.count(product.id, current_start, today)
+            except Exception as e:
+                # Summed daily uniques over-count returning visitors, but are better than nothing
+                logger.error(f"Error reading unique visitor sketches: {str(e)}")
+                unique_visitors = daily_unique_visitors.get(product_id, 0)
+
+            result.append(
+                (
+                    product,
+                    {
+                        "total_visits": total_visits,
+                        "unique_visitors": unique_visitors,
+                        "percentage_change": percentage_change,
+                    },
+                )
+            )
+
         return result
+
+    @staticmethod
+    def _popular_from_rollups(
+        current_start: date, previous_start: date, limit: int
+    ) -> Tuple[List[Tuple[UUID, int]], Dict[UUID, int], Dict[UUID, int]]:
+        """
+        Current and previous window visits (plus summed daily uniques) from the daily rollups
+        """
+        current_period_stats = list(
+            VisitDailyRollup.objects.filter(date__gte=current_start)
+            .values("product_id")
+            .annotate(total_visits=Sum("visits"), daily_unique_visitors=Sum("unique_visitors"))
+            .order_by("-total_visits")[:limit]
+        )
+        product_ids = [stat["product_id"] for stat in current_period_stats]
+
+        # Previous period stats for comparison
+        previous_visits = dict(
+            VisitDailyRollup.objects.filter(
+                product_id__in=product_ids, date__gte=previous_start, date__lt=current_start
+            )
+            .values("product_id")
+            .annotate(prev_total_visits=Sum("visits"))
+            .values_list("product_id", "prev_total_visits")
+        )
+
+        current_visits = [(stat["product_id"], stat["total_visits"]) for stat in current_period_stats]
+        daily_unique_visitors = {stat["product_id"]: stat["daily_unique_visitors"] for stat in current_period_stats}
+        return current_visits, previous_visits, daily_unique_visitors
@@ -0,0 +1,56 @@
+from typing import Dict, Union
+from uuid import UUID
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+
+from visits.buffer import get_visit_buffer
+from visits.partitions import drop_expired_partitions, ensure_partitions, purge_default_partition
+from visits.service import VisitService
+
+# Setup logging
+logger = get_task_logger(__name__)
+
+
+@shared_task(name="flush_visit_buffer")
+def flush_visit_buffer() -> Dict[str, Union[bool, int]]:
+    """
+    Write visits queued in the buffer (Redis stream backend) to the database
+    """
+    written = get_visit_buffer().flush()
+    if written:
+        logger.info(f"Flushed {written} buffered visits")
+    return {"success": True, "written": written}
+
+
+@shared_task(name="rollup_visits")
+def rollup_visits() -> Dict[str, Union[bool, int]]:
+    """
+    Aggregate raw visits into the daily rollup table
+    """
+    rows = VisitService.rollup_visits()
+    logger.info(f"Updated {rows} daily visit rollups")
+    return {"success": True, "rows": rows}
+
+
+@shared_task(name="refresh_product_analytics")
+def refresh_product_analytics(product_id: str) -> Dict[str, Union[bool, str]]:
+    """
+    Rebuild a stale ProductAnalytics snapshot in the background
+    """
+    analytics = VisitService.refresh_analytics(UUID(product_id))
+    logger.info(f"Refreshed analytics for product {product_id}: {analytics.total_visits} visits")
+    return {"success": True, "product_id": product_id}
+
+
+@shared_task(name="manage_visit_partitions")
+def manage_visit_partitions() -> Dict[str, Union[bool, int]]:
+    """
+    Pre-create upcoming Visit partitions and apply the retention window
+    """
+    created = ensure_partitions()
+    removed = drop_expired_partitions(detach_only=settings.VISIT_PARTITIONS["DETACH_ONLY"])
+    purged = purge_default_partition(detach_only=settings.VISIT_PARTITIONS["DETACH_ONLY"])
+    logger.info(f"Visit partitions: {len(created)} created, {len(removed)} removed, {purged} default rows purged")
+    return {"success": True, "created": len(created), "removed": len(removed), "purged": purged}